@@ -0,0 +1,165 @@
+"""
+Judge admission control.
+Bounds how many submissions this process judges at once: a global cap on
+concurrent sandbox runs and a per-user cap. Requests over a cap wait in
+line, and a freed slot goes to the waiting user with the fewest runs in
+progress (oldest request first among equals), so one user's burst can't
+starve everyone else. A request that doesn't get a slot within
+JUDGE_ADMISSION_WAIT_SECONDS is rejected with AdmissionRejected, which the
+submit endpoints turn into 429 with Retry-After.
+
+Caps are per process, like the sandbox pool: with several web processes
+the effective global cap is JUDGE_MAX_CONCURRENT times the process count.
+"""
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+MAX_CONCURRENT = int(os.environ.get("JUDGE_MAX_CONCURRENT", "8"))
+MAX_CONCURRENT_PER_USER = int(os.environ.get("JUDGE_MAX_CONCURRENT_PER_USER", "2"))
+# Requests one user may have waiting for a slot; more are rejected at once
+MAX_WAITING_PER_USER = int(os.environ.get("JUDGE_MAX_WAITING_PER_USER", "4"))
+WAIT_SECONDS = float(os.environ.get("JUDGE_ADMISSION_WAIT_SECONDS", "10"))
+RETRY_AFTER_SECONDS = int(os.environ.get("JUDGE_ADMISSION_RETRY_AFTER", "5"))
+
+_DEFAULT_WAIT = object()
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, message, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+
+    def __init__(self, user_id, seq):
+        self.user_id = user_id
+        self.seq = seq
+
+
+class AdmissionController:
+    # Thread-safe. user_id may be anything hashable (None is one more user).
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_per_user=MAX_CONCURRENT_PER_USER,
+                 max_waiting_per_user=MAX_WAITING_PER_USER, wait_seconds=WAIT_SECONDS):
+        if max_concurrent < 1 or max_per_user < 1:
+            raise ValueError("AdmissionController needs max_concurrent >= 1 and max_per_user >= 1")
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_waiting_per_user = max_waiting_per_user
+        self.wait_seconds = wait_seconds
+
+        self._cond = threading.Condition()
+        self._running = {}      # user_id -> runs in progress
+        self._total = 0
+        self._waiting = []      # tickets, in arrival order
+        self._seq = itertools.count()
+        self._stats = {"admitted": 0, "waited": 0, "rejected": 0}
+
+    def acquire(self, user_id, timeout=_DEFAULT_WAIT):
+        # Take a judging slot for user_id, waiting up to timeout seconds
+        # (default wait_seconds). timeout=None waits as long as it takes and
+        # is never rejected; used for submissions already accepted into a
+        # queue. Raises AdmissionRejected.
+        if timeout is _DEFAULT_WAIT:
+            timeout = self.wait_seconds
+        with self._cond:
+            if timeout is not None and self._waiting_count(user_id) >= self.max_waiting_per_user:
+                self._stats["rejected"] += 1
+                raise AdmissionRejected("Too many of your submissions are waiting to be judged. Try again shortly.")
+            ticket = _Ticket(user_id, next(self._seq))
+            self._waiting.append(ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            waited = False
+            try:
+                while self._next_ticket() is not ticket:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._stats["rejected"] += 1
+                        raise AdmissionRejected("The judge is busy. Try again shortly.")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._running[user_id] = self._running.get(user_id, 0) + 1
+                self._total += 1
+                self._stats["admitted"] += 1
+                if waited:
+                    self._stats["waited"] += 1
+            finally:
+                self._waiting.remove(ticket)
+                # Whoever is next in line may be able to go now too
+                self._cond.notify_all()
+
+    def release(self, user_id):
+        with self._cond:
+            count = self._running.get(user_id, 0)
+            if count <= 1:
+                self._running.pop(user_id, None)
+            else:
+                self._running[user_id] = count - 1
+            self._total = max(0, self._total - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, user_id, timeout=_DEFAULT_WAIT):
+        self.acquire(user_id, timeout)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, running=self._total, waiting=len(self._waiting),
+                        users_running=len(self._running), max_concurrent=self.max_concurrent,
+                        max_per_user=self.max_per_user)
+
+    def _waiting_count(self, user_id):
+        return sum(1 for ticket in self._waiting if ticket.user_id == user_id)
+
+    def _next_ticket(self):
+        # The waiting ticket to admit next, or None if nobody can run.
+        # Fair share: the user with the fewest runs in progress goes first.
+        if self._total >= self.max_concurrent:
+            return None
+        eligible = [ticket for ticket in self._waiting
+                    if self._running.get(ticket.user_id, 0) < self.max_per_user]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda ticket: (self._running.get(ticket.user_id, 0), ticket.seq))
+
+
+_controller = None
+_controller_pid = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    # One controller per process; a forked worker starts with empty counts.
+    global _controller, _controller_pid
+    with _controller_lock:
+        if _controller is None or _controller_pid != os.getpid():
+            _controller = AdmissionController()
+            _controller_pid = os.getpid()
+        return _controller
+
+
+def acquire(user_id, timeout=_DEFAULT_WAIT):
+    get_controller().acquire(user_id, timeout)
+
+
+def release(user_id):
+    get_controller().release(user_id)
+
+
+def admit(user_id, timeout=_DEFAULT_WAIT):
+    return get_controller().admit(user_id, timeout)
+
+
+def stats():
+    return get_controller().stats()
@@ -9,14 +9,19 @@ from challenges_blueprint import challenges_blueprint
 from submissions_blueprint import submissions_blueprint
 from test_cases_blueprint import test_cases_blueprint
 from progress_blueprint import progress_blueprint
+import db_helpers
+import judge
 from db_helpers import get_db_connection
 
 app = Flask(__name__)
+db_helpers.init_app(app)
+judge.init_app(app)
 
 cors_origin = os.environ.get('CORS_ORIGIN', '*')
 supports_credentials = cors_origin != '*'
 CORS(app, resources={
-     r"/*": {"origins": cors_origin}}, supports_credentials=supports_credentials)
+     r"/*": {"origins": cors_origin}}, supports_credentials=supports_credentials,
+     expose_headers=["X-Next-Cursor"])
 
 app.register_blueprint(authentication_blueprint)
 app.register_blueprint(challenges_blueprint)
@@ -0,0 +1,68 @@
+"""
+Judge benchmark.
+Runs one Python suite through each execution path of run_test_cases and
+prints wall-clock times, so the paths can be compared on the same sandbox
+backend:
+
+- each:  a fresh python3 per test case (the default path)
+- fork:  the same per-case program through the fork server
+- batch: one process for the whole suite (batch harness)
+
+Usage: python bench_judge.py [--backend local|e2b] [--cases N] [--repeat N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+
+MODES = ("each", "fork", "batch")
+
+SOLUTION = "def add(a, b):\n    return a + b\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare judge execution paths on one suite.")
+    parser.add_argument("--backend", default=os.environ.get("SANDBOX_BACKEND", "e2b"),
+                        help="sandbox backend (default: SANDBOX_BACKEND or e2b)")
+    parser.add_argument("--cases", type=int, default=20, help="test cases in the suite")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated subset of " + ", ".join(MODES))
+    args = parser.parse_args()
+
+    # The backend is picked when e2b_service is imported
+    os.environ["SANDBOX_BACKEND"] = args.backend
+    import e2b_service
+    from harness import wrap_code, wrap_code_batch
+
+    test_cases = [{"id": i, "input": f"[{i}, {i + 1}]", "expected_output": str(2 * i + 1), "is_hidden": False}
+                  for i in range(args.cases)]
+    runs = {
+        "each": lambda: e2b_service.run_test_cases(
+            wrap_code(SOLUTION, "add", "python"), "python", test_cases, parallelism=1, fork_server=False),
+        "fork": lambda: e2b_service.run_test_cases(
+            wrap_code(SOLUTION, "add", "python"), "python", test_cases, parallelism=1, fork_server=True),
+        "batch": lambda: e2b_service.run_test_cases(
+            wrap_code_batch(SOLUTION, "add", "python"), "python", test_cases, batch=True),
+    }
+
+    print(f"backend={args.backend} cases={args.cases} repeat={args.repeat}")
+    for mode in args.modes.split(","):
+        if mode not in runs:
+            sys.exit(f"Unknown mode: {mode}")
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = runs[mode]()
+            timings.append(time.perf_counter() - start)
+            if result["overall_status"] != "passed":
+                sys.exit(f"{mode}: suite did not pass: {result['test_results'][0].get('error')}")
+        median = statistics.median(timings)
+        print(f"{mode:>6}  median {median * 1000:8.1f} ms  per case {median / args.cases * 1000:7.2f} ms"
+              f"  (min {min(timings) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Test case blob store.
+Large test case inputs and expected outputs live in test_case_blobs,
+zlib-compressed and keyed by the SHA-256 of their text, so identical
+payloads are stored once. The test_cases row keeps the hash, the full size
+and a short preview in place of the text; listings and submission results
+only ever read the preview. The judge loads full bodies when it actually
+runs a suite (not on a result-cache hit), through an in-process cache keyed
+by hash: content-addressed entries never go stale.
+"""
+
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from db_helpers import get_db_connection
+
+
+# Payloads bigger than this (UTF-8 bytes) are moved out of the test_cases row
+INLINE_MAX_BYTES = int(os.environ.get("TEST_CASE_INLINE_MAX_BYTES", "8192"))
+# Characters of a moved payload kept in the row as its preview
+PREVIEW_CHARS = 256
+CACHE_MAX_BYTES = int(os.environ.get("TEST_CASE_BLOB_CACHE_MAX_MB", "128")) * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+
+def store(cursor, text):
+    # Column values for a payload: (text or preview, blob hash or None, size).
+    data = text.encode()
+    if len(data) <= INLINE_MAX_BYTES:
+        return text, None, len(data)
+    sha = hashlib.sha256(data).hexdigest()
+    cursor.execute(
+        """INSERT INTO test_case_blobs (sha256, data, size)
+           VALUES (%s, %s, %s)
+           ON CONFLICT (sha256) DO NOTHING""",
+        (sha, zlib.compress(data, COMPRESSION_LEVEL), len(data)))
+    blob_cache.put(sha, text)
+    return text[:PREVIEW_CHARS], sha, len(data)
+
+
+def fetch(hashes, cursor=None):
+    # {hash: text} for the given blob hashes, from the cache where possible
+    # and otherwise in one query (on cursor, or a connection of our own).
+    bodies = {}
+    missing = []
+    for sha in set(hashes):
+        text = blob_cache.get(sha)
+        if text is None:
+            missing.append(sha)
+        else:
+            bodies[sha] = text
+    if not missing:
+        return bodies
+    connection = None
+    if cursor is None:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT sha256, data FROM test_case_blobs WHERE sha256 = ANY(%s)", (missing,))
+        rows = cursor.fetchall()
+    finally:
+        if connection is not None:
+            connection.close()
+    for row in rows:
+        sha, data = (row["sha256"], row["data"]) if isinstance(row, dict) else row
+        text = zlib.decompress(bytes(data)).decode()
+        blob_cache.put(sha, text)
+        bodies[sha] = text
+    lost = set(missing) - bodies.keys()
+    if lost:
+        raise LookupError(f"Test case blobs not found: {', '.join(sorted(lost))}")
+    return bodies
+
+
+def resolve(test_cases, cursor=None):
+    # Copies of test_cases with full input and expected_output bodies.
+    hashes = [tc[column] for tc in test_cases for column in ("input_blob", "expected_output_blob")
+              if tc.get(column)]
+    if not hashes:
+        return test_cases
+    bodies = fetch(hashes, cursor)
+    resolved = []
+    for tc in test_cases:
+        tc = dict(tc)
+        if tc.get("input_blob"):
+            tc["input"] = bodies[tc["input_blob"]]
+        if tc.get("expected_output_blob"):
+            tc["expected_output"] = bodies[tc["expected_output_blob"]]
+        resolved.append(tc)
+    return resolved
+
+
+def challenge_blobs(cursor, challenge_id):
+    # Blob hashes used by a challenge's test cases.
+    cursor.execute(
+        """SELECT input_blob, expected_output_blob FROM test_cases
+           WHERE challenge_id = %s AND (input_blob IS NOT NULL OR expected_output_blob IS NOT NULL)""",
+        (challenge_id,))
+    return _hashes(cursor.fetchall())
+
+
+def row_blobs(row):
+    return _hashes([row])
+
+
+def release(cursor, hashes):
+    # Delete the given blobs unless some test case still uses them.
+    if not hashes:
+        return
+    cursor.execute(
+        """DELETE FROM test_case_blobs b
+           WHERE b.sha256 = ANY(%s)
+             AND NOT EXISTS (SELECT 1 FROM test_cases tc
+                             WHERE tc.input_blob = b.sha256 OR tc.expected_output_blob = b.sha256)""",
+        (list(hashes),))
+
+
+def move_large_payloads(cursor):
+    # Move inline payloads over INLINE_MAX_BYTES (rows written before the
+    # blob store existed) into it. Returns the number of rows changed.
+    cursor.execute(
+        """SELECT id, input, expected_output FROM test_cases
+           WHERE (input_blob IS NULL AND octet_length(input) > %s)
+              OR (expected_output_blob IS NULL AND octet_length(expected_output) > %s)""",
+        (INLINE_MAX_BYTES, INLINE_MAX_BYTES))
+    rows = cursor.fetchall()
+    for test_case_id, tc_input, expected_output in rows:
+        cursor.execute(
+            """UPDATE test_cases
+               SET input = %s, input_blob = %s, input_size = %s,
+                   expected_output = %s, expected_output_blob = %s, expected_output_size = %s
+               WHERE id = %s""",
+            (*store(cursor, tc_input), *store(cursor, expected_output), test_case_id))
+    return len(rows)
+
+
+def _hashes(rows):
+    hashes = set()
+    for row in rows:
+        for sha in (row["input_blob"], row["expected_output_blob"]):
+            if sha:
+                hashes.add(sha)
+    return hashes
+
+
+class BlobCache:
+    # LRU of decompressed bodies bounded by total size. Thread-safe.
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # hash -> text
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, sha):
+        with self._lock:
+            text = self._entries.get(sha)
+            if text is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(sha)
+            self._stats["hits"] += 1
+            return text
+
+    def put(self, sha, text):
+        if len(text) > self.max_bytes:
+            return
+        with self._lock:
+            if sha in self._entries:
+                self._entries.move_to_end(sha)
+                return
+            self._entries[sha] = text
+            self._bytes += len(text)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hit_rate=round(self._stats["hits"] / lookups, 3) if lookups else 0,
+            )
+
+
+blob_cache = BlobCache()
+
+
+if __name__ == "__main__":
+    # python blob_store.py: run move_large_payloads once after migrating
+    connection = get_db_connection()
+    moved = move_large_payloads(connection.cursor())
+    connection.commit()
+    connection.close()
+    print(f"Moved payloads of {moved} test cases to the blob store")
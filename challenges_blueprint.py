@@ -1,15 +1,52 @@
 from flask import Blueprint, jsonify, request, g
 from db_helpers import get_db_connection
+import base64
 import json
 import psycopg2
 import psycopg2.extras
 from auth_middleware import token_required
 from datetime import datetime
+import os
 from harness import generate_all_starter_code
+import blob_store
+import comparators
+import repository
 
 
 challenges_blueprint = Blueprint('challenges_blueprint', __name__)
 
+# Upper bounds for per-challenge judge limits (the local sandbox's
+# LOCAL_SANDBOX_MEMORY_MB must be at least MAX_MEMORY_LIMIT_MB)
+MAX_TIME_LIMIT_MS = 60000
+MAX_MEMORY_LIMIT_MB = 2048
+
+
+def parse_limits(data):
+    # Read time_limit_ms / memory_limit_mb from a request body.
+    # Returns (time_limit_ms, memory_limit_mb, error); None means the default.
+    limits = []
+    for field, maximum in (("time_limit_ms", MAX_TIME_LIMIT_MS), ("memory_limit_mb", MAX_MEMORY_LIMIT_MB)):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)
+                                  or not 0 < value <= maximum):
+            return None, None, f"{field} must be an integer between 1 and {maximum}"
+        limits.append(value)
+    return limits[0], limits[1], None
+
+
+def parse_comparison(data):
+    # Read comparison_mode / float_tolerance from a request body.
+    # Returns (comparison_mode, float_tolerance, error).
+    comparison_mode = data.get("comparison_mode") or comparators.AUTO
+    if comparison_mode not in comparators.MODES:
+        return None, None, f"comparison_mode must be one of: {', '.join(comparators.MODES)}"
+    float_tolerance = data.get("float_tolerance")
+    if float_tolerance is not None and (isinstance(float_tolerance, bool)
+                                        or not isinstance(float_tolerance, (int, float))
+                                        or not 0 <= float_tolerance < 1):
+        return None, None, "float_tolerance must be a number between 0 and 1"
+    return comparison_mode, float_tolerance, None
+
 
 @challenges_blueprint.route('/challenges', methods=['POST'])
 @token_required
@@ -25,6 +62,13 @@ def create_challenge():
         function_name = data.get("function_name") or None
         function_params = data.get("function_params", [])
         return_type = data.get("return_type", "string")
+        time_limit_ms, memory_limit_mb, limits_error = parse_limits(data)
+        if limits_error:
+            return jsonify({"error": limits_error}), 400
+        stop_on_first_failure = bool(data.get("stop_on_first_failure", False))
+        comparison_mode, float_tolerance, comparison_error = parse_comparison(data)
+        if comparison_error:
+            return jsonify({"error": comparison_error}), 400
 
         connection = get_db_connection()
         cursor = connection.cursor(
@@ -32,71 +76,182 @@ def create_challenge():
         cursor.execute("""
                         INSERT INTO coding_challenges
                         (author, title, description, difficulty, data_structure_type,
-                         function_name, function_params, return_type, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                         function_name, function_params, return_type,
+                         time_limit_ms, memory_limit_mb, stop_on_first_failure,
+                         comparison_mode, float_tolerance, created_at, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                         RETURNING id
                         """,
                        (author_id, title, description, difficulty, data_structure_type,
                         function_name, json.dumps(function_params), return_type,
-                        datetime.utcnow(), datetime.utcnow())
+                        time_limit_ms, memory_limit_mb, stop_on_first_failure,
+                        comparison_mode, float_tolerance, datetime.utcnow(), datetime.utcnow())
                        )
         challenge_id = cursor.fetchone()["id"]
-        cursor.execute("""SELECT c.id,
-                            c.author AS author_id,
-                            c.title,
-                            c.description,
-                            c.difficulty,
-                            c.data_structure_type,
-                            c.is_curated,
-                            c.function_name,
-                            c.function_params,
-                            c.return_type,
-                            c.created_at,
-                            c.updated_at,
-                            u.username AS author_username
-                        FROM coding_challenges c
-                        JOIN users u ON c.author = u.id
-                        WHERE c.id = %s
-                       """, (challenge_id,))
-        created_challenge = cursor.fetchone()
+        created_challenge = repository.get_challenge(cursor, challenge_id)
         connection.commit()
         connection.close()
         return jsonify(created_challenge), 201
     except Exception as error:
         return jsonify({"error": str(error)}), 500
 
-ALLOWED_SORT_FIELDS = {"difficulty", "created_at"}
+ALLOWED_SORT_FIELDS = {"difficulty", "created_at", "relevance"}
 DIFFICULT_ORDER = {"easy": 1, "medium": 2, "hard": "3"}
 
+# Page size of GET /challenges when paginating (limit= or cursor= given)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# q= search: full-text over title and description (search_vector), plus
+# typo-tolerant title matching with pg_trgm. Set CHALLENGE_SEARCH_TRIGRAM=false
+# on databases without the pg_trgm extension.
+SEARCH_TRIGRAM = os.environ.get("CHALLENGE_SEARCH_TRIGRAM", "true").lower() == "true"
+MAX_QUERY_LENGTH = 200
+
+# Keyset pagination per sort: (key columns, ORDER BY, comparison with the
+# last row of the previous page). The composite indexes in schema.sql
+# match these orders, with and without each filter column in front.
+# "relevance" (the default with q=) orders by search_rank, computed per query.
+SORT_KEYS = {
+    "created_at": (("c.created_at", "c.id"), "c.created_at DESC, c.id DESC", "<"),
+    "difficulty": (("c.difficulty_rank", "c.id"), "c.difficulty_rank, c.id", ">"),
+    "relevance": (("search_rank", "c.id"), "_sort_key DESC, c.id DESC", "<"),
+}
+
+
+def search_terms(q):
+    # (rank expression, WHERE condition, rank params, condition params) of
+    # a q= search. Title matches weigh more than description matches.
+    query = "websearch_to_tsquery('english', %s)"
+    rank = f"ts_rank(c.search_vector, {query})"
+    condition = f"c.search_vector @@ {query}"
+    rank_params, condition_params = [q], [q]
+    if SEARCH_TRIGRAM:
+        # word_similarity: how well q matches some part of the title
+        rank += " + word_similarity(%s, c.title)"
+        condition += " OR %s <%% c.title"
+        rank_params.append(q)
+        condition_params.append(q)
+    return f"({rank})::real", f"({condition})", rank_params, condition_params
+
+
+def parse_fields(value):
+    # fields=id,title,... -> list of challenge fields (id always included),
+    # or all of them. Returns (fields, error).
+    if not value:
+        return list(repository.CHALLENGE_FIELDS), None
+    fields = ["id"]
+    for field in value.split(","):
+        field = field.strip()
+        if field not in repository.CHALLENGE_FIELDS:
+            return None, f"Unknown field: {field}. Fields: {', '.join(repository.CHALLENGE_FIELDS)}"
+        if field not in fields:
+            fields.append(field)
+    return fields, None
+
+
+def parse_page(args, sort_by, q=None):
+    # limit= / cursor= -> (limit, key after which the page starts, error).
+    # limit is None when the request doesn't paginate.
+    limit = args.get("limit")
+    cursor = args.get("cursor")
+    if limit is None and cursor is None:
+        return None, None, None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        return None, None, "limit must be an integer"
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, None, f"limit must be between 1 and {MAX_PAGE_SIZE}"
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, sort_by, q)
+        if after is None:
+            return None, None, "Invalid cursor for this sort order"
+    return limit, after, None
+
+
+def encode_cursor(sort_by, key, q=None):
+    # Opaque token for the sort key of a page's last row
+    if sort_by == "created_at":
+        key = [key[0].isoformat(), key[1]]
+    payload = json.dumps({"sort": sort_by, "key": list(key), "q": q}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, sort_by, q=None):
+    # Sort key from encode_cursor, or None if the token isn't one for
+    # sort_by (and the same search)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if payload["sort"] != sort_by or payload.get("q") != q:
+            return None
+        first, last_id = payload["key"]
+        if not isinstance(last_id, int):
+            return None
+        if sort_by == "created_at":
+            return datetime.fromisoformat(first), last_id
+        if sort_by == "relevance":
+            return float(first), last_id
+        return int(first), last_id
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
 @challenges_blueprint.route('/challenges', methods=['GET'])
 def challenges_index():
+    # Without limit= or cursor= every matching challenge is returned. With
+    # them, one page of at most limit; the cursor for the next page is in
+    # the X-Next-Cursor header (absent on the last page). fields= limits the
+    # returned fields, e.g. fields=title,difficulty for list views.
+    # q= searches titles and descriptions; matches are ranked by relevance
+    # unless sort_by says otherwise.
     try:
         difficulty_filter = request.args.get("difficulty")
         data_structure_filter = request.args.get("data_structure_type")
         is_curated_filter = request.args.get("is_curated")
-        sort_by = request.args.get("sort_by", "created_at")
+        q = request.args.get("q", "").strip() or None
+        sort_by = request.args.get("sort_by", "relevance" if q else "created_at")
 
-        if sort_by not in ALLOWED_SORT_FIELDS:
+        if sort_by not in ALLOWED_SORT_FIELDS or (sort_by == "relevance" and not q):
             sort_by = "created_at"
+        if q and len(q) > MAX_QUERY_LENGTH:
+            return jsonify({"error": f"q is limited to {MAX_QUERY_LENGTH} characters"}), 400
+
+        fields, fields_error = parse_fields(request.args.get("fields"))
+        if fields_error:
+            return jsonify({"error": fields_error}), 400
+        limit, after, page_error = parse_page(request.args, sort_by, q)
+        if page_error:
+            return jsonify({"error": page_error}), 400
+        key_columns, order_by, comparison = SORT_KEYS[sort_by]
+
+        select_list = repository.challenge_columns(fields)
+        select_params = []
+        conditions = []
+        params = []
+        if q:
+            rank, search_condition, rank_params, search_params = search_terms(q)
+            select_list += f", {rank} AS search_rank"
+            select_params.extend(rank_params)
+            conditions.append(search_condition)
+            params.extend(search_params)
+        sort_key = key_columns[0]
+        sort_key_params = []
+        key_placeholder = "%s"
+        if sort_key == "search_rank":
+            # An output name can't be used in WHERE; repeat the expression.
+            # The cursor's rank is compared as the same real it was read as.
+            sort_key, sort_key_params, key_placeholder = rank, rank_params, "%s::real"
 
-        base_query = """SELECT c.id,
-                        c.author AS author_id,
-                        c.title,
-                        c.description,
-                        c.difficulty,
-                        c.data_structure_type,
-                        c.is_curated,
-                        c.function_name,
-                        c.function_params,
-                        c.return_type,
-                        c.created_at,
-                        c.updated_at,
-                        u.username AS author_username
+        # The sort key is selected too, for the next cursor; not returned
+        base_query = f"""SELECT {select_list},
+                        {sort_key} AS _sort_key
                     FROM coding_challenges c
                     INNER JOIN users u ON c.author = u.id
                 """
-        params = []
-        conditions = []
+        params = select_params + sort_key_params + params
 
         if difficulty_filter:
             conditions.append("c.difficulty = %s")
@@ -110,12 +265,17 @@ def challenges_index():
             conditions.append("c.is_curated = %s")
             params.append(is_curated_filter.lower() == "true")
 
+        if after is not None:
+            conditions.append(f"({sort_key}, {key_columns[1]}) {comparison} ({key_placeholder}, %s)")
+            params.extend(sort_key_params + list(after))
+
         if conditions:
             base_query += " WHERE " + " AND ".join(conditions)
-        if sort_by == "difficulty":
-            base_query = base_query + " ORDER BY CASE c.difficulty WHEN 'easy' THEN 1 WHEN 'medium' THEN 2 WHEN 'hard' THEN 3 END"
-        else:
-            base_query = base_query + " ORDER BY c.created_at DESC"
+        base_query += " ORDER BY " + order_by
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            base_query += " LIMIT %s"
+            params.append(limit + 1)
 
         connection = get_db_connection()
         cursor = connection.cursor(
@@ -125,7 +285,19 @@ def challenges_index():
 
         connection.commit()
         connection.close()
-        return jsonify(challenges), 200
+
+        next_cursor = None
+        if limit is not None and len(challenges) > limit:
+            challenges = challenges[:limit]
+            last = challenges[-1]
+            next_cursor = encode_cursor(sort_by, (last["_sort_key"], last["id"]), q)
+        for challenge in challenges:
+            del challenge["_sort_key"]
+
+        response = jsonify(challenges)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return response, 200
     except Exception as error:
         return jsonify({"error": str(error)}), 500
 
@@ -136,26 +308,7 @@ def show_challenge(challenge_id):
         connection = get_db_connection()
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor)
-        cursor.execute("""
-            SELECT c.id,
-                c.author AS author_id,
-                c.title,
-                c.description,
-                c.difficulty,
-                c.data_structure_type,
-                c.is_curated,
-                c.function_name,
-                c.function_params,
-                c.return_type,
-                c.created_at,
-                c.updated_at,
-                u.username AS author_username,
-                (SELECT COUNT(*) FROM test_cases tc WHERE tc.challenge_id = c.id) AS test_case_count
-            FROM coding_challenges c
-            INNER JOIN users u ON c.author = u.id
-            WHERE c.id = %s""",
-                       (challenge_id,))
-        challenge = cursor.fetchone()
+        challenge = repository.get_challenge(cursor, challenge_id, with_test_case_count=True)
         connection.close()
         if challenge is not None:
             response = dict(challenge)
@@ -184,6 +337,13 @@ def update_challenge(challenge_id):
         function_name = data.get("function_name") or None
         function_params = data.get("function_params", [])
         return_type = data.get("return_type", "string")
+        time_limit_ms, memory_limit_mb, limits_error = parse_limits(data)
+        if limits_error:
+            return jsonify({"error": limits_error}), 400
+        stop_on_first_failure = bool(data.get("stop_on_first_failure", False))
+        comparison_mode, float_tolerance, comparison_error = parse_comparison(data)
+        if comparison_error:
+            return jsonify({"error": comparison_error}), 400
 
         connection = get_db_connection()
         cursor = connection.cursor(
@@ -191,38 +351,27 @@ def update_challenge(challenge_id):
         cursor.execute("SELECT * FROM coding_challenges WHERE id = %s", (challenge_id,))
         challenge_to_update = cursor.fetchone()
         if challenge_to_update is None:
+            connection.close()
             return jsonify({"error": "Challenge not found"}), 404
         connection.commit()
         if challenge_to_update["author"] != g.user["id"]:
+            connection.close()
             return jsonify({"error": "Unauthorized"}), 401
 
         cursor.execute("""UPDATE coding_challenges
                         SET title = %s, description = %s, difficulty = %s,
                             data_structure_type = %s, function_name = %s,
-                            function_params = %s, return_type = %s, updated_at = %s
+                            function_params = %s, return_type = %s,
+                            time_limit_ms = %s, memory_limit_mb = %s,
+                            stop_on_first_failure = %s, comparison_mode = %s,
+                            float_tolerance = %s, updated_at = %s
                         WHERE id = %s RETURNING id""",
                        (title, description, difficulty, data_structure_type,
                         function_name, json.dumps(function_params), return_type,
-                        datetime.utcnow(), challenge_id))
+                        time_limit_ms, memory_limit_mb, stop_on_first_failure,
+                        comparison_mode, float_tolerance, datetime.utcnow(), challenge_id))
         updated_challenge_id = cursor.fetchone()["id"]
-        cursor.execute("""SELECT c.id,
-                            c.author AS author_id,
-                            c.title,
-                            c.description,
-                            c.difficulty,
-                            c.data_structure_type,
-                            c.is_curated,
-                            c.function_name,
-                            c.function_params,
-                            c.return_type,
-                            c.created_at,
-                            c.updated_at,
-                            u.username AS author_username
-                        FROM coding_challenges c
-                        JOIN users u ON c.author = u.id
-                        WHERE c.id = %s
-                       """, (updated_challenge_id,))
-        updated_challenge = cursor.fetchone()
+        updated_challenge = repository.get_challenge(cursor, updated_challenge_id)
         connection.commit()
         connection.close()
         return jsonify(updated_challenge), 200
@@ -237,14 +386,23 @@ def delete_challenge(challenge_id):
         connection = get_db_connection()
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor)
-        cursor.execute("SELECT * FROM coding_challenges WHERE id = %s", (challenge_id,))
+        cursor.execute(
+            """SELECT id, author, title, description, difficulty, data_structure_type, is_curated,
+                      function_name, function_params, return_type, time_limit_ms, memory_limit_mb,
+                      stop_on_first_failure, comparison_mode, float_tolerance, created_at, updated_at
+               FROM coding_challenges WHERE id = %s""",
+            (challenge_id,))
         challenge_to_delete = cursor.fetchone()
         if challenge_to_delete is None:
+            connection.close()
             return jsonify({"error": "Challenge not found"}), 404
         connection.commit()
         if challenge_to_delete["author"] != g.user["id"]:
+            connection.close()
             return jsonify({"error": "Unauthorized"}), 401
+        blobs = blob_store.challenge_blobs(cursor, challenge_id)
         cursor.execute("DELETE FROM coding_challenges WHERE id = %s", (challenge_id,))
+        blob_store.release(cursor, blobs)
         connection.commit()
         connection.close()
         return jsonify(challenge_to_delete), 200
@@ -0,0 +1,509 @@
+"""
+Output comparison.
+Decides whether a test case's actual output matches its expected output
+under the challenge's comparison mode. Expected outputs are prepared (parsed)
+once and kept in an LRU cache bounded by size, so judging a suite doesn't re-parse them for
+every submission. Actual outputs are matched against the prepared value
+while they are scanned, stopping at the first difference, instead of being
+parsed into a second tree first.
+
+Modes:
+- auto: exact text, else JSON-structural (the original behaviour)
+- exact: text equality (surrounding whitespace ignored)
+- whitespace: equal after collapsing runs of whitespace
+- json: JSON-structural; object key order and formatting don't matter
+- float: JSON-structural (or whitespace tokens, for non-JSON output) with
+  numbers equal within float_tolerance, relative for large values
+- unordered: the output is a JSON list; element order doesn't matter
+
+Expected outputs too large to store are kept as a digest instead (see
+digest()); they match like json mode for JSON output and like whitespace
+mode otherwise, whatever the challenge's mode.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from json.decoder import scanstring
+
+
+AUTO = "auto"
+EXACT = "exact"
+WHITESPACE = "whitespace"
+JSON = "json"
+FLOAT = "float"
+UNORDERED = "unordered"
+MODES = (AUTO, EXACT, WHITESPACE, JSON, FLOAT, UNORDERED)
+
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+
+# Prepared expected outputs kept per process, by estimated memory
+PREPARED_CACHE_MAX_BYTES = int(os.environ.get("COMPARATOR_CACHE_MAX_MB", "64")) * 1024 * 1024
+# Expected outputs longer than this are prepared for each use, not cached
+PREPARED_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("COMPARATOR_CACHE_MAX_ENTRY_KB", "1024")) * 1024
+# Rough memory of a prepared output per character of its text (the text
+# plus its parsed tree)
+PREPARED_BYTES_PER_CHAR = 4
+
+
+class InvalidExpectedOutput(ValueError):
+    pass
+
+
+def compare(actual_output, expected_output, mode=AUTO, float_tolerance=None):
+    # True if actual_output matches expected_output under mode.
+    return checker(expected_output, mode, float_tolerance).matches(actual_output)
+
+
+def checker(expected_output, mode=AUTO, float_tolerance=None):
+    # Like prepare(), but an expected output that is unusable in this mode
+    # (saved before the challenge switched modes) just never matches.
+    try:
+        return prepare(expected_output, mode, float_tolerance)
+    except InvalidExpectedOutput:
+        return _NEVER
+
+
+def prepare(expected_output, mode=AUTO, float_tolerance=None):
+    # Prepared matcher for an expected output (cached). Raises
+    # InvalidExpectedOutput if the output can never match in this mode.
+    if mode == FLOAT and float_tolerance is None:
+        float_tolerance = DEFAULT_FLOAT_TOLERANCE
+    mode = mode or AUTO
+    float_tolerance = float_tolerance if mode == FLOAT else None
+    if len(expected_output) > PREPARED_CACHE_MAX_ENTRY_BYTES:
+        return _prepare(expected_output, mode, float_tolerance)
+    # Keyed by a digest, so the key doesn't hold a second copy of the text
+    key = (hashlib.sha256(expected_output.encode()).digest(), mode, float_tolerance)
+    prepared = prepared_cache.get(key)
+    if prepared is None:
+        prepared = _prepare(expected_output, mode, float_tolerance)
+        prepared_cache.put(key, prepared, len(expected_output) * PREPARED_BYTES_PER_CHAR)
+    return prepared
+
+
+def validate(expected_output, mode=AUTO):
+    # Error message if expected_output is unusable in mode, else None.
+    try:
+        prepare(expected_output, mode)
+    except InvalidExpectedOutput as error:
+        return str(error)
+    return None
+
+
+def digest(output):
+    # sha256 hex of output's canonical form: JSON re-serialized compactly with
+    # sorted keys (integral floats as ints), other text with whitespace runs
+    # collapsed.
+    text = (output or "").strip()
+    parsed = _loads(text)
+    if parsed is _NOT_JSON:
+        canonical = " ".join(text.split())
+    else:
+        canonical = json.dumps(_digest_form(parsed), separators=(",", ":"), sort_keys=True,
+                               ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def digest_checker(expected_sha256):
+    # Matcher for an expected output stored as its digest().
+    return _DigestExpected(expected_sha256.lower())
+
+
+def validate_digest(expected_sha256, mode=AUTO):
+    # Error message if expected_sha256 can't be used in mode, else None.
+    if not re.fullmatch(r"[0-9a-fA-F]{64}", expected_sha256 or ""):
+        return "expected_output_sha256 must be a hex SHA-256 digest"
+    if mode in (FLOAT, UNORDERED):
+        return f"expected_output_sha256 can't be used with the '{mode}' comparison mode"
+    return None
+
+
+def prepared_cache_stats():
+    return prepared_cache.stats()
+
+
+class PreparedCache:
+    # LRU of prepared expected outputs bounded by estimated size. Thread-safe.
+
+    def __init__(self, max_bytes=PREPARED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (prepared, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, prepared, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (prepared, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes,
+                        max_bytes=self.max_bytes)
+
+
+prepared_cache = PreparedCache()
+
+
+def _prepare(expected_output, mode, float_tolerance):
+    if mode not in MODES:
+        raise ValueError(f"Unknown comparison mode: {mode}")
+    text = expected_output.strip()
+    if mode == EXACT:
+        return _ExactExpected(text)
+    if mode == WHITESPACE:
+        return _WhitespaceExpected(text)
+    parsed = _loads(text)
+    if mode == AUTO:
+        return _AutoExpected(text, parsed)
+    if mode == FLOAT and parsed is _NOT_JSON:
+        return _TokensExpected(text, float_tolerance)
+    if parsed is _NOT_JSON:
+        raise InvalidExpectedOutput(f"expected_output must be valid JSON for the '{mode}' comparison mode")
+    if mode == UNORDERED:
+        if not isinstance(parsed, list):
+            raise InvalidExpectedOutput("expected_output must be a JSON list for the 'unordered' comparison mode")
+        return _UnorderedExpected(parsed)
+    return _JsonExpected(parsed, float_tolerance)
+
+
+_NOT_JSON = object()
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError, RecursionError):
+        return _NOT_JSON
+
+
+# -- Prepared expected outputs -------------------------------------------------
+
+class _NeverExpected:
+
+    def matches(self, actual):
+        return False
+
+
+_NEVER = _NeverExpected()
+
+
+class _DigestExpected:
+
+    def __init__(self, sha256):
+        self.sha256 = sha256
+
+    def matches(self, actual):
+        return actual is not None and digest(actual) == self.sha256
+
+
+class _ExactExpected:
+
+    def __init__(self, text):
+        self.text = text
+
+    def matches(self, actual):
+        return actual is not None and actual.strip() == self.text
+
+
+class _WhitespaceExpected:
+
+    def __init__(self, text):
+        self.tokens = text.split()
+
+    def matches(self, actual):
+        return actual is not None and actual.split() == self.tokens
+
+
+class _JsonExpected:
+
+    def __init__(self, value, float_tolerance=None):
+        self.value = value
+        self.float_tolerance = float_tolerance
+
+    def matches(self, actual):
+        if actual is None:
+            return False
+        return _StreamMatcher(actual, self.float_tolerance).matches_document(self.value)
+
+
+class _AutoExpected:
+    # Text equality first; JSON-structural when the expected output is JSON.
+
+    def __init__(self, text, value):
+        self.text = text
+        self.json = _JsonExpected(value) if value is not _NOT_JSON else None
+
+    def matches(self, actual):
+        if actual is None:
+            return False
+        if actual.strip() == self.text:
+            return True
+        return self.json is not None and self.json.matches(actual)
+
+
+class _TokensExpected:
+    # Float mode for plain-text output: whitespace-separated tokens, numbers
+    # compared within tolerance.
+
+    def __init__(self, text, float_tolerance):
+        self.tokens = [_number_or_text(token) for token in text.split()]
+        self.float_tolerance = float_tolerance
+
+    def matches(self, actual):
+        if actual is None:
+            return False
+        tokens = actual.split()
+        if len(tokens) != len(self.tokens):
+            return False
+        for token, expected in zip(tokens, self.tokens):
+            if isinstance(expected, str):
+                if token != expected:
+                    return False
+                continue
+            number = _number_or_text(token)
+            if isinstance(number, str) or not _numbers_match(number, expected, self.float_tolerance):
+                return False
+        return True
+
+
+class _UnorderedExpected:
+    # A JSON list compared as a multiset. Elements are reduced to a canonical
+    # form one at a time, so the actual list is never held twice.
+
+    def __init__(self, values):
+        self.counts = Counter(_canonical(value) for value in values)
+        self.length = len(values)
+
+    def matches(self, actual):
+        if actual is None:
+            return False
+        remaining = Counter(self.counts)
+        seen = 0
+        try:
+            for element in _iter_list(actual):
+                key = _canonical(element)
+                if not remaining[key]:
+                    return False
+                remaining[key] -= 1
+                seen += 1
+        except (ValueError, RecursionError):
+            return False
+        return seen == self.length
+
+
+# -- Streaming JSON matching ---------------------------------------------------
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+
+
+class _Mismatch(Exception):
+    pass
+
+
+class _StreamMatcher:
+    # Walks the actual JSON text guided by the expected value. Nothing of the
+    # actual document is built beyond the scalar being compared, and the walk
+    # ends at the first difference.
+
+    def __init__(self, text, float_tolerance=None):
+        self.text = text
+        self.pos = 0
+        self.float_tolerance = float_tolerance
+
+    def matches_document(self, expected):
+        try:
+            self._skip_ws()
+            self._match(expected)
+            self._skip_ws()
+            return self.pos == len(self.text)
+        except (_Mismatch, RecursionError):
+            return False
+
+    def _skip_ws(self):
+        self.pos = _WS.match(self.text, self.pos).end()
+
+    def _peek(self):
+        if self.pos >= len(self.text):
+            raise _Mismatch()
+        return self.text[self.pos]
+
+    def _expect_char(self, char):
+        self._skip_ws()
+        if self._peek() != char:
+            raise _Mismatch()
+        self.pos += 1
+
+    def _match(self, expected):
+        self._skip_ws()
+        char = self._peek()
+        if isinstance(expected, dict):
+            self._match_object(expected)
+        elif isinstance(expected, list):
+            self._match_array(expected)
+        elif isinstance(expected, str):
+            if char != '"' or self._string() != expected:
+                raise _Mismatch()
+        elif isinstance(expected, bool) or expected is None:
+            literal = {True: "true", False: "false", None: "null"}[expected]
+            if not self.text.startswith(literal, self.pos):
+                raise _Mismatch()
+            self.pos += len(literal)
+        else:
+            if not _numbers_match(self._number(), expected, self.float_tolerance):
+                raise _Mismatch()
+
+    def _match_object(self, expected):
+        self._expect_char("{")
+        seen = set()
+        self._skip_ws()
+        if self._peek() == "}":
+            self.pos += 1
+        else:
+            while True:
+                self._skip_ws()
+                if self._peek() != '"':
+                    raise _Mismatch()
+                key = self._string()
+                if key in seen or key not in expected:
+                    raise _Mismatch()
+                seen.add(key)
+                self._expect_char(":")
+                self._match(expected[key])
+                self._skip_ws()
+                char = self._peek()
+                self.pos += 1
+                if char == "}":
+                    break
+                if char != ",":
+                    raise _Mismatch()
+        if len(seen) != len(expected):
+            raise _Mismatch()
+
+    def _match_array(self, expected):
+        self._expect_char("[")
+        self._skip_ws()
+        if self._peek() == "]":
+            self.pos += 1
+            if expected:
+                raise _Mismatch()
+            return
+        for index, item in enumerate(expected):
+            self._match(item)
+            self._skip_ws()
+            char = self._peek()
+            self.pos += 1
+            if char == "]":
+                if index != len(expected) - 1:
+                    raise _Mismatch()
+                return
+            if char != ",":
+                raise _Mismatch()
+        # More elements than expected
+        raise _Mismatch()
+
+    def _string(self):
+        try:
+            value, self.pos = scanstring(self.text, self.pos + 1)
+        except ValueError:
+            raise _Mismatch()
+        return value
+
+    def _number(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if match is None:
+            raise _Mismatch()
+        self.pos = match.end()
+        if match.group(1) or match.group(2):
+            return float(match.group())
+        return int(match.group())
+
+
+def _numbers_match(actual, expected, float_tolerance):
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return False
+    if actual == expected:
+        return True
+    if not float_tolerance:
+        return False
+    return abs(actual - expected) <= float_tolerance * max(1.0, abs(expected))
+
+
+def _number_or_text(token):
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+def _canonical(value):
+    # Hashable form of a JSON value in which equal values (1 and 1.0, objects
+    # with different key order) coincide.
+    if isinstance(value, dict):
+        return ("o", frozenset((k, _canonical(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("a", tuple(_canonical(v) for v in value))
+    if isinstance(value, bool) or value is None:
+        return ("l", value)
+    if isinstance(value, (int, float)):
+        return ("n", value)
+    return ("s", value)
+
+
+def _digest_form(value):
+    if isinstance(value, dict):
+        return {k: _digest_form(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_digest_form(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_list(text):
+    # Yield the elements of the JSON list in text one at a time.
+    decoder = json.JSONDecoder()
+    pos = _WS.match(text, 0).end()
+    if not text.startswith("[", pos):
+        raise ValueError("not a list")
+    pos = _WS.match(text, pos + 1).end()
+    if text.startswith("]", pos):
+        pos += 1
+    else:
+        while True:
+            element, pos = decoder.raw_decode(text, pos)
+            yield element
+            pos = _WS.match(text, pos).end()
+            if text.startswith("]", pos):
+                pos += 1
+                break
+            if not text.startswith(",", pos):
+                raise ValueError("malformed list")
+            pos = _WS.match(text, pos + 1).end()
+    if _WS.match(text, pos).end() != len(text):
+        raise ValueError("trailing data")
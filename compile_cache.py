@@ -0,0 +1,92 @@
+"""
+Compile artifact cache.
+Compiled languages build once per submission. The build output (an archive
+of the build directory) is kept here, keyed by the source, the compile
+command and the sandbox toolchain's version, so an identical resubmission
+uploads the archive instead of compiling again. Compile errors are cached
+the same way: the same source fails the same way on the same toolchain.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+CACHE_MAX_BYTES = int(os.environ.get("COMPILE_CACHE_MAX_MB", "256")) * 1024 * 1024
+# Archives bigger than this are not kept
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get("COMPILE_CACHE_MAX_ENTRY_MB", "32")) * 1024 * 1024
+
+
+def make_key(language, toolchain, compile_cmd, source_code):
+    payload = json.dumps([language, toolchain, compile_cmd, source_code])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CompiledArtifact:
+    # archive: bytes of the build directory's tar, or None if compilation
+    # failed (error then holds the compiler output).
+
+    def __init__(self, archive=None, error=None):
+        self.archive = archive
+        self.error = error
+
+    @property
+    def size(self):
+        return len(self.archive or b"") + len(self.error or "")
+
+
+class CompileCache:
+    # LRU bounded by total size. Thread-safe.
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_entry_bytes=CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()   # key -> CompiledArtifact
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return artifact
+
+    def put(self, key, artifact):
+        if artifact.size > min(self.max_entry_bytes, self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = artifact
+            self._bytes += artifact.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hit_rate=round(self._stats["hits"] / lookups, 3) if lookups else 0,
+            )
+
+
+compile_cache = CompileCache()
@@ -1,19 +1,298 @@
+"""
+Postgres connections.
+get_db_connection() hands out connections from a process-wide pool instead
+of opening (and TLS-handshaking) a new one per request; close() returns the
+connection to the pool. Inside a Flask request, connections still checked
+out when the request ends are returned by a teardown hook, so an early
+return can't leak one. Pooled connections are checked before reuse after
+sitting idle, replaced after DB_POOL_MAX_LIFETIME_SECONDS, and never shared
+across a fork (gunicorn --preload): a child process starts with an empty
+pool.
+"""
+
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
+from flask import g, has_app_context
 
 
-def get_db_connection():
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+# Seconds to wait for a free connection when all POOL_MAX_SIZE are in use
+POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+POOL_MAX_LIFETIME_SECONDS = float(os.environ.get("DB_POOL_MAX_LIFETIME_SECONDS", "1800"))
+# Idle connections beyond DB_POOL_MIN_SIZE are closed after this long
+POOL_MAX_IDLE_SECONDS = float(os.environ.get("DB_POOL_MAX_IDLE_SECONDS", "300"))
+# A connection idle longer than this is checked with SELECT 1 before reuse
+POOL_HEALTH_CHECK_IDLE_SECONDS = float(os.environ.get("DB_POOL_HEALTH_CHECK_IDLE_SECONDS", "30"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Connection(psycopg2.extensions.connection):
+    # Remembers the server-side prepared statements of its session, and
+    # those to DEALLOCATE before preparing again (see repository.py).
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.stale_statements = set()
+
+
+def connect():
+    # A new, unpooled connection. For long-lived special-purpose connections
+    # (e.g. the judge worker's LISTEN); everything else uses the pool.
     database_url = os.getenv('DATABASE_URL')
     if database_url:
         # Heroku uses postgres:// but psycopg2 requires postgresql://
         if database_url.startswith('postgres://'):
             database_url = database_url.replace('postgres://', 'postgresql://', 1)
-        connection = psycopg2.connect(database_url, sslmode='require')
+        connection = psycopg2.connect(database_url, sslmode='require', connection_factory=Connection)
     else:
         connection = psycopg2.connect(
             host='localhost',
             database=os.getenv('POSTGRES_DATABASE'),
             user=os.getenv('POSTGRES_USERNAME'),
-            password=os.getenv('POSTGRES_PASSWORD')
+            password=os.getenv('POSTGRES_PASSWORD'),
+            connection_factory=Connection
         )
     return connection
+
+
+def get_db_connection():
+    # A pooled connection; close() gives it back.
+    connection = pool.acquire()
+    if has_app_context():
+        g.setdefault("_db_connections", []).append(connection)
+    return connection
+
+
+@contextmanager
+def db_connection():
+    # with db_connection() as connection: ... Rolls back on an exception;
+    # the connection is returned to the pool either way.
+    connection = get_db_connection()
+    try:
+        yield connection
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def init_app(app):
+    # Return connections a request left checked out when it ends.
+    @app.teardown_appcontext
+    def _release_request_connections(_exception):
+        for connection in g.pop("_db_connections", []):
+            connection.close()
+
+
+class PooledConnection:
+    # Proxy for a pooled psycopg2 connection. close() returns it to the
+    # pool (more than once is harmless); after that it can't be used.
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_raw", raw)
+
+    def __getattr__(self, name):
+        raw = self._raw
+        if raw is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        if self._raw is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        setattr(self._raw, name, value)
+
+    @property
+    def closed(self):
+        return self._raw is None or self._raw.closed
+
+    def __del__(self):
+        # Dropped without close() outside a request: still give it back
+        self.close()
+
+    def close(self):
+        raw = self._raw
+        if raw is None:
+            return
+        object.__setattr__(self, "_raw", None)
+        self._pool.release(raw)
+
+
+class ConnectionPool:
+    # Thread-safe. Connections are opened on demand up to max_size and kept
+    # for reuse; idle ones beyond min_size are closed after max_idle seconds.
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT_SECONDS,
+                 max_lifetime=POOL_MAX_LIFETIME_SECONDS, max_idle=POOL_MAX_IDLE_SECONDS,
+                 health_check_idle=POOL_HEALTH_CHECK_IDLE_SECONDS, connect=connect):
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_idle = health_check_idle
+        self._connect = connect
+        self._inherited = []
+        self._lock = threading.Condition()
+        self._reset()
+        self._stats = {"opened": 0, "closed": 0, "reused": 0, "health_check_failures": 0, "timeouts": 0}
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []        # [(raw connection, opened_at, idle_since)], most recent last
+        self._opened_at = {}   # id(raw) -> opened_at, for every connection of this process
+        self._connecting = 0
+        self._in_use = 0
+
+    def _after_fork(self):
+        # The parent's sockets are shared with the child. Closing them here
+        # would end the parent's sessions, so the child just forgets them
+        # (keeping references so they are never garbage-collected either).
+        self._inherited.extend(raw for raw, _, _ in self._idle)
+        self._lock = threading.Condition()
+        self._reset()
+
+    def acquire(self):
+        if os.getpid() != self._pid:
+            self._after_fork()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                raw = self._take(deadline)
+            if raw is None:
+                return self._open()
+            raw, opened_at, idle_since = raw
+            # The health check runs outside the lock
+            if self._usable(raw, opened_at, idle_since):
+                return PooledConnection(self, raw)
+            with self._lock:
+                self._in_use -= 1
+                self._discard(raw)
+                self._lock.notify()
+
+    def _take(self, deadline):
+        # An idle connection entry, or None once a slot for a new connection
+        # is reserved. Called with the lock held.
+        while True:
+            if self._idle:
+                self._in_use += 1
+                self._stats["reused"] += 1
+                return self._idle.pop()
+            if len(self._opened_at) + self._connecting < self.max_size:
+                self._connecting += 1
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stats["timeouts"] += 1
+                raise PoolTimeout(
+                    f"No database connection free within {self.timeout:g}s "
+                    f"(pool max size {self.max_size})")
+            self._lock.wait(remaining)
+
+    def _open(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._lock:
+                self._connecting -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._opened_at[id(raw)] = time.monotonic()
+            self._in_use += 1
+            self._stats["opened"] += 1
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        opened_at = self._opened_at.get(id(raw))
+        if opened_at is None:
+            # Inherited from the parent process: keep it unclosed
+            self._inherited.append(raw)
+            return
+        # Rolling back runs outside the lock
+        reusable = self._reusable(raw, opened_at)
+        with self._lock:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw, opened_at, time.monotonic()))
+                self._trim()
+            else:
+                self._discard(raw)
+            self._lock.notify()
+
+    def _reusable(self, raw, opened_at):
+        # Back to a clean state for the next user, or False
+        if raw.closed or time.monotonic() - opened_at > self.max_lifetime:
+            return False
+        try:
+            if raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                raw.rollback()
+            if raw.autocommit:
+                raw.autocommit = False
+        except psycopg2.Error:
+            return False
+        return raw.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def _usable(self, raw, opened_at, idle_since):
+        now = time.monotonic()
+        if raw.closed or now - opened_at > self.max_lifetime:
+            return False
+        if now - idle_since < self.health_check_idle:
+            return True
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            raw.rollback()
+            return True
+        except psycopg2.Error:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def _trim(self):
+        # Close connections idle past max_idle, keeping min_size
+        expired = time.monotonic() - self.max_idle
+        while len(self._idle) > self.min_size and self._idle[0][2] < expired:
+            raw, _, _ = self._idle.pop(0)
+            self._discard(raw)
+
+    def _discard(self, raw):
+        self._opened_at.pop(id(raw), None)
+        self._stats["closed"] += 1
+        try:
+            raw.close()
+        except psycopg2.Error:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                raw, _, _ = self._idle.pop()
+                self._discard(raw)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                open=len(self._opened_at),
+                idle=len(self._idle),
+                in_use=self._in_use,
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+
+
+pool = ConnectionPool()
@@ -1,51 +1,377 @@
 """
 E2B code execution service.
-Sends user code to E2B cloud sandboxes for execution and evaluates
-results against test cases.
+Sends user code to E2B cloud sandboxes (or the local subprocess backend,
+see sandbox_backends.py) for execution and evaluates results against
+test cases.
 """
 
+import inspect
 import json
+import math
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import comparators
+import input_generators
+from compile_cache import CompiledArtifact, compile_cache, make_key as make_compile_key
 from dotenv import load_dotenv
-from e2b_code_interpreter import Sandbox
+from e2b import CommandExitException, TimeoutException
+from harness import (PYTHON_FORK_SERVER, build_batch_input, build_fork_server_input,
+                     parse_batch_frames, parse_metrics)
+from resilience import ResilientCreator
+from sandbox_backends import get_backend
+from sandbox_pool import SandboxPool
 
 load_dotenv()
 
 
-# Map app language strings to sandbox filenames and run commands
+# Warm sandbox pool (opt-in). Sandboxes are created with a lifetime a bit
+# longer than POOL_MAX_AGE so E2B never reaps one while it is leased.
+POOL_ENABLED = os.environ.get("E2B_POOL_ENABLED", "false").lower() == "true"
+POOL_MIN_SIZE = int(os.environ.get("E2B_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("E2B_POOL_MAX_SIZE", "4"))
+POOL_MAX_USES = int(os.environ.get("E2B_POOL_MAX_USES", "20"))
+POOL_MAX_AGE = int(os.environ.get("E2B_POOL_MAX_AGE", "240"))
+
+# How many test cases may run at once inside one sandbox (1 = sequential)
+DEFAULT_PARALLELISM = int(os.environ.get("JUDGE_PARALLELISM", "1"))
+
+# Run sequential per-case Python through a resident interpreter that forks
+# a child per case, instead of starting python3 for each (see
+# harness.PYTHON_FORK_SERVER)
+FORK_SERVER_ENABLED = os.environ.get("JUDGE_PYTHON_FORK_SERVER", "false").lower() == "true"
+FORK_SERVER_PATH = "/tmp/fork_server.py"
+
+# Limits per test case for challenges that don't set their own
+DEFAULT_TIME_LIMIT_MS = int(os.environ.get("JUDGE_TIME_LIMIT_MS", "10000"))
+DEFAULT_MEMORY_LIMIT_MB = int(os.environ.get("JUDGE_MEMORY_LIMIT_MB", "512"))
+# Extra wall-clock time a command gets for interpreter startup and transport
+TIME_LIMIT_GRACE_MS = int(os.environ.get("JUDGE_TIME_LIMIT_GRACE_MS", "2000"))
+
+# Per-case caps on what a run may write. They are enforced inside the
+# sandbox, so no more than this ever reaches the judge process.
+OUTPUT_LIMIT_BYTES = int(os.environ.get("JUDGE_OUTPUT_LIMIT_BYTES", str(1024 * 1024)))
+STDERR_LIMIT_BYTES = int(os.environ.get("JUDGE_STDERR_LIMIT_BYTES", str(64 * 1024)))
+# How much of an over-limit output is kept in the result
+OUTPUT_PREVIEW_CHARS = 4096
+
+TIME_LIMIT_EXCEEDED = "Time Limit Exceeded"
+MEMORY_LIMIT_EXCEEDED = "Memory Limit Exceeded"
+OUTPUT_LIMIT_EXCEEDED = "Output Limit Exceeded"
+COMPILATION_ERROR = "Compilation Error"
+# Status of cases not run because an earlier one failed (fail-fast mode)
+SKIPPED = "Skipped"
+
+# Created in the sandbox to tell a fail-fast batch harness to stop
+STOP_FILE = "/tmp/judge_stop"
+# Where the batch harness payload is staged
+BATCH_STDIN_PATH = "/tmp/stdin.txt"
+
+# Compiled languages build into BUILD_DIR once per submission; its tar is
+# what the compile cache keeps
+BUILD_DIR = "/tmp/build"
+BUILD_ARCHIVE = "/tmp/build.tar"
+COMPILE_TIMEOUT_SECONDS = int(os.environ.get("JUDGE_COMPILE_TIMEOUT_SECONDS", "60"))
+
+# Generated test inputs are expanded in the sandbox by input_generators.py,
+# uploaded next to the staged inputs, from the jobs listed in GENERATOR_JOBS_PATH
+GENERATOR_PATH = "/tmp/input_generators.py"
+GENERATOR_JOBS_PATH = "/tmp/generate.json"
+GENERATOR_TIMEOUT_SECONDS = int(os.environ.get("JUDGE_INPUT_GENERATOR_TIMEOUT_SECONDS", "60"))
+_GENERATOR_SOURCE = inspect.getsource(input_generators)
+
+
+# Map app language strings to sandbox filenames and run commands.
+# limited_cmd runs the same file under the memory limit: an address-space
+# rlimit for Python, a heap cap for node (V8 reserves far more address space
+# than it uses, so ulimit -v would break it).
+# Compiled languages also have a compile_cmd, run once before any test case,
+# and a toolchain_cmd whose output versions the compile cache. The JVM and
+# the Go runtime reserve address space up front like V8, so Java gets a
+# heap cap and Go a soft memory limit with ulimit -v set 1 GB above it.
 LANGUAGE_CONFIG = {
     "python": {
         "filename": "/tmp/solution.py",
         "run_cmd": "python3 /tmp/solution.py",
+        "limited_cmd": "ulimit -v {memory_kb}; python3 /tmp/solution.py",
     },
     "javascript": {
         "filename": "/tmp/solution.js",
         "run_cmd": "node /tmp/solution.js",
+        "limited_cmd": "node --max-old-space-size={memory_mb} /tmp/solution.js",
+    },
+    "cpp": {
+        "filename": "/tmp/solution.cpp",
+        "compile_cmd": "g++ -std=c++17 -O2 -pipe -fno-diagnostics-show-caret -o /tmp/build/solution /tmp/solution.cpp",
+        "toolchain_cmd": "g++ --version | head -n 1",
+        "run_cmd": "/tmp/build/solution",
+        "limited_cmd": "ulimit -v {memory_kb}; /tmp/build/solution",
+    },
+    "java": {
+        "filename": "/tmp/Main.java",
+        "compile_cmd": "javac -J-Xmx512m -encoding UTF-8 -d /tmp/build /tmp/Main.java",
+        "toolchain_cmd": "javac -version 2>&1",
+        "run_cmd": "java -cp /tmp/build Main",
+        "limited_cmd": "java -Xmx{memory_mb}m -XX:-UsePerfData -XX:+UseSerialGC -cp /tmp/build Main",
+    },
+    "go": {
+        "filename": "/tmp/solution.go",
+        "compile_cmd": "GOCACHE=/tmp/gocache GO111MODULE=off go build -o /tmp/build/solution /tmp/solution.go",
+        "toolchain_cmd": "go version",
+        "run_cmd": "/tmp/build/solution",
+        "limited_cmd": "ulimit -v $(({memory_kb} + 1048576)); GOMEMLIMIT={memory_mb}MiB /tmp/build/solution",
     },
 }
 
+# stderr of a process that ran out of memory under limited_cmd
+_OUT_OF_MEMORY_MARKERS = ("MemoryError", "heap out of memory", "Reached heap limit",
+                          "std::bad_alloc", "java.lang.OutOfMemoryError", "out of memory")
+# Exit status of a process killed by SIGXCPU (ulimit -t) / SIGXFSZ (ulimit -f)
+_CPU_LIMIT_EXIT_CODE = 128 + 24
+_FILE_SIZE_LIMIT_EXIT_CODE = 128 + 25
+
+
+_backend = get_backend()
+
 
 def _check_api_key():
-    # Check that E2B_API_KEY is set in environment.
-    if not os.environ.get("E2B_API_KEY"):
-        return "E2B_API_KEY is not set. Add it to your .env file. Get one at https://e2b.dev/dashboard?tab=keys"
-    return None
+    # Check that the sandbox backend is configured (E2B_API_KEY for E2B).
+    return _backend.check_config()
+
 
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
 
-def _run_command(sandbox, cmd, stdin_input="", timeout=30):
+
+def _kill_sandbox(sandbox):
+    sandbox.kill()
+
+
+# Hedged, circuit-broken creation (see resilience.py); used with and
+# without the pool
+_creator = ResilientCreator(
+    lambda: _backend.create(timeout=POOL_MAX_AGE + 60 if POOL_ENABLED else None), _kill_sandbox)
+
+
+def _create_sandbox():
+    return _creator.create()
+
+
+def sandbox_creation_stats():
+    return _creator.stats()
+
+
+def _get_pool():
+    # One pool per process; a forked gunicorn worker must not share the
+    # parent's sandboxes or refill thread.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SandboxPool(
+                _create_sandbox,
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                max_uses=POOL_MAX_USES,
+                max_age=POOL_MAX_AGE,
+            )
+            _pool_pid = os.getpid()
+            _pool.start()
+        return _pool
+
+
+def _acquire_sandbox():
+    # Lease a sandbox from the warm pool when enabled, otherwise create one.
+    if POOL_ENABLED:
+        return _get_pool().acquire()
+    return _create_sandbox()
+
+
+def _release_sandbox(sandbox, discard=False):
+    # Hand a sandbox back to the pool (scrubbed for reuse) or kill it.
+    if POOL_ENABLED:
+        _get_pool().release(sandbox, discard=discard)
+    else:
+        sandbox.kill()
+
+
+def _run_command(sandbox, cmd, stdin_input="", timeout=30, stdin_path="/tmp/stdin.txt",
+                 on_stdout=None):
     # Run a command in the sandbox, optionally piping stdin.
     # Returns a CommandResult with .stdout, .stderr, .exit_code.
-    if stdin_input:
-        sandbox.files.write("/tmp/stdin.txt", stdin_input)
-        return sandbox.commands.run(f"{cmd} < /tmp/stdin.txt", timeout=timeout)
-    return sandbox.commands.run(cmd, timeout=timeout)
+    # The SDK raises on a non-zero exit; that exception carries the same
+    # fields, so it is returned as the result.
+    try:
+        if stdin_input:
+            sandbox.files.write(stdin_path, stdin_input)
+            cmd = f"{cmd} < {stdin_path}"
+        return sandbox.commands.run(cmd, timeout=timeout, on_stdout=on_stdout)
+    except CommandExitException as e:
+        return e
+
+
+def _write_files(sandbox, files):
+    # Upload {path: data} in a single request where the sandbox supports
+    # multi-file writes, one write per file otherwise.
+    write_files = getattr(sandbox.files, "write_files", None)
+    if write_files is None:
+        for path, data in files.items():
+            sandbox.files.write(path, data)
+        return
+    write_files([{"path": path, "data": data} for path, data in files.items()])
+
+
+def _stdin_path(index):
+    return f"/tmp/stdin_{index}.txt"
+
+
+def _limits(time_limit_ms=None, memory_limit_mb=None):
+    # Effective (time_limit_ms, memory_limit_mb) for a run.
+    return time_limit_ms or DEFAULT_TIME_LIMIT_MS, memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB
+
+
+def _limited_cmd(config, limits, cases=1):
+    # The run command under the memory limit, with a CPU-time rlimit as a
+    # backstop should the wall-clock timeout fail to stop the process.
+    time_limit_ms, memory_limit_mb = limits
+    cpu_seconds = math.ceil((time_limit_ms * cases + TIME_LIMIT_GRACE_MS) / 1000)
+    return f"ulimit -t {cpu_seconds}; " + config["limited_cmd"].format(
+        memory_kb=memory_limit_mb * 1024, memory_mb=memory_limit_mb)
+
+
+def _bounded_cmd(cmd, stdin_path, stderr_path, stdout_limit=OUTPUT_LIMIT_BYTES):
+    # Run cmd so that at most one byte more than stdout_limit of stdout and
+    # STDERR_LIMIT_BYTES of stderr leave the sandbox; seeing that extra byte
+    # tells the judge a limit was hit. Past the limit, stdout writes fail
+    # with SIGPIPE and stderr (spooled to a file) with SIGXFSZ, which stops
+    # a runaway writer. Exits with cmd's status. head runs unbuffered so
+    # batch frames still stream out as they are written.
+    stderr_blocks = STDERR_LIMIT_BYTES // 1024 + 2
+    return (
+        f"{{ ulimit -f {stderr_blocks}; {cmd}; }} < {stdin_path} 2> {stderr_path}"
+        f" | stdbuf -o0 head -c {stdout_limit + 1}; status=${{PIPESTATUS[0]}};"
+        f" head -c {STDERR_LIMIT_BYTES + 1} {stderr_path} >&2; rm -f {stderr_path}; exit $status"
+    )
+
+
+def _over_output_limit(stdout, stderr, exit_code, stdout_limit=OUTPUT_LIMIT_BYTES):
+    # Bytes seen if a _bounded_cmd run went past an output limit, else None.
+    stdout_bytes = len((stdout or "").encode())
+    stderr_bytes = len((stderr or "").encode())
+    if stdout_bytes > stdout_limit or stderr_bytes > STDERR_LIMIT_BYTES \
+            or exit_code == _FILE_SIZE_LIMIT_EXIT_CODE:
+        return stdout_bytes + stderr_bytes
+    return None
+
+
+def _output_limit_message(output_bytes, at_least=True):
+    written = f"{output_bytes}+" if at_least else str(output_bytes)
+    return (f"Output limit exceeded: {written} bytes written, "
+            f"limit is {OUTPUT_LIMIT_BYTES} bytes (stderr {STDERR_LIMIT_BYTES})")
+
+
+def _command_timeout(limits, cases=1):
+    return (limits[0] * cases + TIME_LIMIT_GRACE_MS) / 1000
+
+
+def _is_timeout(error):
+    if isinstance(error, (TimeoutException, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return "timed out" in message or "timeout" in message
+
+
+def _is_out_of_memory(stderr):
+    return any(marker in (stderr or "") for marker in _OUT_OF_MEMORY_MARKERS)
+
+
+def _limit_status(exit_code, stderr, limits, measured_time=None):
+    # TIME_LIMIT_EXCEEDED / MEMORY_LIMIT_EXCEEDED if a finished run broke a
+    # limit, else None. measured_time is the harness' in-process time (s).
+    if exit_code == _CPU_LIMIT_EXIT_CODE:
+        return TIME_LIMIT_EXCEEDED
+    if exit_code != 0 and _is_out_of_memory(stderr):
+        return MEMORY_LIMIT_EXCEEDED
+    if measured_time is not None and measured_time * 1000 > limits[0]:
+        return TIME_LIMIT_EXCEEDED
+    return None
+
+
+def _limit_message(status, limits):
+    if status == OUTPUT_LIMIT_EXCEEDED:
+        return f"Output limit exceeded: limit is {OUTPUT_LIMIT_BYTES} bytes (stderr {STDERR_LIMIT_BYTES})"
+    if status == TIME_LIMIT_EXCEEDED:
+        return f"Time limit of {limits[0]} ms exceeded"
+    return f"Memory limit of {limits[1]} MB exceeded"
+
+
+_toolchains = {}
+_toolchains_lock = threading.Lock()
+
+
+def _toolchain_version(sandbox, language, config):
+    # The sandbox compiler's version string for language. Every sandbox runs
+    # the same template, so it is looked up once per process.
+    with _toolchains_lock:
+        version = _toolchains.get(language)
+    if version is not None:
+        return version
+    result = _run_command(sandbox, config["toolchain_cmd"], timeout=30)
+    version = ((result.stdout or "") + (result.stderr or "")).strip()
+    if result.exit_code != 0 or not version:
+        raise RuntimeError(f"No {language} toolchain in the sandbox: {version or result.exit_code}")
+    with _toolchains_lock:
+        _toolchains[language] = version
+    return version
+
+
+def _compile(sandbox, language, config, source_code):
+    # Build the staged source into BUILD_DIR, or unpack a cached build of the
+    # same source. Returns (error, seconds, cached): error is the compiler
+    # output if compilation failed, else None.
+    start_time = time.time()
+    key = make_compile_key(language, _toolchain_version(sandbox, language, config),
+                           config["compile_cmd"], source_code)
+    artifact = compile_cache.get(key)
+    if artifact is not None:
+        if artifact.error is None:
+            sandbox.files.write(BUILD_ARCHIVE, artifact.archive)
+            result = _run_command(
+                sandbox, f"mkdir -p {BUILD_DIR} && tar -C {BUILD_DIR} -xf {BUILD_ARCHIVE}", timeout=30)
+            if result.exit_code != 0:
+                raise RuntimeError(f"Unpacking the cached build failed: {result.stderr}")
+        return artifact.error, round(time.time() - start_time, 3), True
+
+    # Compiler output is merged and capped like a run's stderr; not with
+    # _bounded_cmd, whose file-size limit would stop the build itself
+    result = _run_command(
+        sandbox,
+        f"mkdir -p {BUILD_DIR} && {{ {config['compile_cmd']}; }} < /dev/null 2>&1"
+        f" | head -c {STDERR_LIMIT_BYTES}; status=${{PIPESTATUS[0]}};"
+        f" if [ $status -eq 0 ]; then tar -C {BUILD_DIR} -cf {BUILD_ARCHIVE} .; fi; exit $status",
+        timeout=COMPILE_TIMEOUT_SECONDS,
+    )
+    elapsed = round(time.time() - start_time, 3)
+    if result.exit_code != 0:
+        error = ((result.stdout or "") + (result.stderr or "")).strip() \
+            or f"Compiler exited with status {result.exit_code}"
+        compile_cache.put(key, CompiledArtifact(error=error))
+        return error, elapsed, False
+    try:
+        archive = sandbox.files.read(BUILD_ARCHIVE, format="bytes")
+    except Exception:
+        # The build is in place either way; it just isn't cached
+        archive = None
+    if archive:
+        compile_cache.put(key, CompiledArtifact(archive=bytes(archive)))
+    return None, elapsed, False
 
 
-def execute_code(source_code, language, stdin=""):
+def execute_code(source_code, language, stdin="", time_limit_ms=None, memory_limit_mb=None):
     # send code to an E2B sandbox for execution and return the result.
     # creates a new sandbox, writes the code file, pipes stdin, and
-    # returns stdout/stderr/exit_code.
+    # returns stdout/stderr/exit_code. Limits default to JUDGE_*_LIMIT_*.
     config = LANGUAGE_CONFIG.get(language)
     if config is None:
         return {"error": f"Unsupported language: {language}"}
@@ -55,159 +381,530 @@ def execute_code(source_code, language, stdin=""):
         return {"error": key_error}
 
     try:
-        sandbox = Sandbox.create()
+        sandbox = _acquire_sandbox()
     except Exception as e:
         return {"error": f"E2B sandbox creation failed: {e}"}
 
+    discard_sandbox = False
     try:
-        sandbox.files.write(config["filename"], source_code)
+        _write_files(sandbox, {config["filename"]: source_code, BATCH_STDIN_PATH: stdin})
+        if "compile_cmd" in config:
+            compile_error, compile_time, _ = _compile(sandbox, language, config, source_code)
+            if compile_error is not None:
+                return {
+                    "stdout": "",
+                    "stderr": compile_error,
+                    "status": {"id": 6, "description": COMPILATION_ERROR},
+                    "time": None,
+                    "memory": None,
+                    "compile_time": format_seconds(compile_time),
+                }
 
+        limits = _limits(time_limit_ms, memory_limit_mb)
         start_time = time.time()
-        result = _run_command(sandbox, config["run_cmd"], stdin_input=stdin, timeout=30)
+        result = _run_command(
+            sandbox, _bounded_cmd(_limited_cmd(config, limits), BATCH_STDIN_PATH, "/tmp/stderr.txt"),
+            timeout=_command_timeout(limits),
+        )
         elapsed = round(time.time() - start_time, 3)
+        over_limit = _over_output_limit(result.stdout, result.stderr, result.exit_code)
+        # Harness-wrapped code reports its own time and peak memory
+        metrics, stderr = parse_metrics(result.stderr)
 
+        if over_limit is not None:
+            status = {"id": 11, "description": OUTPUT_LIMIT_EXCEEDED}
+            stderr = _output_limit_message(over_limit)
+        elif result.exit_code == 0:
+            status = {"id": 3, "description": "Accepted"}
+        else:
+            status = {"id": 11, "description": "Runtime Error"}
         return {
-            "stdout": (result.stdout or "").rstrip("\n"),
-            "stderr": result.stderr if result.exit_code != 0 else None,
-            "status": {
-                "id": 3 if result.exit_code == 0 else 11,
-                "description": "Accepted" if result.exit_code == 0 else "Runtime Error",
-            },
-            "time": str(elapsed),
-            "memory": None,
+            "stdout": (result.stdout or "")[:OUTPUT_LIMIT_BYTES].rstrip("\n"),
+            "stderr": stderr if result.exit_code != 0 or over_limit is not None else None,
+            "status": status,
+            "time": format_seconds(metrics["time"]) if metrics else str(elapsed),
+            "memory": metrics["memory_kb"] if metrics else None,
         }
     except Exception as e:
-        error_msg = str(e)
-        if "timed out" in error_msg.lower() or "timeout" in error_msg.lower():
+        # A timed-out or failed run may leave processes behind; don't reuse it
+        discard_sandbox = True
+        if _is_timeout(e):
             return {"error": "Code execution timed out"}
-        return {"error": f"Code execution failed: {error_msg}"}
+        return {"error": f"Code execution failed: {e}"}
     finally:
-        sandbox.kill()
+        _release_sandbox(sandbox, discard=discard_sandbox)
 
 
-def _compare_outputs(actual, expected):
-    if actual == expected:
-        return True
+def _error_results(test_cases, error):
+    # Result for a run that could not start: every case errors with the same message.
+    return {
+        "overall_status": "error",
+        "passed_count": 0,
+        "total_count": len(test_cases),
+        "test_results": [{
+            "test_case_id": tc["id"],
+            "input": tc["input"],
+            "expected_output": tc["expected_output"],
+            "actual_output": None,
+            "passed": False,
+            "is_hidden": tc["is_hidden"],
+            "status": "Error",
+            "time": None,
+            "error": error,
+        } for tc in test_cases],
+    }
+
+
+def _compile_error_results(test_cases, error, compile_time, compile_cached=False):
+    # Result for code that did not compile: every case fails with the compiler output.
+    results = _error_results(test_cases, error)
+    for test_result in results["test_results"]:
+        test_result["status"] = COMPILATION_ERROR
+    results.update(compile_time=format_seconds(compile_time), compile_cached=compile_cached)
+    return results
+
+
+def format_seconds(seconds):
+    return f"{seconds:.6f}".rstrip("0").rstrip(".") if seconds is not None else None
+
+
+def _case_result(tc, actual_output, status, elapsed, error, metrics=None):
+    # elapsed is our wall-clock measurement (includes transport and interpreter
+    # startup). metrics, when the harness reports them, measure only the user
+    # call: "time" then is in-process time and "memory" peak RSS in KB.
+    # tc["checker"] is its prepared expected output (see _with_checkers)
+    passed = False
+    if actual_output is not None and status not in (
+            TIME_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED, OUTPUT_LIMIT_EXCEEDED):
+        checker = tc.get("checker") or comparators.checker(tc["expected_output"])
+        passed = checker.matches(actual_output)
+    metrics = metrics or {}
+    return {
+        "test_case_id": tc["id"],
+        "input": tc["input"],
+        "expected_output": tc["expected_output"],
+        "actual_output": actual_output,
+        "passed": passed,
+        "is_hidden": tc["is_hidden"],
+        "status": status,
+        "time": format_seconds(metrics.get("time", elapsed)),
+        "cpu_time": format_seconds(metrics.get("cpu_time")),
+        "memory": metrics.get("memory_kb"),
+        "wall_time": format_seconds(elapsed),
+        "error": error,
+    }
+
+
+def _run_case(sandbox, config, index, tc, limits):
+    # Run one test case. Its input was staged at _stdin_path(index) up
+    # front, so this is a single command round trip.
+    start_time = time.time()
     try:
-        return json.loads(actual) == json.loads(expected)
-    except (json.JSONDecodeError, TypeError):
-        return False
+        result = _run_command(
+            sandbox,
+            _bounded_cmd(_limited_cmd(config, limits), _stdin_path(index), f"/tmp/stderr_{index}.txt"),
+            timeout=_command_timeout(limits),
+        )
+        elapsed = round(time.time() - start_time, 3)
+        return _program_result(tc, result.stdout, result.stderr, result.exit_code, elapsed, limits)
+    except Exception as e:
+        if _is_timeout(e):
+            return _case_result(
+                tc, None, TIME_LIMIT_EXCEEDED, round(time.time() - start_time, 3),
+                _limit_message(TIME_LIMIT_EXCEEDED, limits),
+            )
+        return _case_result(tc, None, "Error", None, str(e))
+
+
+def _program_result(tc, stdout, stderr, exit_code, elapsed, limits):
+    # Case result from one run of a single-case program, its output bounded
+    # as by _bounded_cmd.
+    over_limit = _over_output_limit(stdout, stderr, exit_code)
+    if over_limit is not None:
+        return _case_result(
+            tc, (stdout or "")[:OUTPUT_PREVIEW_CHARS], OUTPUT_LIMIT_EXCEEDED, elapsed,
+            _output_limit_message(over_limit),
+        )
+    metrics, stderr = parse_metrics(stderr)
+
+    status = _limit_status(exit_code, stderr, limits, metrics and metrics["time"])
+    if status is not None:
+        error = _limit_message(status, limits)
+    else:
+        status = "Accepted" if exit_code == 0 else "Runtime Error"
+        error = stderr if exit_code != 0 else None
+    return _case_result(tc, (stdout or "").rstrip("\n"), status, elapsed, error, metrics)
+
+
+def _with_checkers(test_cases, comparison_mode, float_tolerance):
+    # Copies of the test cases carrying their prepared expected output
+    # (or, for an expected output stored as a digest, its digest matcher).
+    return [dict(tc, checker=comparators.digest_checker(tc["expected_output_sha256"])
+                 if tc.get("expected_output_sha256")
+                 else comparators.checker(tc["expected_output"], comparison_mode, float_tolerance))
+            for tc in test_cases]
+
+
+def _generator_jobs(generated, batch):
+    # input_generators.py jobs for {case index: spec}: fill the batch payload,
+    # or write each case's stdin file.
+    if batch:
+        return [{"spec": spec, "payload": os.path.basename(BATCH_STDIN_PATH), "index": i}
+                for i, spec in generated.items()]
+    return [{"spec": spec, "path": os.path.basename(_stdin_path(i))} for i, spec in generated.items()]
+
+
+def _generate_inputs(sandbox):
+    # Expand the staged generator jobs into test inputs. Returns an error
+    # message, or None.
+    try:
+        result = _run_command(sandbox, f"python3 {GENERATOR_PATH} {GENERATOR_JOBS_PATH}",
+                              timeout=GENERATOR_TIMEOUT_SECONDS)
+    except Exception as e:
+        if _is_timeout(e):
+            return f"timed out after {GENERATOR_TIMEOUT_SECONDS} seconds"
+        return str(e)
+    if result.exit_code != 0:
+        return (result.stderr or "").strip()[-OUTPUT_PREVIEW_CHARS:] or f"exit status {result.exit_code}"
+    return None
+
+
+def _skipped_result(tc):
+    return _case_result(tc, None, SKIPPED, None, None)
+
+
+def _run_each(sandbox, config, test_cases, limits, parallelism=1, stop_on_first_failure=False,
+              on_result=None):
+    # One process per test case. With parallelism > 1, up to that many cases
+    # are in flight at once; results are still returned in test-case order.
+    # stop_on_first_failure skips every case after the first one that fails
+    # (in parallel mode, cases not yet started are cancelled).
+    # on_result(index, result) is called for each case that ran, in order.
+    stopped = False
+    test_results = []
+    if parallelism <= 1 or len(test_cases) <= 1:
+        for i, tc in enumerate(test_cases):
+            if stopped:
+                test_results.append(_skipped_result(tc))
+                continue
+            test_results.append(_run_case(sandbox, config, i, tc, limits))
+            if on_result is not None:
+                on_result(i, test_results[-1])
+            stopped = stop_on_first_failure and not test_results[-1]["passed"]
+        return test_results
+
+    executor = ThreadPoolExecutor(max_workers=min(parallelism, len(test_cases)))
+    try:
+        futures = [executor.submit(_run_case, sandbox, config, i, tc, limits)
+                   for i, tc in enumerate(test_cases)]
+        for i, (tc, future) in enumerate(zip(test_cases, futures)):
+            if stopped:
+                future.cancel()
+                test_results.append(_skipped_result(tc))
+                continue
+            test_results.append(future.result())
+            if on_result is not None:
+                on_result(i, test_results[-1])
+            stopped = stop_on_first_failure and not test_results[-1]["passed"]
+    finally:
+        # Cases already running finish before the sandbox is released
+        executor.shutdown(wait=True, cancel_futures=True)
+    return test_results
+
 
+def _frame_result(tc, frame, limits, elapsed):
+    # Case result from a batch harness frame. Wall time is for the whole
+    # batch; per-case time comes from the frame.
+    if frame.get("limit") == "output":
+        return _case_result(
+            tc, frame["stdout"][:OUTPUT_PREVIEW_CHARS], OUTPUT_LIMIT_EXCEEDED, elapsed,
+            _output_limit_message(frame["output_bytes"], at_least=False), frame)
+    if frame.get("limit") == "memory":
+        status = MEMORY_LIMIT_EXCEEDED
+    elif frame.get("limit") == "time" or frame["time"] * 1000 > limits[0]:
+        status = TIME_LIMIT_EXCEEDED
+    else:
+        status = None
+    if status is not None:
+        return _case_result(tc, None, status, elapsed, _limit_message(status, limits), frame)
+    if frame["ok"]:
+        actual_output = (frame["stdout"] + frame["output"]).rstrip("\n")
+        return _case_result(tc, actual_output, "Accepted", elapsed, None, frame)
+    return _case_result(
+        tc, frame["stdout"].rstrip("\n"), "Runtime Error", elapsed, frame["error"], frame)
 
-def run_test_cases(source_code, language, test_cases):
+
+def _fork_frame_result(tc, frame, limits, elapsed):
+    # Case result from a fork server frame: one run of the single-case
+    # program, timed by the server.
+    if frame.get("limit") == "output":
+        return _case_result(
+            tc, frame["stdout"][:OUTPUT_PREVIEW_CHARS], OUTPUT_LIMIT_EXCEEDED, frame["wall_time"],
+            _output_limit_message(frame["output_bytes"]))
+    if frame["timed_out"]:
+        return _case_result(tc, None, TIME_LIMIT_EXCEEDED, frame["wall_time"],
+                            _limit_message(TIME_LIMIT_EXCEEDED, limits))
+    return _program_result(tc, frame["stdout"], frame["stderr"], frame["exit_code"],
+                           frame["wall_time"], limits)
+
+
+class _FrameWatcher:
+    # on_stdout handler for a framed run (batch harness or fork server).
+    # Judges frames with frame_result as they stream in and hands each result
+    # to on_result. In fail-fast mode, at the first failing case it creates
+    # STOP_FILE in the sandbox so the run stops before its next case, and
+    # reports nothing further. The write happens on its own thread so the
+    # output stream is never blocked on it.
+
+    def __init__(self, sandbox, test_cases, limits, stop_on_first_failure=False, on_result=None,
+                 frame_result=_frame_result):
+        self.chunks = []
+        self._sandbox = sandbox
+        self._test_cases = test_cases
+        self._limits = limits
+        self._stop_on_first_failure = stop_on_first_failure
+        self._on_result = on_result
+        self._frame_result = frame_result
+        self._pending = ""
+        self._stopper = None
+
+    def __call__(self, chunk):
+        self.chunks.append(chunk)
+        if self._stopper is not None:
+            return
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        for i, frame in parse_batch_frames("\n".join(lines)).items():
+            if i is None or i >= len(self._test_cases):
+                continue
+            result = self._frame_result(self._test_cases[i], frame, self._limits, None)
+            if self._on_result is not None:
+                self._on_result(i, result)
+            if self._stop_on_first_failure and not result["passed"]:
+                self._stopper = threading.Thread(target=self._stop, daemon=True)
+                self._stopper.start()
+                return
+
+    def _stop(self):
+        try:
+            self._sandbox.files.write(STOP_FILE, "")
+        except Exception:
+            # The run just goes on to the end; extra cases are still skipped
+            pass
+
+    def wait(self):
+        if self._stopper is not None:
+            self._stopper.join()
+
+
+def _run_batch(sandbox, config, test_cases, limits, stop_on_first_failure=False, on_result=None):
+    # One process for the whole suite (batch harness, see harness.py), fed
+    # the payload staged at BATCH_STDIN_PATH.
+    # Each case's output is its captured prints followed by the JSON result,
+    # matching what the per-case harness would print. The harness stops a
+    # call at the time limit itself; the command timeout is the backstop for
+    # code it can't interrupt, keeping the frames streamed before the kill.
+    # on_result(index, result) is called as each case's frame arrives.
+    return _run_framed(sandbox, _limited_cmd(config, limits, cases=len(test_cases)), test_cases,
+                       limits, _frame_result, _command_timeout(limits, cases=len(test_cases)),
+                       stop_on_first_failure, on_result)
+
+
+def _run_forked(sandbox, config, test_cases, limits, stop_on_first_failure=False, on_result=None):
+    # Every case in a child of the fork server, fed the payload staged at
+    # BATCH_STDIN_PATH; the program and per-case inputs are staged as for
+    # _run_each, and results match it. The server enforces the limits per
+    # case (each gets _command_timeout, as in _run_each), so it runs without
+    # ulimits of its own.
+    cmd = f"python3 {FORK_SERVER_PATH} {config['filename']}"
+    timeout = len(test_cases) * _command_timeout(limits) + TIME_LIMIT_GRACE_MS / 1000
+    return _run_framed(sandbox, cmd, test_cases, limits, _fork_frame_result, timeout,
+                       stop_on_first_failure, on_result)
+
+
+def _run_framed(sandbox, cmd, test_cases, limits, frame_result, timeout,
+                stop_on_first_failure=False, on_result=None):
+    # Run cmd, which writes one frame per case, and judge each frame with
+    # frame_result(tc, frame, limits, elapsed). cmd takes STOP_FILE as its
+    # last argument in fail-fast mode; timeout (s) is for the whole run.
+    if stop_on_first_failure:
+        cmd = f"rm -f {STOP_FILE}; {cmd} {STOP_FILE}"
+    if stop_on_first_failure or on_result is not None:
+        watcher = _FrameWatcher(sandbox, test_cases, limits, stop_on_first_failure, on_result,
+                                frame_result)
+    else:
+        watcher = None
+    # Each case's output is bounded in the sandbox; the overall cap only
+    # catches writes that go around that (straight to the stdout descriptor)
+    stdout_limit = len(test_cases) * (OUTPUT_LIMIT_BYTES + STDERR_LIMIT_BYTES + 4096) * 2
+    cmd = _bounded_cmd(cmd, BATCH_STDIN_PATH, "/tmp/stderr.txt", stdout_limit=stdout_limit)
+    streamed = []
+    start_time = time.time()
+    try:
+        result = _run_command(sandbox, cmd, timeout=timeout, on_stdout=watcher or streamed.append)
+        stdout, stderr, exit_code = result.stdout, result.stderr, result.exit_code
+    except Exception as e:
+        if not _is_timeout(e):
+            return [_case_result(tc, None, "Error", None, str(e)) for tc in test_cases]
+        stdout, stderr, exit_code = "".join(watcher.chunks if watcher else streamed), "", None
+    finally:
+        if watcher is not None:
+            watcher.wait()
+    elapsed = round(time.time() - start_time, 3)
+
+    # Why the process stopped early, if it did: blamed on the first case
+    # without a frame
+    if exit_code is None:
+        stop_status = TIME_LIMIT_EXCEEDED
+    elif _over_output_limit(stdout, stderr, exit_code, stdout_limit=stdout_limit) is not None:
+        stop_status = OUTPUT_LIMIT_EXCEEDED
+    else:
+        stop_status = _limit_status(exit_code, stderr, limits)
+
+    frames = parse_batch_frames(stdout)
+    stopped = False
+    aborted = False
+    test_results = []
+    for i, tc in enumerate(test_cases):
+        frame = frames.get(i)
+        if stopped:
+            # A fail-fast run may get a few cases further than the first
+            # failure before the harness sees the stop file
+            test_results.append(_skipped_result(tc))
+            continue
+        if frame is None and aborted:
+            # The compiled harnesses can't unwind a call that is over the time
+            # limit, so they report it and exit
+            test_results.append(_case_result(
+                tc, None, SKIPPED, None, "Not run: an earlier test case hit the time limit"))
+            continue
+        if frame is not None:
+            aborted = aborted or bool(frame.get("aborted"))
+        if frame is None:
+            # The process died before reaching this case
+            if stop_status is not None:
+                test_results.append(_case_result(
+                    tc, None, stop_status, None, _limit_message(stop_status, limits)))
+                stop_status = None
+                stderr = "Execution stopped before this test case ran"
+            else:
+                test_results.append(_case_result(
+                    tc, None, "Runtime Error", None,
+                    stderr or "Execution stopped before this test case ran",
+                ))
+        else:
+            test_results.append(frame_result(tc, frame, limits, elapsed))
+        stopped = stop_on_first_failure and not test_results[-1]["passed"]
+    return test_results
+
+
+def run_test_cases(source_code, language, test_cases, batch=False, parallelism=None,
+                   time_limit_ms=None, memory_limit_mb=None, stop_on_first_failure=False,
+                   comparison_mode=comparators.AUTO, float_tolerance=None, on_result=None,
+                   fork_server=None):
     # executes code against a list of test cases in a single sandbox
     # returns per-case results.
+    # batch=True expects source_code wrapped with harness.wrap_code_batch.
+    # parallelism bounds how many cases run concurrently (default JUDGE_PARALLELISM).
+    # fork_server runs sequential per-case Python through the fork server
+    # (default JUDGE_PYTHON_FORK_SERVER).
+    # time_limit_ms / memory_limit_mb apply to each test case (default
+    # JUDGE_TIME_LIMIT_MS / JUDGE_MEMORY_LIMIT_MB).
+    # stop_on_first_failure stops at the first failing case; the rest are
+    # reported as Skipped and still count towards total_count.
+    # comparison_mode / float_tolerance: see comparators.py.
+    # on_result(index, result), if given, is called as cases finish, from the
+    # thread reading the sandbox's output. Cases that never ran (skipped, or
+    # lost with the process) are only in the returned results.
     config = LANGUAGE_CONFIG.get(language)
     if config is None:
-        return {
-            "overall_status": "error",
-            "passed_count": 0,
-            "total_count": len(test_cases),
-            "test_results": [{
-                "test_case_id": tc["id"],
-                "input": tc["input"],
-                "expected_output": tc["expected_output"],
-                "actual_output": None,
-                "passed": False,
-                "is_hidden": tc["is_hidden"],
-                "status": "Error",
-                "time": None,
-                "error": f"Unsupported language: {language}",
-            } for tc in test_cases],
-        }
+        return _error_results(test_cases, f"Unsupported language: {language}")
 
     key_error = _check_api_key()
     if key_error:
-        return {
-            "overall_status": "error",
-            "passed_count": 0,
-            "total_count": len(test_cases),
-            "test_results": [{
-                "test_case_id": tc["id"],
-                "input": tc["input"],
-                "expected_output": tc["expected_output"],
-                "actual_output": None,
-                "passed": False,
-                "is_hidden": tc["is_hidden"],
-                "status": "Error",
-                "time": None,
-                "error": key_error,
-            } for tc in test_cases],
-        }
+        return _error_results(test_cases, key_error)
 
     try:
-        sandbox = Sandbox.create()
+        sandbox = _acquire_sandbox()
     except Exception as e:
-        return {
-            "overall_status": "error",
-            "passed_count": 0,
-            "total_count": len(test_cases),
-            "test_results": [{
-                "test_case_id": tc["id"],
-                "input": tc["input"],
-                "expected_output": tc["expected_output"],
-                "actual_output": None,
-                "passed": False,
-                "is_hidden": tc["is_hidden"],
-                "status": "Error",
-                "time": None,
-                "error": f"E2B sandbox creation failed: {e}",
-            } for tc in test_cases],
-        }
+        return _error_results(test_cases, f"E2B sandbox creation failed: {e}")
 
+    discard_sandbox = False
     try:
-        # Write source code once
-        sandbox.files.write(config["filename"], source_code)
-
-        # Run each test case in the same sandbox
-        test_results = []
-        passed_count = 0
-        has_error = False
+        limits = _limits(time_limit_ms, memory_limit_mb)
+        test_cases = _with_checkers(test_cases, comparison_mode, float_tolerance)
+        parallelism = parallelism or DEFAULT_PARALLELISM
+        if fork_server is None:
+            fork_server = FORK_SERVER_ENABLED
+        forked = fork_server and not batch and language == "python" and parallelism <= 1
+        # Generated inputs are expanded in the sandbox; their cases stage
+        # nothing (batch: a placeholder the generator replaces)
+        generated = {i: tc["input_generator"] for i, tc in enumerate(test_cases)
+                     if tc.get("input_generator")}
+        if batch:
+            stdin_files = {BATCH_STDIN_PATH: build_batch_input(
+                test_cases, time_limit_ms=limits[0], stop_on_failure=stop_on_first_failure,
+                output_limit=OUTPUT_LIMIT_BYTES)}
+        else:
+            stdin_files = {_stdin_path(i): tc["input"] for i, tc in enumerate(test_cases)
+                           if i not in generated}
+        if generated:
+            stdin_files[GENERATOR_PATH] = _GENERATOR_SOURCE
+            stdin_files[GENERATOR_JOBS_PATH] = json.dumps(_generator_jobs(generated, batch))
+        if forked:
+            stdin_files[FORK_SERVER_PATH] = PYTHON_FORK_SERVER
+            stdin_files[BATCH_STDIN_PATH] = build_fork_server_input(
+                [os.path.basename(_stdin_path(i)) for i in range(len(test_cases))],
+                timeout_ms=limits[0] + TIME_LIMIT_GRACE_MS, memory_kb=limits[1] * 1024,
+                output_limit=OUTPUT_LIMIT_BYTES, stderr_limit=STDERR_LIMIT_BYTES)
+        # Upload the code and every input at once; the run loop then only
+        # issues commands
+        _write_files(sandbox, {config["filename"]: source_code, **stdin_files})
+        if generated:
+            generate_error = _generate_inputs(sandbox)
+            if generate_error is not None:
+                discard_sandbox = True
+                return _error_results(test_cases, f"Input generation failed: {generate_error}")
 
-        for tc in test_cases:
+        # Compiled languages build once; every case then runs the binary
+        compile_info = {}
+        if "compile_cmd" in config:
             try:
-                start_time = time.time()
-                result = _run_command(
-                    sandbox, config["run_cmd"],
-                    stdin_input=tc["input"], timeout=30,
-                )
-                elapsed = round(time.time() - start_time, 3)
-
-                actual_output = (result.stdout or "").rstrip("\n")
-                expected_output = tc["expected_output"].strip()
-                passed = _compare_outputs(actual_output.strip(), expected_output)
-
-                if passed:
-                    passed_count += 1
-
-                if result.exit_code != 0:
-                    has_error = True
-
-                test_results.append({
-                    "test_case_id": tc["id"],
-                    "input": tc["input"],
-                    "expected_output": tc["expected_output"],
-                    "actual_output": actual_output,
-                    "passed": passed,
-                    "is_hidden": tc["is_hidden"],
-                    "status": "Accepted" if result.exit_code == 0 else "Runtime Error",
-                    "time": str(elapsed),
-                    "error": result.stderr if result.exit_code != 0 else None,
-                })
+                compile_error, compile_time, compile_cached = _compile(sandbox, language, config, source_code)
             except Exception as e:
-                test_results.append({
-                    "test_case_id": tc["id"],
-                    "input": tc["input"],
-                    "expected_output": tc["expected_output"],
-                    "actual_output": None,
-                    "passed": False,
-                    "is_hidden": tc["is_hidden"],
-                    "status": "Error",
-                    "time": None,
-                    "error": str(e),
-                })
-                has_error = True
+                # A compiler still running (or a broken toolchain) rules the sandbox out
+                discard_sandbox = True
+                if not _is_timeout(e):
+                    return _error_results(test_cases, f"Compilation failed to run: {e}")
+                compile_error = f"Compilation timed out after {COMPILE_TIMEOUT_SECONDS} seconds"
+                compile_time, compile_cached = COMPILE_TIMEOUT_SECONDS, False
+            if compile_error is not None:
+                return _compile_error_results(test_cases, compile_error, compile_time, compile_cached)
+            compile_info = {"compile_time": format_seconds(compile_time), "compile_cached": compile_cached}
 
+        # Run the test cases in the same sandbox
+        if batch:
+            test_results = _run_batch(
+                sandbox, config, test_cases, limits,
+                stop_on_first_failure=stop_on_first_failure, on_result=on_result,
+            )
+        elif forked:
+            test_results = _run_forked(
+                sandbox, config, test_cases, limits,
+                stop_on_first_failure=stop_on_first_failure, on_result=on_result,
+            )
+        else:
+            test_results = _run_each(
+                sandbox, config, test_cases, limits, parallelism=parallelism,
+                stop_on_first_failure=stop_on_first_failure, on_result=on_result,
+            )
+
+        # A case that errored or timed out may have left processes behind;
+        # don't reuse the sandbox
+        discard_sandbox = any(tr["status"] in ("Error", TIME_LIMIT_EXCEEDED) for tr in test_results)
+
+        passed_count = sum(1 for tr in test_results if tr["passed"])
+        has_error = any(tr["status"] not in ("Accepted", SKIPPED) for tr in test_results)
         total_count = len(test_cases)
 
         if has_error and passed_count == 0:
@@ -222,6 +919,10 @@ def run_test_cases(source_code, language, test_cases):
             "passed_count": passed_count,
             "total_count": total_count,
             "test_results": test_results,
+            **compile_info,
         }
+    except Exception:
+        discard_sandbox = True
+        raise
     finally:
-        sandbox.kill()
+        _release_sandbox(sandbox, discard=discard_sandbox)
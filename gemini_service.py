@@ -102,7 +102,8 @@ def _build_prompt(challenge, count):
     if count >= 3:
         prompt += "3. An edge case — empty input, single element, minimum values, etc. (is_hidden: true)\n"
     if count >= 4:
-        prompt += "4. A larger input case to test efficiency (is_hidden: true)\n"
+        # Large stress inputs are added as generated test cases instead
+        prompt += "4. A larger input case, a few hundred values at most (is_hidden: true)\n"
     if count >= 5:
         prompt += "5. A tricky corner case (is_hidden: true)\n"
 
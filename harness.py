@@ -1,6 +1,19 @@
 import json
+import os
+import re
 
-SUPPORTED_HARNESS_LANGUAGES = {"python", "javascript"}
+# The Java harness is off until it has been built and run against a JDK in
+# the sandbox image; turn it on with HARNESS_JAVA_ENABLED=true
+JAVA_HARNESS_ENABLED = os.environ.get("HARNESS_JAVA_ENABLED", "false").lower() == "true"
+SUPPORTED_HARNESS_LANGUAGES = {"python", "javascript", "cpp", "go"} | ({"java"} if JAVA_HARNESS_ENABLED else set())
+# Compiled once per submission; only the batch harness exists for these
+COMPILED_HARNESS_LANGUAGES = {"cpp", "java", "go"}
+
+# Batch mode prefixes each per-case result line with this record separator.
+# json.dumps / JSON.stringify always escape it, so it never appears inside a frame.
+BATCH_FRAME_MARKER = "\x1e"
+# Single-case wrappers report measurements on the last stderr line, same marker.
+METRICS_MARKER = BATCH_FRAME_MARKER
 
 
 # -- Starter code generators --------------------------------------------------
@@ -15,15 +28,115 @@ def _js_starter(function_name, function_params, return_type):
     return f"function {function_name}({params}) {{\n    \n}}\n"
 
 
+# Parameter and return types of compiled-language starters. Challenge types
+# are free-form: "int", "string[]", "List[int]", "list<bool>"...
+_SCALAR_TYPES = {
+    "int": "int", "integer": "int", "long": "long",
+    "float": "double", "double": "double", "number": "double",
+    "bool": "bool", "boolean": "bool",
+    "string": "string", "str": "string", "char": "char",
+}
+_CPP_TYPES = {"int": "int", "long": "long long", "double": "double", "bool": "bool",
+              "string": "string", "char": "char"}
+_JAVA_TYPES = {"int": "int", "long": "long", "double": "double", "bool": "boolean",
+               "string": "String", "char": "char"}
+_GO_TYPES = {"int": "int", "long": "int64", "double": "float64", "bool": "bool",
+             "string": "string", "char": "string"}
+
+
+def _parse_type(type_name):
+    # (scalar, array depth) for a challenge type, or None if unknown.
+    name = (type_name or "").strip().lower().replace(" ", "")
+    depth = 0
+    while True:
+        if name.endswith("[]"):
+            name = name[:-2]
+        else:
+            match = re.fullmatch(r"(?:list|array|vector)[\[<](.+)[\]>]", name)
+            if match is None:
+                break
+            name = match.group(1)
+        depth += 1
+    scalar = _SCALAR_TYPES.get(name)
+    return (scalar, depth) if scalar else None
+
+
+def _typed_signature(function_params, return_type, render):
+    # ([(name, type)], return type) rendered per language, or None if a
+    # type has no equivalent. render(scalar, depth) gives a type's source.
+    params = []
+    for p in function_params:
+        parsed = _parse_type(p.get("type"))
+        if parsed is None:
+            return None
+        params.append((p["name"], render(*parsed)))
+    if (return_type or "").strip().lower() in ("void", "none"):
+        return params, None
+    parsed = _parse_type(return_type)
+    if parsed is None:
+        return None
+    return params, render(*parsed)
+
+
+def _cpp_starter(function_name, function_params, return_type):
+    def render(scalar, depth):
+        cpp_type = _CPP_TYPES[scalar]
+        for _ in range(depth):
+            cpp_type = f"vector<{cpp_type}>"
+        return cpp_type
+    signature = _typed_signature(function_params, return_type, render)
+    if signature is None:
+        return None
+    params, returns = signature
+    params = ", ".join(f"{t}& {n}" if t.startswith("vector") else f"{t} {n}" for n, t in params)
+    return f"{returns or 'void'} {function_name}({params}) {{\n    \n}}\n"
+
+
+def _java_starter(function_name, function_params, return_type):
+    signature = _typed_signature(
+        function_params, return_type, lambda scalar, depth: _JAVA_TYPES[scalar] + "[]" * depth)
+    if signature is None:
+        return None
+    params, returns = signature
+    params = ", ".join(f"{t} {n}" for n, t in params)
+    return (
+        "class Solution {\n"
+        f"    public {returns or 'void'} {function_name}({params}) {{\n"
+        "        \n"
+        "    }\n"
+        "}\n"
+    )
+
+
+def _go_starter(function_name, function_params, return_type):
+    signature = _typed_signature(
+        function_params, return_type, lambda scalar, depth: "[]" * depth + _GO_TYPES[scalar])
+    if signature is None:
+        return None
+    params, returns = signature
+    params = ", ".join(f"{n} {t}" for n, t in params)
+    returns = f" {returns}" if returns else ""
+    return f"func {function_name}({params}){returns} {{\n\t\n}}\n"
+
+
 # -- Harness wrappers ---------------------------------------------------------
+# Besides printing the JSON result, the wrappers measure the user call itself:
+# wall time, CPU time and the process's peak RSS, reported as
+# {"time", "cpu_time", "memory_kb"} (see parse_metrics).
 
 def _python_wrap(user_code, function_name):
     return (
-        "import json, sys\n\n"
+        "import json, sys\n"
+        "import resource as _cb_resource, time as _cb_time\n\n"
         f"{user_code}\n\n"
         "_args = json.loads(sys.stdin.read())\n"
+        "_start, _cpu_start = _cb_time.perf_counter(), _cb_time.process_time()\n"
         f"_result = {function_name}(*_args)\n"
+        "_elapsed, _cpu = _cb_time.perf_counter() - _start, _cb_time.process_time() - _cpu_start\n"
         "print(json.dumps(_result, separators=(',', ':')))\n"
+        "sys.stdout.flush()\n"
+        f"sys.stderr.write({METRICS_MARKER!r} + json.dumps({{'time': _elapsed, 'cpu_time': _cpu,\n"
+        "    'memory_kb': _cb_resource.getrusage(_cb_resource.RUSAGE_SELF).ru_maxrss}) + '\\n')\n"
     )
 
 
@@ -32,11 +145,1220 @@ def _js_wrap(user_code, function_name):
         f"{user_code}\n\n"
         "const _input = require('fs').readFileSync('/dev/stdin', 'utf8');\n"
         "const _args = JSON.parse(_input);\n"
+        "const _start = process.hrtime.bigint(), _cpuStart = process.cpuUsage();\n"
         f"const _result = {function_name}(..._args);\n"
+        "const _elapsed = Number(process.hrtime.bigint() - _start) / 1e9, _cpu = process.cpuUsage(_cpuStart);\n"
         "console.log(JSON.stringify(_result));\n"
+        f"process.stderr.write({METRICS_MARKER!r} + JSON.stringify({{time: _elapsed,\n"
+        "    cpu_time: (_cpu.user + _cpu.system) / 1e6, memory_kb: process.resourceUsage().maxRSS}) + '\\n');\n"
+    )
+
+
+# -- Batch harness wrappers ---------------------------------------------------
+# Load the user code once, read {"inputs": [<raw JSON args>, ...]} from stdin
+# and call the function for every input. Each call is isolated: its prints
+# are captured and exceptions are reported in that case's frame only.
+# One frame per case: {"i", "ok", "stdout", "output" | "error", "time",
+# "cpu_time", "memory_kb"}; memory_kb is the process's peak RSS so far.
+# With "time_limit_ms" in the payload each call is interrupted once it runs
+# past the limit (SIGALRM / vm timeout); such frames, and Python frames
+# that hit MemoryError, carry "limit": "time" | "memory".
+# With "output_limit" (bytes) a case's prints are kept only up to the limit,
+# and the call is stopped once its prints (stderr included, though not kept)
+# pass it. A case whose output plus result exceed the limit gets
+# "limit": "output" and its "output_bytes" instead of the result.
+# Fail-fast: with "stop_on_failure" the loop ends after a case that raised,
+# and before any case once the file named by the first argument exists
+# (the judge creates it when it sees a wrong answer).
+
+def _python_batch_wrap(user_code, function_name):
+    return (
+        "import io, json, os, signal, sys, traceback\n"
+        "import resource as _cb_resource, time as _cb_time\n"
+        "from contextlib import redirect_stderr, redirect_stdout\n\n"
+        f"{user_code}\n\n"
+        "class _CbTimeLimit(BaseException):\n"
+        "    pass\n\n"
+        "class _CbOutputLimit(BaseException):\n"
+        "    pass\n\n"
+        "class _CbOutput(io.TextIOBase):\n"
+        "    # Keeps a case's prints up to the output limit; past it the call is stopped\n"
+        "    def __init__(self, limit):\n"
+        "        self.limit, self.size, self.parts = limit, 0, []\n"
+        "    def writable(self):\n"
+        "        return True\n"
+        "    def write(self, s):\n"
+        "        if self.size < self.limit:\n"
+        "            self.parts.append(s[:self.limit - self.size])\n"
+        "        self.count(s)\n"
+        "        return len(s)\n"
+        "    def count(self, s):\n"
+        "        self.size += len(s.encode('utf-8', 'replace'))\n"
+        "        if self.size > self.limit:\n"
+        "            raise _CbOutputLimit()\n"
+        "    def getvalue(self):\n"
+        "        return ''.join(self.parts)\n\n"
+        "class _CbErrors(io.TextIOBase):\n"
+        "    # stderr during a call: dropped, but counted against the output limit\n"
+        "    def __init__(self, out):\n"
+        "        self.out = out\n"
+        "    def writable(self):\n"
+        "        return True\n"
+        "    def write(self, s):\n"
+        "        self.out.count(s)\n"
+        "        return len(s)\n\n"
+        "def _cb_alarm(signum, frame):\n"
+        "    raise _CbTimeLimit()\n\n"
+        "_cb_payload = json.loads(sys.stdin.read())\n"
+        "_cb_limit = _cb_payload.get('time_limit_ms')\n"
+        "_cb_output_limit = _cb_payload.get('output_limit') or sys.maxsize\n"
+        "_cb_stop_file = sys.argv[1] if len(sys.argv) > 1 else None\n"
+        "signal.signal(signal.SIGALRM, _cb_alarm)\n"
+        "for _cb_i, _cb_raw in enumerate(_cb_payload['inputs']):\n"
+        "    if _cb_stop_file and os.path.exists(_cb_stop_file):\n"
+        "        break\n"
+        "    _cb_buf = _CbOutput(_cb_output_limit)\n"
+        "    _cb_start, _cb_cpu_start = _cb_time.perf_counter(), _cb_time.process_time()\n"
+        "    try:\n"
+        "        with redirect_stdout(_cb_buf), redirect_stderr(_CbErrors(_cb_buf)):\n"
+        "            _cb_args = json.loads(_cb_raw)\n"
+        "            if _cb_limit:\n"
+        "                signal.setitimer(signal.ITIMER_REAL, _cb_limit / 1000)\n"
+        f"            _cb_result = {function_name}(*_cb_args)\n"
+        "            signal.setitimer(signal.ITIMER_REAL, 0)\n"
+        "        _cb_frame = {'ok': True, 'output': json.dumps(_cb_result, separators=(',', ':'))}\n"
+        "    except _CbOutputLimit:\n"
+        "        _cb_frame = {}\n"
+        "    except _CbTimeLimit:\n"
+        "        _cb_frame = {'ok': False, 'limit': 'time', 'error': 'Time limit exceeded'}\n"
+        "    except MemoryError:\n"
+        "        _cb_frame = {'ok': False, 'limit': 'memory', 'error': traceback.format_exc()}\n"
+        "    except Exception:\n"
+        "        _cb_frame = {'ok': False, 'error': traceback.format_exc()}\n"
+        "    finally:\n"
+        "        signal.setitimer(signal.ITIMER_REAL, 0)\n"
+        "    _cb_bytes = _cb_buf.size + len(_cb_frame.get('output', '').encode())\n"
+        "    if not _cb_frame or _cb_bytes > _cb_output_limit:\n"
+        "        _cb_frame = {'ok': False, 'limit': 'output', 'output_bytes': _cb_bytes,\n"
+        "                     'error': 'Output limit exceeded'}\n"
+        "    _cb_frame.update(i=_cb_i, stdout=_cb_buf.getvalue(),\n"
+        "                     time=round(_cb_time.perf_counter() - _cb_start, 6),\n"
+        "                     cpu_time=round(_cb_time.process_time() - _cb_cpu_start, 6),\n"
+        "                     memory_kb=_cb_resource.getrusage(_cb_resource.RUSAGE_SELF).ru_maxrss)\n"
+        f"    sys.stdout.write({BATCH_FRAME_MARKER!r} + json.dumps(_cb_frame) + '\\n')\n"
+        "    sys.stdout.flush()\n"
+        "    if _cb_payload.get('stop_on_failure') and not _cb_frame['ok']:\n"
+        "        break\n"
     )
 
 
+def _js_batch_wrap(user_code, function_name):
+    return (
+        f"{user_code}\n\n"
+        "const _cbFs = require('fs');\n"
+        "const _cbPayload = JSON.parse(_cbFs.readFileSync('/dev/stdin', 'utf8'));\n"
+        "const _cbLimit = _cbPayload.time_limit_ms;\n"
+        "const _cbOutputLimit = _cbPayload.output_limit || Infinity;\n"
+        "const _cbStopFile = process.argv[2];\n"
+        "const _cbCallScript = new (require('vm').Script)('_cbCall()');\n"
+        "const _cbFormat = require('util').format;\n"
+        "const _cbLog = console.log, _cbError = console.error;\n"
+        "class _CbOutputLimit extends Error {}\n"
+        "for (let _cbI = 0; _cbI < _cbPayload.inputs.length; _cbI++) {\n"
+        "    if (_cbStopFile && _cbFs.existsSync(_cbStopFile)) break;\n"
+        "    const _cbOut = [];\n"
+        "    let _cbOutBytes = 0;\n"
+        "    const _cbCount = (s) => {\n"
+        "        _cbOutBytes += Buffer.byteLength(s);\n"
+        "        if (_cbOutBytes > _cbOutputLimit) throw new _CbOutputLimit();\n"
+        "    };\n"
+        "    console.log = (...a) => {\n"
+        "        const s = _cbFormat(...a) + '\\n';\n"
+        "        if (_cbOutBytes < _cbOutputLimit) _cbOut.push(s.slice(0, _cbOutputLimit - _cbOutBytes));\n"
+        "        _cbCount(s);\n"
+        "    };\n"
+        "    console.error = (...a) => { _cbCount(_cbFormat(...a) + '\\n'); };\n"
+        "    const _cbStart = process.hrtime.bigint(), _cbCpuStart = process.cpuUsage();\n"
+        "    let _cbFrame;\n"
+        "    try {\n"
+        "        const _cbArgs = JSON.parse(_cbPayload.inputs[_cbI]);\n"
+        f"        globalThis._cbCall = () => {function_name}(..._cbArgs);\n"
+        "        const _cbResult = _cbLimit\n"
+        "            ? _cbCallScript.runInThisContext({ timeout: _cbLimit }) : _cbCall();\n"
+        "        _cbFrame = { ok: true, output: String(JSON.stringify(_cbResult)) };\n"
+        "    } catch (e) {\n"
+        "        _cbFrame = (e && e.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT')\n"
+        "            ? { ok: false, limit: 'time', error: 'Time limit exceeded' }\n"
+        "            : { ok: false, error: (e && e.stack) ? e.stack : String(e) };\n"
+        "    }\n"
+        "    console.log = _cbLog;\n"
+        "    console.error = _cbError;\n"
+        "    const _cbBytes = _cbOutBytes + (_cbFrame.output ? Buffer.byteLength(_cbFrame.output) : 0);\n"
+        "    if (_cbBytes > _cbOutputLimit) {\n"
+        "        _cbFrame = { ok: false, limit: 'output', output_bytes: _cbBytes, error: 'Output limit exceeded' };\n"
+        "    }\n"
+        "    _cbFrame.i = _cbI;\n"
+        "    _cbFrame.stdout = _cbOut.join('');\n"
+        "    _cbFrame.time = Number(process.hrtime.bigint() - _cbStart) / 1e9;\n"
+        "    const _cbCpu = process.cpuUsage(_cbCpuStart);\n"
+        "    _cbFrame.cpu_time = (_cbCpu.user + _cbCpu.system) / 1e6;\n"
+        "    _cbFrame.memory_kb = process.resourceUsage().maxRSS;\n"
+        f"    process.stdout.write({BATCH_FRAME_MARKER!r} + JSON.stringify(_cbFrame) + '\\n');\n"
+        "    if (_cbPayload.stop_on_failure && !_cbFrame.ok) break;\n"
+        "}\n"
+    )
+
+
+# -- Compiled-language batch harnesses -----------------------------------------
+# Same stdin payload, stop file argument and frames as the batch wrappers
+# above. Argument types come from the user's function itself (templates in
+# C++, reflection in Java and Go), so only its name is needed. These
+# harnesses can't interrupt a call: one that hits the time limit gets a
+# frame marked "aborted" and the process exits.
+
+_CPP_PRELUDE = """#include <bits/stdc++.h>
+#include <csignal>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <unistd.h>
+using namespace std;
+
+"""
+
+_CPP_RUNTIME = r'''namespace cb {
+
+struct Json {
+    enum Kind { Null, Bool, Num, Str, Arr, Obj } kind = Null;
+    bool b = false;
+    std::string s;  // number text or string value
+    std::vector<Json> items;
+    std::vector<std::string> keys;  // of an object, parallel to items
+    const Json* get(const std::string& key) const {
+        for (size_t k = 0; k < keys.size(); k++) if (keys[k] == key) return &items[k];
+        return nullptr;
+    }
+};
+
+struct Parser {
+    const std::string& t;
+    size_t p = 0;
+    explicit Parser(const std::string& text) : t(text) {}
+    [[noreturn]] void fail() { throw std::invalid_argument("Invalid JSON input"); }
+    void ws() { while (p < t.size() && isspace((unsigned char)t[p])) p++; }
+    Json document() { Json j = value(); ws(); if (p != t.size()) fail(); return j; }
+    Json value() {
+        ws();
+        if (p >= t.size()) fail();
+        Json j;
+        char c = t[p];
+        if (c == '[') {
+            j.kind = Json::Arr;
+            p++; ws();
+            if (p < t.size() && t[p] == ']') { p++; return j; }
+            while (true) {
+                j.items.push_back(value());
+                ws();
+                if (p >= t.size()) fail();
+                if (t[p] == ',') { p++; continue; }
+                if (t[p] == ']') { p++; return j; }
+                fail();
+            }
+        }
+        if (c == '{') {
+            j.kind = Json::Obj;
+            p++; ws();
+            if (p < t.size() && t[p] == '}') { p++; return j; }
+            while (true) {
+                ws();
+                if (p >= t.size() || t[p] != '"') fail();
+                j.keys.push_back(str());
+                ws();
+                if (p >= t.size() || t[p++] != ':') fail();
+                j.items.push_back(value());
+                ws();
+                if (p >= t.size()) fail();
+                if (t[p] == ',') { p++; continue; }
+                if (t[p] == '}') { p++; return j; }
+                fail();
+            }
+        }
+        if (c == '"') { j.kind = Json::Str; j.s = str(); return j; }
+        if (t.compare(p, 4, "true") == 0) { p += 4; j.kind = Json::Bool; j.b = true; return j; }
+        if (t.compare(p, 5, "false") == 0) { p += 5; j.kind = Json::Bool; return j; }
+        if (t.compare(p, 4, "null") == 0) { p += 4; return j; }
+        size_t start = p;
+        while (p < t.size() && strchr("+-0123456789.eE", t[p])) p++;
+        if (start == p) fail();
+        j.kind = Json::Num;
+        j.s = t.substr(start, p - start);
+        return j;
+    }
+    unsigned hex4() {
+        if (p + 4 > t.size()) fail();
+        unsigned v = std::stoul(t.substr(p, 4), nullptr, 16);
+        p += 4;
+        return v;
+    }
+    std::string str() {
+        std::string out;
+        p++;
+        while (p < t.size()) {
+            char c = t[p++];
+            if (c == '"') return out;
+            if (c != '\\') { out += c; continue; }
+            if (p >= t.size()) fail();
+            char e = t[p++];
+            switch (e) {
+                case 'n': out += '\n'; break;
+                case 't': out += '\t'; break;
+                case 'r': out += '\r'; break;
+                case 'b': out += '\b'; break;
+                case 'f': out += '\f'; break;
+                case 'u': {
+                    unsigned cp = hex4();
+                    if (cp >= 0xD800 && cp < 0xDC00 && t.compare(p, 2, "\\u") == 0) {
+                        p += 2;
+                        cp = 0x10000 + ((cp - 0xD800) << 10) + (hex4() - 0xDC00);
+                    }
+                    if (cp < 0x80) out += (char)cp;
+                    else if (cp < 0x800) { out += (char)(0xC0 | cp >> 6); out += (char)(0x80 | (cp & 0x3F)); }
+                    else if (cp < 0x10000) { out += (char)(0xE0 | cp >> 12); out += (char)(0x80 | (cp >> 6 & 0x3F)); out += (char)(0x80 | (cp & 0x3F)); }
+                    else { out += (char)(0xF0 | cp >> 18); out += (char)(0x80 | (cp >> 12 & 0x3F)); out += (char)(0x80 | (cp >> 6 & 0x3F)); out += (char)(0x80 | (cp & 0x3F)); }
+                    break;
+                }
+                default: out += e;
+            }
+        }
+        fail();
+    }
+};
+
+inline const Json& expect(const Json& j, Json::Kind kind, const char* what) {
+    if (j.kind != kind) throw std::invalid_argument(std::string("Expected ") + what + " in input");
+    return j;
+}
+inline void from_json(const Json& j, int& v) { v = std::stoi(expect(j, Json::Num, "a number").s); }
+inline void from_json(const Json& j, long& v) { v = std::stol(expect(j, Json::Num, "a number").s); }
+inline void from_json(const Json& j, long long& v) { v = std::stoll(expect(j, Json::Num, "a number").s); }
+inline void from_json(const Json& j, double& v) { v = std::stod(expect(j, Json::Num, "a number").s); }
+inline void from_json(const Json& j, float& v) { v = std::stof(expect(j, Json::Num, "a number").s); }
+inline void from_json(const Json& j, bool& v) { v = expect(j, Json::Bool, "a boolean").b; }
+inline void from_json(const Json& j, char& v) {
+    const std::string& s = expect(j, Json::Str, "a string").s;
+    v = s.empty() ? '\0' : s[0];
+}
+inline void from_json(const Json& j, std::string& v) { v = expect(j, Json::Str, "a string").s; }
+template <class T> void from_json(const Json& j, std::vector<T>& v) {
+    expect(j, Json::Arr, "an array");
+    v.resize(j.items.size());
+    for (size_t k = 0; k < j.items.size(); k++) {
+        T item;
+        from_json(j.items[k], item);
+        v[k] = std::move(item);
+    }
+}
+
+inline void quote(std::string& o, const std::string& s) {
+    o += '"';
+    for (unsigned char c : s) {
+        if (c == '"' || c == '\\') { o += '\\'; o += (char)c; }
+        else if (c == '\n') o += "\\n";
+        else if (c == '\t') o += "\\t";
+        else if (c == '\r') o += "\\r";
+        else if (c < 0x20 || c == 0x7F) { char buf[8]; snprintf(buf, sizeof buf, "\\u%04x", c); o += buf; }
+        else o += (char)c;
+    }
+    o += '"';
+}
+inline void to_json(std::string& o, int v) { o += std::to_string(v); }
+inline void to_json(std::string& o, long v) { o += std::to_string(v); }
+inline void to_json(std::string& o, long long v) { o += std::to_string(v); }
+inline void to_json(std::string& o, unsigned v) { o += std::to_string(v); }
+inline void to_json(std::string& o, unsigned long v) { o += std::to_string(v); }
+inline void to_json(std::string& o, unsigned long long v) { o += std::to_string(v); }
+inline void to_json(std::string& o, double v) {
+    if (!std::isfinite(v)) { o += "null"; return; }
+    char buf[32];
+    // Shortest text that reads back as the same double
+    for (int precision = 15; precision <= 17; precision++) {
+        snprintf(buf, sizeof buf, "%.*g", precision, v);
+        if (strtod(buf, nullptr) == v) break;
+    }
+    o += buf;
+}
+inline void to_json(std::string& o, float v) { to_json(o, (double)v); }
+inline void to_json(std::string& o, bool v) { o += v ? "true" : "false"; }
+inline void to_json(std::string& o, char v) { quote(o, std::string(1, v)); }
+inline void to_json(std::string& o, const std::string& v) { quote(o, v); }
+inline void to_json(std::string& o, const char* v) { quote(o, v); }
+template <class T> void to_json(std::string& o, const std::vector<T>& v) {
+    o += '[';
+    for (size_t k = 0; k < v.size(); k++) {
+        if (k) o += ',';
+        to_json(o, (const T&)v[k]);
+    }
+    o += ']';
+}
+inline void to_json(std::string& o, const std::vector<bool>& v) {
+    o += '[';
+    for (size_t k = 0; k < v.size(); k++) o += k ? (v[k] ? ",true" : ",false") : (v[k] ? "true" : "false");
+    o += ']';
+}
+
+template <class R, class... A, size_t... I>
+std::string call(R (*fn)(A...), const Json& args, std::index_sequence<I...>) {
+    if (args.kind != Json::Arr || args.items.size() != sizeof...(A))
+        throw std::invalid_argument("Expected a JSON array of " + std::to_string(sizeof...(A)) + " arguments");
+    std::tuple<std::decay_t<A>...> values;
+    (from_json(args.items[I], std::get<I>(values)), ...);
+    std::string out;
+    if constexpr (std::is_void_v<R>) {
+        fn(std::get<I>(values)...);
+        out = "null";
+    } else {
+        to_json(out, fn(std::get<I>(values)...));
+    }
+    return out;
+}
+template <class R, class... A>
+std::string call(R (*fn)(A...), const Json& args) {
+    return call(fn, args, std::index_sequence_for<A...>{});
+}
+
+// Set before each call: the frame written if the call hits the time limit
+std::string time_limit_frame;
+
+void on_time_limit(int) {
+    ssize_t ignored = write(1, time_limit_frame.data(), time_limit_frame.size());
+    (void)ignored;
+    _exit(0);
+}
+
+double cpu_seconds() {
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_utime.tv_sec + usage.ru_stime.tv_sec
+        + (usage.ru_utime.tv_usec + usage.ru_stime.tv_usec) / 1e6;
+}
+
+long peak_rss_kb() {
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_maxrss;
+}
+
+}  // namespace cb
+'''
+
+_CPP_MAIN = r'''int main(int argc, char** argv) {
+    std::string raw((std::istreambuf_iterator<char>(std::cin)), std::istreambuf_iterator<char>());
+    cb::Json payload = cb::Parser(raw).document();
+    const cb::Json* inputs = payload.get("inputs");
+    const cb::Json* limit = payload.get("time_limit_ms");
+    const cb::Json* output_limit_json = payload.get("output_limit");
+    const cb::Json* stop_json = payload.get("stop_on_failure");
+    long time_limit_ms = limit ? std::stol(limit->s) : 0;
+    size_t output_limit = output_limit_json ? std::stoull(output_limit_json->s) : SIZE_MAX;
+    bool stop_on_failure = stop_json && stop_json->b;
+    const char* stop_file = argc > 1 ? argv[1] : nullptr;
+    signal(SIGALRM, cb::on_time_limit);
+
+    for (size_t i = 0; inputs && i < inputs->items.size(); i++) {
+        if (stop_file && access(stop_file, F_OK) == 0) break;
+        // Frames start on a fresh line in case printf output is pending;
+        // a case that hits the time limit ends the run (see on_time_limit)
+        std::string index = std::to_string(i);
+        cb::time_limit_frame = "\n\x1e{\"ok\":false,\"limit\":\"time\",\"aborted\":true,"
+            "\"error\":\"Time limit exceeded\",\"i\":" + index + ",\"stdout\":\"\",\"time\":"
+            + std::to_string(time_limit_ms / 1000.0) + "}\n";
+        // cout is kept; cerr is only counted against the output limit
+        std::ostringstream captured, captured_err;
+        std::streambuf* real_out = std::cout.rdbuf(captured.rdbuf());
+        std::streambuf* real_err = std::cerr.rdbuf(captured_err.rdbuf());
+        auto start = std::chrono::steady_clock::now();
+        double cpu_start = cb::cpu_seconds();
+        if (time_limit_ms) {
+            struct itimerval timer = {};
+            timer.it_value.tv_sec = time_limit_ms / 1000;
+            timer.it_value.tv_usec = (time_limit_ms % 1000) * 1000;
+            setitimer(ITIMER_REAL, &timer, nullptr);
+        }
+        bool ok = false, out_of_memory = false;
+        std::string output, error;
+        try {
+            cb::Json args = cb::Parser(inputs->items[i].s).document();
+            output = cb::call(&__FUNCTION__, args);
+            ok = true;
+        } catch (const std::bad_alloc&) {
+            error = "std::bad_alloc";
+            out_of_memory = true;
+        } catch (const std::exception& e) {
+            error = e.what();
+        } catch (...) {
+            error = "Unknown exception";
+        }
+        struct itimerval off = {};
+        setitimer(ITIMER_REAL, &off, nullptr);
+        double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+        double cpu_time = cb::cpu_seconds() - cpu_start;
+        std::cout.rdbuf(real_out);
+        std::cerr.rdbuf(real_err);
+
+        std::string out = captured.str();
+        size_t written = out.size() + captured_err.str().size() + output.size();
+        std::string frame = "\n\x1e{";
+        if (written > output_limit) {
+            ok = false;
+            out.resize(output_limit);
+            frame += "\"ok\":false,\"limit\":\"output\",\"output_bytes\":" + std::to_string(written)
+                + ",\"error\":\"Output limit exceeded\"";
+        } else if (ok) {
+            frame += "\"ok\":true,\"output\":";
+            cb::quote(frame, output);
+        } else {
+            frame += out_of_memory ? "\"ok\":false,\"limit\":\"memory\",\"error\":" : "\"ok\":false,\"error\":";
+            cb::quote(frame, error);
+        }
+        frame += ",\"i\":" + index + ",\"stdout\":";
+        cb::quote(frame, out);
+        frame += ",\"time\":";
+        cb::to_json(frame, elapsed);
+        frame += ",\"cpu_time\":";
+        cb::to_json(frame, cpu_time);
+        frame += ",\"memory_kb\":" + std::to_string(cb::peak_rss_kb()) + "}\n";
+        fwrite(frame.data(), 1, frame.size(), stdout);
+        fflush(stdout);
+        if (stop_on_failure && !ok) break;
+    }
+    return 0;
+}
+'''
+
+# On the user's first line, so compiler line numbers match the user's code
+_JAVA_PRELUDE = "import java.io.*; import java.util.*; "
+
+_JAVA_MAIN = r'''public class Main {
+    static final String FUNCTION = "__FUNCTION__";
+    // Per-case limit when the payload has none (the judge's default)
+    static final long DEFAULT_TIME_LIMIT_MS = 10000;
+
+    static final class Parser {
+        final String t;
+        int p = 0;
+        Parser(String text) { t = text; }
+        IllegalArgumentException fail() { return new IllegalArgumentException("Invalid JSON input"); }
+        void ws() { while (p < t.length() && Character.isWhitespace(t.charAt(p))) p++; }
+        Object document() { Object v = value(); ws(); if (p != t.length()) throw fail(); return v; }
+        Object value() {
+            ws();
+            if (p >= t.length()) throw fail();
+            char c = t.charAt(p);
+            if (c == '[') {
+                List<Object> items = new ArrayList<>();
+                p++; ws();
+                if (p < t.length() && t.charAt(p) == ']') { p++; return items; }
+                while (true) {
+                    items.add(value());
+                    ws();
+                    if (p >= t.length()) throw fail();
+                    char d = t.charAt(p++);
+                    if (d == ']') return items;
+                    if (d != ',') throw fail();
+                }
+            }
+            if (c == '{') {
+                Map<String, Object> fields = new LinkedHashMap<>();
+                p++; ws();
+                if (p < t.length() && t.charAt(p) == '}') { p++; return fields; }
+                while (true) {
+                    ws();
+                    if (p >= t.length() || t.charAt(p) != '"') throw fail();
+                    String key = str();
+                    ws();
+                    if (p >= t.length() || t.charAt(p++) != ':') throw fail();
+                    fields.put(key, value());
+                    ws();
+                    if (p >= t.length()) throw fail();
+                    char d = t.charAt(p++);
+                    if (d == '}') return fields;
+                    if (d != ',') throw fail();
+                }
+            }
+            if (c == '"') return str();
+            if (t.startsWith("true", p)) { p += 4; return Boolean.TRUE; }
+            if (t.startsWith("false", p)) { p += 5; return Boolean.FALSE; }
+            if (t.startsWith("null", p)) { p += 4; return null; }
+            int start = p;
+            while (p < t.length() && "+-0123456789.eE".indexOf(t.charAt(p)) >= 0) p++;
+            if (start == p) throw fail();
+            String number = t.substring(start, p);
+            try {
+                return Long.parseLong(number);
+            } catch (NumberFormatException e) {
+                return Double.parseDouble(number);
+            }
+        }
+        String str() {
+            StringBuilder out = new StringBuilder();
+            p++;
+            while (p < t.length()) {
+                char c = t.charAt(p++);
+                if (c == '"') return out.toString();
+                if (c != '\\') { out.append(c); continue; }
+                if (p >= t.length()) throw fail();
+                char e = t.charAt(p++);
+                switch (e) {
+                    case 'n': out.append('\n'); break;
+                    case 't': out.append('\t'); break;
+                    case 'r': out.append('\r'); break;
+                    case 'b': out.append('\b'); break;
+                    case 'f': out.append('\f'); break;
+                    case 'u':
+                        if (p + 4 > t.length()) throw fail();
+                        out.append((char) Integer.parseInt(t.substring(p, p + 4), 16));
+                        p += 4;
+                        break;
+                    default: out.append(e);
+                }
+            }
+            throw fail();
+        }
+    }
+
+    static Object convert(Object value, Class<?> type) {
+        if (type == int.class || type == Integer.class) return number(value).intValue();
+        if (type == long.class || type == Long.class) return number(value).longValue();
+        if (type == double.class || type == Double.class) return number(value).doubleValue();
+        if (type == float.class || type == Float.class) return number(value).floatValue();
+        if (type == boolean.class || type == Boolean.class) {
+            if (!(value instanceof Boolean)) throw new IllegalArgumentException("Expected a boolean in input");
+            return value;
+        }
+        if (type == char.class || type == Character.class) {
+            String s = string(value);
+            return s.isEmpty() ? '\0' : s.charAt(0);
+        }
+        if (type == String.class) return string(value);
+        if (type.isArray() || List.class.isAssignableFrom(type)) {
+            if (!(value instanceof List)) throw new IllegalArgumentException("Expected an array in input");
+            List<?> items = (List<?>) value;
+            if (!type.isArray()) return new ArrayList<>(items);
+            Object array = java.lang.reflect.Array.newInstance(type.getComponentType(), items.size());
+            for (int k = 0; k < items.size(); k++) {
+                java.lang.reflect.Array.set(array, k, convert(items.get(k), type.getComponentType()));
+            }
+            return array;
+        }
+        return value;
+    }
+
+    static Number number(Object value) {
+        if (!(value instanceof Number)) throw new IllegalArgumentException("Expected a number in input");
+        return (Number) value;
+    }
+
+    static String string(Object value) {
+        if (!(value instanceof String)) throw new IllegalArgumentException("Expected a string in input");
+        return (String) value;
+    }
+
+    static void quote(StringBuilder o, String s) {
+        o.append('"');
+        for (int k = 0; k < s.length(); k++) {
+            char c = s.charAt(k);
+            if (c == '"' || c == '\\') o.append('\\').append(c);
+            else if (c == '\n') o.append("\\n");
+            else if (c == '\t') o.append("\\t");
+            else if (c == '\r') o.append("\\r");
+            else if (c < 0x20 || c == 0x7F) o.append(String.format("\\u%04x", (int) c));
+            else o.append(c);
+        }
+        o.append('"');
+    }
+
+    static void toJson(StringBuilder o, Object value) {
+        if (value == null) {
+            o.append("null");
+        } else if (value instanceof Double || value instanceof Float) {
+            double d = ((Number) value).doubleValue();
+            o.append(Double.isFinite(d) ? Double.toString(d) : "null");
+        } else if (value instanceof Number || value instanceof Boolean) {
+            o.append(value);
+        } else if (value instanceof Character || value instanceof CharSequence) {
+            quote(o, value.toString());
+        } else if (value.getClass().isArray()) {
+            o.append('[');
+            for (int k = 0; k < java.lang.reflect.Array.getLength(value); k++) {
+                if (k > 0) o.append(',');
+                toJson(o, java.lang.reflect.Array.get(value, k));
+            }
+            o.append(']');
+        } else if (value instanceof Iterable) {
+            o.append('[');
+            boolean first = true;
+            for (Object item : (Iterable<?>) value) {
+                if (!first) o.append(',');
+                toJson(o, item);
+                first = false;
+            }
+            o.append(']');
+        } else if (value instanceof Map) {
+            o.append('{');
+            boolean first = true;
+            for (Map.Entry<?, ?> entry : ((Map<?, ?>) value).entrySet()) {
+                if (!first) o.append(',');
+                quote(o, String.valueOf(entry.getKey()));
+                o.append(':');
+                toJson(o, entry.getValue());
+                first = false;
+            }
+            o.append('}');
+        } else {
+            quote(o, value.toString());
+        }
+    }
+
+    static long peakRssKb() {
+        try {
+            for (String line : java.nio.file.Files.readAllLines(java.nio.file.Paths.get("/proc/self/status"))) {
+                if (line.startsWith("VmHWM:")) return Long.parseLong(line.replaceAll("[^0-9]", ""));
+            }
+        } catch (Exception e) {
+            // Not on Linux; memory is just not reported
+        }
+        return 0;
+    }
+
+    static final class Capture extends OutputStream {
+        // A case's System.out: kept up to the output limit, everything counted
+        final ByteArrayOutputStream kept = new ByteArrayOutputStream();
+        final long limit;
+        long size = 0;
+        Capture(long limit) { this.limit = limit; }
+        @Override public synchronized void write(int b) {
+            if (size < limit) kept.write(b);
+            size++;
+        }
+        @Override public synchronized void write(byte[] b, int off, int len) {
+            if (size < limit) kept.write(b, off, (int) Math.min(len, limit - size));
+            size += len;
+        }
+        synchronized void count(int len) {
+            size += len;
+        }
+    }
+
+    static final class Counted extends OutputStream {
+        // A case's System.err: dropped, but counted against the output limit
+        final Capture capture;
+        Counted(Capture capture) { this.capture = capture; }
+        @Override public void write(int b) { capture.count(1); }
+        @Override public void write(byte[] b, int off, int len) { capture.count(len); }
+    }
+
+    public static void main(String[] argv) throws Exception {
+        PrintStream realOut = System.out;
+        PrintStream realErr = System.err;
+        String raw = new String(System.in.readAllBytes(), java.nio.charset.StandardCharsets.UTF_8);
+        @SuppressWarnings("unchecked")
+        Map<String, Object> payload = (Map<String, Object>) new Parser(raw).document();
+        List<?> inputs = (List<?>) payload.get("inputs");
+        long timeLimitMs = payload.get("time_limit_ms") != null ? number(payload.get("time_limit_ms")).longValue() : 0;
+        if (timeLimitMs <= 0) timeLimitMs = DEFAULT_TIME_LIMIT_MS;
+        long outputLimit = payload.get("output_limit") != null ? number(payload.get("output_limit")).longValue() : Long.MAX_VALUE;
+        boolean stopOnFailure = Boolean.TRUE.equals(payload.get("stop_on_failure"));
+        java.io.File stopFile = argv.length > 0 ? new java.io.File(argv[0]) : null;
+
+        java.lang.reflect.Method method = null;
+        for (java.lang.reflect.Method candidate : Solution.class.getDeclaredMethods()) {
+            if (candidate.getName().equals(FUNCTION)) method = candidate;
+        }
+        if (method == null) throw new NoSuchMethodException("Solution." + FUNCTION + " not found");
+        method.setAccessible(true);
+        final java.lang.reflect.Method target = method;
+        final Object instance = java.lang.reflect.Modifier.isStatic(method.getModifiers()) ? null : newSolution();
+        java.lang.management.ThreadMXBean threads = java.lang.management.ManagementFactory.getThreadMXBean();
+
+        for (int i = 0; i < inputs.size(); i++) {
+            if (stopFile != null && stopFile.exists()) break;
+            final String input = (String) inputs.get(i);
+            final Capture capture = new Capture(outputLimit);
+            final Object[] outcome = new Object[3];  // output, error, limit
+            final long[] cpu = new long[1];
+            System.setOut(new PrintStream(capture, true, "UTF-8"));
+            System.setErr(new PrintStream(new Counted(capture), true, "UTF-8"));
+            long start = System.nanoTime();
+            // A large stack for deeply recursive solutions
+            Thread call = new Thread(null, () -> {
+                long cpuStart = threads.getCurrentThreadCpuTime();
+                try {
+                    List<?> args = (List<?>) new Parser(input).document();
+                    Class<?>[] types = target.getParameterTypes();
+                    if (args.size() != types.length) {
+                        throw new IllegalArgumentException("Expected a JSON array of " + types.length + " arguments");
+                    }
+                    Object[] values = new Object[types.length];
+                    for (int k = 0; k < types.length; k++) values[k] = convert(args.get(k), types[k]);
+                    StringBuilder output = new StringBuilder();
+                    toJson(output, target.invoke(instance, values));
+                    outcome[0] = output.toString();
+                } catch (java.lang.reflect.InvocationTargetException e) {
+                    outcome[1] = e.getCause();
+                } catch (Throwable e) {
+                    outcome[1] = e;
+                }
+                cpu[0] = threads.getCurrentThreadCpuTime() - cpuStart;
+            }, "solution", 512L * 1024 * 1024);
+            call.setDaemon(true);
+            call.start();
+            call.join(timeLimitMs);
+            double elapsed = (System.nanoTime() - start) / 1e9;
+            System.setOut(realOut);
+            System.setErr(realErr);
+
+            StringBuilder frame = new StringBuilder("\u001e{");
+            boolean ok = false;
+            boolean aborted = false;
+            long bytes = capture.size + (outcome[0] != null ? ((String) outcome[0]).getBytes("UTF-8").length : 0);
+            if (call.isAlive()) {
+                // A Java thread can't be stopped; report the case and end the run
+                frame.append("\"ok\":false,\"limit\":\"time\",\"aborted\":true,\"error\":\"Time limit exceeded\"");
+                aborted = true;
+            } else if (bytes > outputLimit) {
+                frame.append("\"ok\":false,\"limit\":\"output\",\"output_bytes\":").append(bytes)
+                    .append(",\"error\":\"Output limit exceeded\"");
+            } else if (outcome[1] == null) {
+                frame.append("\"ok\":true,\"output\":");
+                quote(frame, (String) outcome[0]);
+                ok = true;
+            } else {
+                Throwable error = (Throwable) outcome[1];
+                frame.append("\"ok\":false,");
+                if (error instanceof OutOfMemoryError) frame.append("\"limit\":\"memory\",");
+                java.io.StringWriter trace = new java.io.StringWriter();
+                error.printStackTrace(new PrintWriter(trace));
+                frame.append("\"error\":");
+                quote(frame, trace.toString());
+            }
+            frame.append(",\"i\":").append(i).append(",\"stdout\":");
+            quote(frame, capture.kept.toString("UTF-8"));
+            frame.append(",\"time\":").append(elapsed)
+                .append(",\"cpu_time\":").append(cpu[0] / 1e9)
+                .append(",\"memory_kb\":").append(peakRssKb()).append("}\n");
+            realOut.print(frame);
+            realOut.flush();
+            if (aborted) {
+                Runtime.getRuntime().halt(0);
+            }
+            if (stopOnFailure && !ok) break;
+        }
+        realOut.flush();
+        Runtime.getRuntime().halt(0);
+    }
+
+    static Object newSolution() throws Exception {
+        java.lang.reflect.Constructor<Solution> constructor = Solution.class.getDeclaredConstructor();
+        constructor.setAccessible(true);
+        return constructor.newInstance();
+    }
+}
+'''
+
+_GO_PRELUDE = """package main
+
+import (
+	_cbbytes "bytes"
+	_cbjson "encoding/json"
+	_cbfmt "fmt"
+	_cbio "io"
+	_cbos "os"
+	_cbreflect "reflect"
+	_cbdebug "runtime/debug"
+	_cbsync "sync"
+	_cbsyscall "syscall"
+	_cbtime "time"
+)
+
+"""
+
+_GO_MAIN = r'''type _cbPayload struct {
+	Inputs        []string `json:"inputs"`
+	TimeLimitMs   int64    `json:"time_limit_ms"`
+	OutputLimit   int64    `json:"output_limit"`
+	StopOnFailure bool     `json:"stop_on_failure"`
+}
+
+// A case's stdout: kept up to the output limit, everything counted.
+// stderr is only counted.
+type _cbCapture struct {
+	mu    _cbsync.Mutex
+	kept  _cbbytes.Buffer
+	limit int64
+	size  int64
+}
+
+func (c *_cbCapture) write(p []byte, keep bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if keep && c.size < c.limit {
+		n := int64(len(p))
+		if n > c.limit-c.size {
+			n = c.limit - c.size
+		}
+		c.kept.Write(p[:n])
+	}
+	c.size += int64(len(p))
+}
+
+type _cbWriter struct {
+	capture *_cbCapture
+	keep    bool
+}
+
+func (w _cbWriter) Write(p []byte) (int, error) {
+	w.capture.write(p, w.keep)
+	return len(p), nil
+}
+
+func _cbRedirect(capture *_cbCapture, keep bool) (*_cbos.File, chan struct{}) {
+	r, w, err := _cbos.Pipe()
+	if err != nil {
+		panic(err)
+	}
+	drained := make(chan struct{})
+	go func() {
+		_cbio.Copy(_cbWriter{capture, keep}, r)
+		r.Close()
+		close(drained)
+	}()
+	return w, drained
+}
+
+func _cbUsage() (float64, int64) {
+	var usage _cbsyscall.Rusage
+	_cbsyscall.Getrusage(_cbsyscall.RUSAGE_SELF, &usage)
+	cpu := float64(usage.Utime.Sec+usage.Stime.Sec) + float64(usage.Utime.Usec+usage.Stime.Usec)/1e6
+	return cpu, usage.Maxrss
+}
+
+func _cbMarshal(v interface{}) (string, error) {
+	var buf _cbbytes.Buffer
+	encoder := _cbjson.NewEncoder(&buf)
+	encoder.SetEscapeHTML(false)
+	if err := encoder.Encode(v); err != nil {
+		return "", err
+	}
+	return string(_cbbytes.TrimRight(buf.Bytes(), "\n")), nil
+}
+
+type _cbOutcome struct {
+	output string
+	err    string
+}
+
+func _cbCall(fn _cbreflect.Value, raw string) (outcome _cbOutcome) {
+	defer func() {
+		if r := recover(); r != nil {
+			outcome = _cbOutcome{err: _cbfmt.Sprintf("panic: %v\n\n%s", r, _cbdebug.Stack())}
+		}
+	}()
+	var args []_cbjson.RawMessage
+	if err := _cbjson.Unmarshal([]byte(raw), &args); err != nil {
+		return _cbOutcome{err: "Invalid JSON input: " + err.Error()}
+	}
+	kind := fn.Type()
+	if len(args) != kind.NumIn() {
+		return _cbOutcome{err: _cbfmt.Sprintf("Expected a JSON array of %d arguments", kind.NumIn())}
+	}
+	in := make([]_cbreflect.Value, len(args))
+	for k, arg := range args {
+		value := _cbreflect.New(kind.In(k))
+		if err := _cbjson.Unmarshal(arg, value.Interface()); err != nil {
+			return _cbOutcome{err: _cbfmt.Sprintf("Argument %d: %v", k+1, err)}
+		}
+		in[k] = value.Elem()
+	}
+	var result interface{}
+	if results := fn.Call(in); len(results) > 0 {
+		result = results[0].Interface()
+	}
+	output, err := _cbMarshal(result)
+	if err != nil {
+		return _cbOutcome{err: err.Error()}
+	}
+	return _cbOutcome{output: output}
+}
+
+func main() {
+	raw, _ := _cbio.ReadAll(_cbos.Stdin)
+	var payload _cbPayload
+	if err := _cbjson.Unmarshal(raw, &payload); err != nil {
+		_cbfmt.Fprintln(_cbos.Stderr, err)
+		_cbos.Exit(1)
+	}
+	if payload.OutputLimit <= 0 {
+		payload.OutputLimit = 1 << 62
+	}
+	stopFile := ""
+	if len(_cbos.Args) > 1 {
+		stopFile = _cbos.Args[1]
+	}
+	fn := _cbreflect.ValueOf(__FUNCTION__)
+	realOut, realErr := _cbos.Stdout, _cbos.Stderr
+	for i, input := range payload.Inputs {
+		if stopFile != "" {
+			if _, err := _cbos.Stat(stopFile); err == nil {
+				break
+			}
+		}
+		capture := &_cbCapture{limit: payload.OutputLimit}
+		outWriter, outDrained := _cbRedirect(capture, true)
+		errWriter, errDrained := _cbRedirect(capture, false)
+		_cbos.Stdout, _cbos.Stderr = outWriter, errWriter
+		start := _cbtime.Now()
+		cpuStart, _ := _cbUsage()
+		done := make(chan _cbOutcome, 1)
+		go func() { done <- _cbCall(fn, input) }()
+		var outcome _cbOutcome
+		timedOut := false
+		if payload.TimeLimitMs > 0 {
+			select {
+			case outcome = <-done:
+			case <-_cbtime.After(_cbtime.Duration(payload.TimeLimitMs) * _cbtime.Millisecond):
+				timedOut = true
+			}
+		} else {
+			outcome = <-done
+		}
+		elapsed := _cbtime.Since(start).Seconds()
+		cpuEnd, peakKb := _cbUsage()
+		_cbos.Stdout, _cbos.Stderr = realOut, realErr
+		outWriter.Close()
+		errWriter.Close()
+		<-outDrained
+		<-errDrained
+
+		frame := map[string]interface{}{"i": i, "time": elapsed, "cpu_time": cpuEnd - cpuStart, "memory_kb": peakKb}
+		ok := false
+		written := capture.size + int64(len(outcome.output))
+		switch {
+		case timedOut:
+			// A goroutine can't be stopped; report the case and end the run
+			frame["ok"], frame["limit"], frame["aborted"], frame["error"] = false, "time", true, "Time limit exceeded"
+		case written > payload.OutputLimit:
+			frame["ok"], frame["limit"], frame["output_bytes"], frame["error"] = false, "output", written, "Output limit exceeded"
+		case outcome.err == "":
+			frame["ok"], frame["output"] = true, outcome.output
+			ok = true
+		default:
+			frame["ok"], frame["error"] = false, outcome.err
+		}
+		frame["stdout"] = capture.kept.String()
+		line, _ := _cbMarshal(frame)
+		realOut.WriteString("\x1e" + line + "\n")
+		if timedOut {
+			_cbos.Exit(0)
+		}
+		if payload.StopOnFailure && !ok {
+			break
+		}
+	}
+}
+'''
+
+
+def _cpp_batch_wrap(user_code, function_name):
+    # The user writes a free function (see _cpp_starter). #line directives
+    # make compiler errors report the user's own line numbers.
+    head = _CPP_PRELUDE + "#line 1\n" + f"{user_code}\n\n"
+    next_line = head.count("\n") + 2
+    return (head + f"#line {next_line}\n" + _CPP_RUNTIME + "\n"
+            + _CPP_MAIN.replace("__FUNCTION__", function_name))
+
+
+def _java_batch_wrap(user_code, function_name):
+    # The user writes class Solution (see _java_starter); the file's public
+    # class has to be Main.
+    user_code = re.sub(r"\bpublic\s+((?:final\s+)?class\s+Solution)\b", r"\1", user_code)
+    return (_JAVA_PRELUDE + f"{user_code}\n\n"
+            + _JAVA_MAIN.replace("__FUNCTION__", function_name))
+
+
+def _go_batch_wrap(user_code, function_name):
+    # The harness supplies the package clause; its imports are aliased so
+    # they never clash with the user's. //line directives make compiler
+    # errors report the user's own line numbers.
+    user_code = re.sub(r"^(\s*)package\s+\w+", r"\1", user_code, count=1)
+    head = _GO_PRELUDE + "//line solution.go:1:1\n" + f"{user_code}\n\n"
+    next_line = head.count("\n") + 2
+    return (head + f"//line solution.go:{next_line}:1\n"
+            + _GO_MAIN.replace("__FUNCTION__", function_name))
+
+
+# -- Python fork server -------------------------------------------------------
+# A resident interpreter that runs a single-case Python program (plain or
+# wrap_code-wrapped) once per test case without a cold python3 start: it
+# preloads the modules the wrapper imports, compiles the program once and
+# forks a child per case. The child takes the case's stdin file, its own
+# rlimits (address space, CPU) and pipes for stdout/stderr, then executes
+# the compiled program as __main__. The server reads the pipes, enforces
+# the wall-clock and output limits (killing the child) and writes one frame
+# per case: {"i", "exit_code", "stdout", "stderr", "wall_time", "timed_out"}
+# plus "limit": "output" and "output_bytes" for a child stopped at the output
+# limit. A child killed by a signal exits 128 + signal number, like in a
+# shell. Usage: python3 server.py <program> [stop file], payload on stdin
+# (see build_fork_server_input); cases stop once the stop file exists.
+
+PYTHON_FORK_SERVER = r'''import builtins, gc, json, os, resource, selectors, signal, sys, time, traceback
+# What the single-case wrapper imports; a child finds it already loaded
+import resource as _cb_resource, time as _cb_time
+
+
+def run_child(path, program, stdin_path, out_w, err_w, payload):
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    status = 0
+    try:
+        os.dup2(os.open(stdin_path, os.O_RDONLY), 0)
+        sys.stdin = open(0, "r", closefd=False)
+        memory = payload["memory_kb"] * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        cpu_seconds = -(-payload["timeout_ms"] // 1000)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        if isinstance(program, str):
+            # It didn't compile: fail the way python3 would
+            sys.stderr.write(program)
+            status = 1
+        else:
+            exec(program, {"__name__": "__main__", "__file__": path, "__builtins__": builtins})
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            status = e.code or 0
+        else:
+            sys.stderr.write(f"{e.code}\n")
+            status = 1
+    except BaseException as e:
+        # Leave this file's frame out of the traceback
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        status = status or 1
+    os._exit(status)
+
+
+def run_case(index, path, program, stdin_path, payload):
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    sys.stdout.flush()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(out_r)
+            os.close(err_r)
+            run_child(path, program, stdin_path, out_w, err_w, payload)
+        finally:
+            os._exit(1)
+    os.close(out_w)
+    os.close(err_w)
+
+    caps = {out_r: payload["output_limit"] + 1, err_r: payload["stderr_limit"] + 1}
+    kept = {out_r: [], err_r: []}
+    sizes = {out_r: 0, err_r: 0}
+    selector = selectors.DefaultSelector()
+    for fd in caps:
+        selector.register(fd, selectors.EVENT_READ)
+    deadline = start + payload["timeout_ms"] / 1000
+    stopped = None
+    while selector.get_map() and stopped is None:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            stopped = "time"
+            break
+        for key, _ in selector.select(remaining):
+            data = os.read(key.fd, 65536)
+            if not data:
+                selector.unregister(key.fd)
+                continue
+            kept[key.fd].append(data[:max(0, caps[key.fd] - sizes[key.fd])])
+            sizes[key.fd] += len(data)
+            if sizes[key.fd] >= caps[key.fd]:
+                stopped = "output"
+    if stopped is not None:
+        os.kill(pid, signal.SIGKILL)
+    # A child may close its output and carry on; the deadline still holds
+    while True:
+        reaped, wait_status, _ = os.wait4(pid, 0 if stopped else os.WNOHANG)
+        if reaped:
+            break
+        if time.perf_counter() >= deadline:
+            stopped = "time"
+            os.kill(pid, signal.SIGKILL)
+        else:
+            time.sleep(0.001)
+    wall_time = time.perf_counter() - start
+    selector.close()
+    os.close(out_r)
+    os.close(err_r)
+
+    exit_code = os.waitstatus_to_exitcode(wait_status)
+    frame = {
+        "i": index,
+        "exit_code": exit_code if exit_code >= 0 else 128 - exit_code,
+        "stdout": b"".join(kept[out_r]).decode("utf-8", "replace"),
+        "stderr": b"".join(kept[err_r]).decode("utf-8", "replace"),
+        "wall_time": round(wall_time, 6),
+        "timed_out": stopped == "time",
+    }
+    if stopped == "output":
+        frame.update(limit="output", output_bytes=sizes[out_r] + sizes[err_r])
+    sys.stdout.write("\x1e" + json.dumps(frame) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    payload = json.loads(sys.stdin.read())
+    path = sys.argv[1]
+    stop_file = sys.argv[2] if len(sys.argv) > 2 else None
+    with open(path, "rb") as f:
+        source = f.read()
+    try:
+        program = compile(source, path, "exec")
+    except SyntaxError as e:
+        program = "".join(traceback.format_exception_only(type(e), e))
+    # Objects alive now are shared with every child; keep the collector
+    # from touching (and so copying) their pages
+    gc.collect()
+    gc.freeze()
+    for index, name in enumerate(payload["stdin_files"]):
+        if stop_file and os.path.exists(stop_file):
+            break
+        run_case(index, path, program, os.path.join(os.path.dirname(path), name), payload)
+
+
+main()
+'''
+
+
+def build_fork_server_input(stdin_files, timeout_ms, memory_kb, output_limit, stderr_limit):
+    # Stdin payload for PYTHON_FORK_SERVER: one case per staged stdin file
+    # (named relative to the program's directory), all run under the same
+    # limits (timeout_ms is wall clock per case).
+    return json.dumps({
+        "stdin_files": stdin_files,
+        "timeout_ms": timeout_ms,
+        "memory_kb": memory_kb,
+        "output_limit": output_limit,
+        "stderr_limit": stderr_limit,
+    })
+
+
 # -- Public API ----------------------------------------------------------------
 
 def generate_starter_code(function_name, function_params, return_type, language):
@@ -45,6 +1367,12 @@ def generate_starter_code(function_name, function_params, return_type, language)
         return _python_starter(function_name, function_params, return_type)
     elif language == "javascript":
         return _js_starter(function_name, function_params, return_type)
+    elif language == "cpp":
+        return _cpp_starter(function_name, function_params, return_type)
+    elif language == "java":
+        return _java_starter(function_name, function_params, return_type)
+    elif language == "go":
+        return _go_starter(function_name, function_params, return_type)
     return None
 
 
@@ -60,8 +1388,69 @@ def generate_all_starter_code(function_name, function_params, return_type):
 
 def wrap_code(user_code, function_name, language):
     # Wrap user's function code with a JSON I/O harness for execution.
+    # Compiled languages only have the batch harness (wrap_code_batch).
     if language == "python":
         return _python_wrap(user_code, function_name)
     elif language == "javascript":
         return _js_wrap(user_code, function_name)
     raise ValueError(f"Harness wrapping not supported for {language}")
+
+
+def wrap_code_batch(user_code, function_name, language):
+    # Wrap user's function code with the batch harness: one process runs
+    # every test case and emits one framed result per case.
+    if language == "python":
+        return _python_batch_wrap(user_code, function_name)
+    elif language == "javascript":
+        return _js_batch_wrap(user_code, function_name)
+    elif language == "cpp":
+        return _cpp_batch_wrap(user_code, function_name)
+    elif language == "java":
+        return _java_batch_wrap(user_code, function_name)
+    elif language == "go":
+        return _go_batch_wrap(user_code, function_name)
+    raise ValueError(f"Harness wrapping not supported for {language}")
+
+
+def build_batch_input(test_cases, time_limit_ms=None, stop_on_failure=False, output_limit=None):
+    # Stdin payload for the batch harness. Inputs stay raw strings so a
+    # malformed one only fails its own case.
+    payload = {"inputs": [tc["input"] for tc in test_cases]}
+    if time_limit_ms:
+        payload["time_limit_ms"] = time_limit_ms
+    if output_limit:
+        payload["output_limit"] = output_limit
+    if stop_on_failure:
+        payload["stop_on_failure"] = True
+    return json.dumps(payload)
+
+
+def parse_batch_frames(stdout):
+    # Extract framed per-case results from batch harness stdout.
+    # Returns {case_index: frame}; cases that never reported are absent.
+    frames = {}
+    for line in (stdout or "").split("\n"):
+        if not line.startswith(BATCH_FRAME_MARKER):
+            continue
+        try:
+            frame = json.loads(line[len(BATCH_FRAME_MARKER):])
+        except json.JSONDecodeError:
+            continue
+        frames[frame.get("i")] = frame
+    return frames
+
+
+def parse_metrics(stderr):
+    # Split the measurement line written by a single-case wrapper off stderr.
+    # Returns (metrics or None, remaining stderr).
+    if not stderr:
+        return None, stderr
+    lines = stderr.rstrip("\n").split("\n")
+    if not lines[-1].startswith(METRICS_MARKER):
+        return None, stderr
+    try:
+        metrics = json.loads(lines[-1][len(METRICS_MARKER):])
+    except json.JSONDecodeError:
+        return None, stderr
+    remaining = "\n".join(lines[:-1])
+    return metrics, (remaining + "\n" if remaining else "")
@@ -0,0 +1,252 @@
+"""
+Seeded test input generators.
+A test case can store a small generator spec (test_cases.input_generator)
+instead of a large literal input. The input is expanded inside the sandbox
+right before the run: this file is uploaded there and run as a script (see
+e2b_service._generate_inputs), so a megabyte-sized stress input never goes
+from Postgres through the judge to the sandbox. A spec always expands to the
+same input. The script only uses the standard library.
+
+Spec:
+    {"seed": 42, "format": "json", "args": [<value>, ...]}
+
+"format" is "json" (default), a JSON array of the arguments as function-
+based challenges take them, or "lines" for stdin programs: one argument per
+line, array elements space-separated and one line per row of a nested array.
+
+Values:
+    {"type": "int", "min": -10, "max": 10}
+    {"type": "float", "min": 0, "max": 1, "digits": 6}
+    {"type": "bool"}
+    {"type": "string", "length": 10, "alphabet": "abc"}
+    {"type": "array", "length": 1000000, "of": <value>, "sorted": false, "unique": false}
+    {"type": "permutation", "length": 100, "start": 0}
+    {"type": "const", "value": <any JSON>}
+
+A "length" may be a number or [min, max] for a random length. "unique"
+arrays must be of ints whose range holds enough distinct values.
+"""
+
+import json
+import os
+import random
+import string
+import sys
+
+
+# Most scalar values (array elements, string characters) one spec may produce
+MAX_VALUES = int(os.environ.get("INPUT_GENERATOR_MAX_VALUES", "10000000"))
+# Size limit of a "const" value, serialized
+MAX_CONST_BYTES = 64 * 1024
+MAX_DEPTH = 4
+
+FORMATS = ("json", "lines")
+DEFAULT_ALPHABET = string.ascii_lowercase
+
+
+class InvalidGenerator(ValueError):
+    pass
+
+
+def validate(spec):
+    # Error message if spec is not a usable generator spec, else None.
+    try:
+        _check_spec(spec)
+    except InvalidGenerator as error:
+        return str(error)
+    return None
+
+
+def generate(spec):
+    # The input text spec expands to.
+    rng = random.Random(spec.get("seed", 0))
+    values = [_generate(rng, value) for value in spec["args"]]
+    if spec.get("format", "json") == "lines":
+        return "".join(_lines(value) + "\n" for value in values)
+    return json.dumps(values, separators=(",", ":"))
+
+
+def describe(spec):
+    # Short human-readable stand-in for the generated input, e.g.
+    # "Generated (seed 42): int[1000000], int".
+    args = ", ".join(_describe(value) for value in spec.get("args", []))
+    return f"Generated (seed {spec.get('seed', 0)}): {args}"
+
+
+# -- Validation ----------------------------------------------------------------
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_spec(spec):
+    if not isinstance(spec, dict):
+        raise InvalidGenerator("input_generator must be an object")
+    if not _is_int(spec.get("seed", 0)):
+        raise InvalidGenerator("input_generator seed must be an integer")
+    if spec.get("format", "json") not in FORMATS:
+        raise InvalidGenerator(f"input_generator format must be one of: {', '.join(FORMATS)}")
+    args = spec.get("args")
+    if not isinstance(args, list):
+        raise InvalidGenerator("input_generator args must be a list of value specs")
+    total = sum(_check_value(value, 1) for value in args)
+    if total > MAX_VALUES:
+        raise InvalidGenerator(
+            f"input_generator produces up to {total} values; the limit is {MAX_VALUES}")
+
+
+def _max_length(length):
+    if _is_int(length) and length >= 0:
+        return length
+    if (isinstance(length, list) and len(length) == 2 and all(_is_int(n) for n in length)
+            and 0 <= length[0] <= length[1]):
+        return length[1]
+    raise InvalidGenerator("length must be a non-negative integer or [min, max]")
+
+
+def _check_value(value, depth):
+    # Validate one value spec; returns the most scalar values it can produce.
+    if depth > MAX_DEPTH:
+        raise InvalidGenerator(f"input_generator values nest at most {MAX_DEPTH} deep")
+    if not isinstance(value, dict):
+        raise InvalidGenerator("each input_generator value must be an object with a type")
+    kind = value.get("type")
+    if kind in ("int", "float"):
+        check = _is_int if kind == "int" else _is_number
+        low, high = value.get("min"), value.get("max")
+        if not (check(low) and check(high)) or low > high:
+            raise InvalidGenerator(f"{kind} values need a {kind} min and max with min <= max")
+        if kind == "float" and not (_is_int(value.get("digits", 6)) and 0 <= value.get("digits", 6) <= 15):
+            raise InvalidGenerator("float digits must be between 0 and 15")
+        return 1
+    if kind == "bool":
+        return 1
+    if kind == "string":
+        alphabet = value.get("alphabet", DEFAULT_ALPHABET)
+        if not isinstance(alphabet, str) or not alphabet:
+            raise InvalidGenerator("string alphabet must be a non-empty string")
+        return max(1, _max_length(value.get("length")))
+    if kind == "permutation":
+        if not _is_int(value.get("start", 0)):
+            raise InvalidGenerator("permutation start must be an integer")
+        return max(1, _max_length(value.get("length")))
+    if kind == "array":
+        length = _max_length(value.get("length"))
+        of = value.get("of")
+        per_element = _check_value(of, depth + 1)
+        if value.get("unique"):
+            if of.get("type") != "int":
+                raise InvalidGenerator("unique arrays must be arrays of ints")
+            if of["max"] - of["min"] + 1 < length:
+                raise InvalidGenerator("unique array is longer than its int range")
+        if value.get("sorted") and of.get("type") not in ("int", "float", "string", "bool"):
+            raise InvalidGenerator("only arrays of ints, floats, strings or bools can be sorted")
+        return max(1, length * per_element)
+    if kind == "const":
+        try:
+            size = len(json.dumps(value.get("value")))
+        except (TypeError, ValueError):
+            raise InvalidGenerator("const value must be JSON")
+        if size > MAX_CONST_BYTES:
+            raise InvalidGenerator(f"const values are limited to {MAX_CONST_BYTES} bytes")
+        return 1
+    raise InvalidGenerator(
+        "value type must be one of: int, float, bool, string, array, permutation, const")
+
+
+# -- Generation ----------------------------------------------------------------
+
+def _length(rng, length):
+    return rng.randint(length[0], length[1]) if isinstance(length, list) else length
+
+
+def _generate(rng, value):
+    kind = value["type"]
+    if kind == "int":
+        return rng.randint(value["min"], value["max"])
+    if kind == "float":
+        return round(rng.uniform(value["min"], value["max"]), value.get("digits", 6))
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "string":
+        return "".join(rng.choices(value.get("alphabet", DEFAULT_ALPHABET), k=_length(rng, value["length"])))
+    if kind == "permutation":
+        start = value.get("start", 0)
+        items = list(range(start, start + _length(rng, value["length"])))
+        rng.shuffle(items)
+        return items
+    if kind == "array":
+        length = _length(rng, value["length"])
+        of = value["of"]
+        if value.get("unique"):
+            items = rng.sample(range(of["min"], of["max"] + 1), length)
+        elif of["type"] == "int":
+            # One call for the whole array; far faster than randint per element
+            items = rng.choices(range(of["min"], of["max"] + 1), k=length)
+        else:
+            items = [_generate(rng, of) for _ in range(length)]
+        if value.get("sorted"):
+            items.sort()
+        return items
+    return value.get("value")
+
+
+def _token(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _lines(value):
+    if not isinstance(value, list):
+        return _token(value)
+    if value and all(isinstance(row, list) for row in value):
+        return "\n".join(" ".join(_token(item) for item in row) for row in value)
+    return " ".join(_token(item) for item in value)
+
+
+def _describe(value):
+    kind = value.get("type")
+    length = value.get("length")
+    if isinstance(length, list):
+        length = f"{length[0]}..{length[1]}"
+    if kind == "array":
+        return f"{_describe(value.get('of') or {})}[{length}]"
+    if kind in ("string", "permutation"):
+        return f"{kind}({length})"
+    if kind == "const":
+        text = json.dumps(value.get("value"))
+        return text if len(text) <= 40 else text[:37] + "..."
+    return kind or "?"
+
+
+# -- Sandbox entry point -------------------------------------------------------
+
+def _main():
+    # python3 input_generators.py <jobs file>. Jobs are
+    # {"spec", "path"} (write the input to a file) or
+    # {"spec", "payload", "index"} (fill inputs[index] of a batch harness
+    # payload); files are named relative to this script's directory.
+    base = os.path.dirname(os.path.abspath(__file__))
+    with open(sys.argv[1]) as f:
+        jobs = json.load(f)
+    payloads = {}
+    for job in jobs:
+        text = generate(job["spec"])
+        if "path" in job:
+            with open(os.path.join(base, job["path"]), "w") as f:
+                f.write(text)
+            continue
+        if job["payload"] not in payloads:
+            with open(os.path.join(base, job["payload"])) as f:
+                payloads[job["payload"]] = json.load(f)
+        payloads[job["payload"]]["inputs"][job["index"]] = text
+    for name, payload in payloads.items():
+        with open(os.path.join(base, name), "w") as f:
+            json.dump(payload, f)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,541 @@
+"""
+Submission judging.
+Shared by the synchronous submit endpoint and the asynchronous job path:
+prepares the code for the sandbox, runs it against the challenge's test
+cases and records the verdict on the submission row.
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psycopg2.extras
+
+import admission
+import blob_store
+import comparators
+import input_generators
+import repository
+from db_helpers import get_db_connection
+from e2b_service import MEMORY_LIMIT_EXCEEDED, TIME_LIMIT_EXCEEDED, format_seconds, run_test_cases
+from harness import wrap_code, wrap_code_batch, COMPILED_HARNESS_LANGUAGES, SUPPORTED_HARNESS_LANGUAGES
+from result_cache import make_key, result_cache
+
+
+LANGUAGE_NAMES = {"python": "Python", "javascript": "JavaScript", "cpp": "C++", "java": "Java", "go": "Go"}
+
+# Run all test cases of a function-based challenge in one process
+BATCH_HARNESS = os.environ.get("HARNESS_BATCH_MODE", "true").lower() == "true"
+
+# Async judging: worker threads per web process, and how many submissions
+# may be queued or running in this process before new ones are refused.
+ASYNC_WORKERS = int(os.environ.get("JUDGE_ASYNC_WORKERS", "2"))
+ASYNC_QUEUE_SIZE = int(os.environ.get("JUDGE_ASYNC_QUEUE_SIZE", "20"))
+
+# Where async submissions are judged: "thread" (inside the web process) or
+# "worker" (judge_worker.py processes claiming from the submissions table).
+QUEUE_BACKEND = os.environ.get("JUDGE_QUEUE_BACKEND", "thread")
+NOTIFY_CHANNEL = "judge_queue"
+LEASE_SECONDS = int(os.environ.get("JUDGE_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.environ.get("JUDGE_MAX_ATTEMPTS", "3"))
+# Thread backend: how often each web process claims submissions a restarted
+# web process left behind (queued, or running under an expired lease)
+RECOVERY_POLL_SECONDS = int(os.environ.get("JUDGE_RECOVERY_POLL_SECONDS", "30"))
+
+# Results with these statuses are never cached: infrastructure errors say
+# nothing about the code, and time and memory limits depend on how busy the
+# sandbox was, so a re-run may pass.
+UNCACHEABLE_STATUSES = {"Error", TIME_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED}
+
+# Stored per-case output and error text is cut to this many characters
+RESULT_PREVIEW_CHARS = 4000
+# Reference outputs larger than this are stored as a digest
+EXPECTED_OUTPUT_INLINE_BYTES = 64 * 1024
+
+
+class UnsupportedLanguage(Exception):
+    pass
+
+
+class ReferenceSolutionFailed(Exception):
+    pass
+
+
+def prepare_code(challenge, code, language):
+    # Wrap code with the harness for function-based challenges.
+    # Returns (code_to_execute, batch). Compiled languages only have the
+    # batch harness: one binary runs the whole suite.
+    if not challenge.get("function_name"):
+        return code, False
+    if language not in SUPPORTED_HARNESS_LANGUAGES:
+        raise UnsupportedLanguage(
+            f"Function-based execution is not yet supported for {language}. "
+            f"Please use {_language_names()}.")
+    if BATCH_HARNESS or language in COMPILED_HARNESS_LANGUAGES:
+        return wrap_code_batch(code, challenge["function_name"], language), True
+    return wrap_code(code, challenge["function_name"], language), False
+
+
+def _language_names():
+    # "Python, JavaScript, C++ or Go"
+    names = [name for language, name in LANGUAGE_NAMES.items() if language in SUPPORTED_HARNESS_LANGUAGES]
+    return ", ".join(names[:-1]) + " or " + names[-1]
+
+
+def fetch_test_cases(cursor, challenge_id):
+    # A generated case's input is expanded in the sandbox; until then its
+    # "input" is a short description of the generator. Payloads moved to the
+    # blob store are only previews here (see blob_store.resolve).
+    test_cases = repository.get_test_cases(cursor, challenge_id)
+    for tc in test_cases:
+        if tc["input_generator"]:
+            tc["input"] = input_generators.describe(tc["input_generator"])
+    return test_cases
+
+
+def reference_expected_output(challenge, code, language, test_case):
+    # Expected output for test_case, produced by running a reference
+    # solution on it. Returns (expected_output, expected_output_sha256): the
+    # output itself if it is small, else "" and its digest. Raises
+    # ReferenceSolutionFailed (or UnsupportedLanguage).
+    code_to_execute, batch = prepare_code(challenge, code, language)
+    test_case = dict(test_case, id=None, expected_output="", expected_output_sha256=None, is_hidden=True)
+    execution_result = run_test_cases(
+        code_to_execute, language, [test_case], batch=batch,
+        time_limit_ms=challenge.get("time_limit_ms"), memory_limit_mb=challenge.get("memory_limit_mb"))
+    test_result = execution_result["test_results"][0]
+    # Only the run status matters; the output is compared against nothing
+    if test_result["status"] != "Accepted" or test_result["actual_output"] is None:
+        raise ReferenceSolutionFailed(
+            f"Reference solution failed: {test_result['status']}"
+            + (f": {test_result['error']}" if test_result.get("error") else ""))
+    output = test_result["actual_output"]
+    if len(output.encode()) <= EXPECTED_OUTPUT_INLINE_BYTES:
+        return output, None
+    if (challenge.get("comparison_mode") or comparators.AUTO) in (comparators.FLOAT, comparators.UNORDERED):
+        raise ReferenceSolutionFailed(
+            f"The reference output is over {EXPECTED_OUTPUT_INLINE_BYTES} bytes; outputs this large are "
+            f"stored as a digest, which the '{challenge['comparison_mode']}' comparison mode can't use")
+    return "", comparators.digest(output)
+
+
+def run_submission(challenge, code, language, test_cases, stop_on_first_failure=None,
+                   on_result=None):
+    # Judge code against the test cases. Returns the run_test_cases result,
+    # served from the result cache when this exact code was judged before
+    # against the same test suite (marked with "cached": True).
+    # stop_on_first_failure=None uses the challenge's setting.
+    # on_result(index, result) is called once per test case: as it finishes
+    # where the sandbox allows, otherwise when the run returns.
+    code_to_execute, batch = prepare_code(challenge, code, language)
+    reported = set()
+
+    def report(index, test_result):
+        _with_previews(test_result, test_cases[index])
+        if on_result is not None and index not in reported:
+            reported.add(index)
+            on_result(index, test_result)
+
+    time_limit_ms = challenge.get("time_limit_ms")
+    memory_limit_mb = challenge.get("memory_limit_mb")
+    comparison_mode = challenge.get("comparison_mode") or comparators.AUTO
+    float_tolerance = challenge.get("float_tolerance")
+    if stop_on_first_failure is None:
+        stop_on_first_failure = bool(challenge.get("stop_on_first_failure"))
+    cache_key = make_key(code, language, challenge.get("function_name"), test_cases, batch=batch,
+                         time_limit_ms=time_limit_ms, memory_limit_mb=memory_limit_mb,
+                         stop_on_first_failure=stop_on_first_failure,
+                         comparison_mode=comparison_mode, float_tolerance=float_tolerance)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        cached["cached"] = True
+        execution_result = cached
+    else:
+        execution_result = run_test_cases(code_to_execute, language, blob_store.resolve(test_cases),
+                                          batch=batch, time_limit_ms=time_limit_ms,
+                                          memory_limit_mb=memory_limit_mb,
+                                          stop_on_first_failure=stop_on_first_failure,
+                                          comparison_mode=comparison_mode, float_tolerance=float_tolerance,
+                                          on_result=report)
+        for index, test_result in enumerate(execution_result["test_results"]):
+            _with_previews(test_result, test_cases[index])
+        if not any(tr["status"] in UNCACHEABLE_STATUSES for tr in execution_result["test_results"]):
+            result_cache.put(cache_key, challenge["id"], execution_result)
+    for index, test_result in enumerate(execution_result["test_results"]):
+        report(index, test_result)
+    return execution_result
+
+
+def _with_previews(test_result, test_case):
+    # Results of blob-stored test cases show the stored previews, not the
+    # full payloads.
+    if test_case.get("input_blob"):
+        test_result["input"] = test_case["input"]
+    if test_case.get("expected_output_blob"):
+        test_result["expected_output"] = test_case["expected_output"]
+    return test_result
+
+
+def save_results(cursor, submission_id, test_results):
+    # Persist per-case results with one batched INSERT. Outputs and errors
+    # are truncated; the submission can be re-viewed without re-running it.
+    cursor.execute("DELETE FROM submission_results WHERE submission_id = %s", (submission_id,))
+    if not test_results:
+        return
+    rows = [(
+        submission_id,
+        position,
+        tr["test_case_id"],
+        tr["is_hidden"],
+        tr["passed"],
+        tr["status"],
+        float(tr["time"]) if tr.get("time") is not None else None,
+        float(tr["cpu_time"]) if tr.get("cpu_time") is not None else None,
+        tr.get("memory"),
+        _truncate(tr.get("actual_output")),
+        _truncate(tr.get("error")),
+    ) for position, tr in enumerate(test_results)]
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO submission_results
+            (submission_id, position, test_case_id, is_hidden, passed, status,
+             time_seconds, cpu_time_seconds, memory_kb, output, error)
+        VALUES %s
+        """, rows)
+
+
+def load_results(cursor, submission_id):
+    # Stored per-case results in run_test_cases' test_results shape.
+    # Input and expected output come from the test case, if it still exists.
+    cursor.execute("""
+        SELECT r.test_case_id,
+            tc.input,
+            tc.expected_output,
+            r.output AS actual_output,
+            r.passed,
+            COALESCE(tc.is_hidden, r.is_hidden) AS is_hidden,
+            r.status,
+            r.time_seconds,
+            r.cpu_time_seconds,
+            r.memory_kb AS memory,
+            r.error
+        FROM submission_results r
+        LEFT JOIN test_cases tc ON r.test_case_id = tc.id
+        WHERE r.submission_id = %s
+        ORDER BY r.position
+        """, (submission_id,))
+    test_results = []
+    for row in cursor.fetchall():
+        tr = dict(row)
+        tr["time"] = format_seconds(tr.pop("time_seconds"))
+        tr["cpu_time"] = format_seconds(tr.pop("cpu_time_seconds"))
+        test_results.append(tr)
+    return test_results
+
+
+def _truncate(text):
+    if text is None or len(text) <= RESULT_PREVIEW_CHARS:
+        return text
+    return text[:RESULT_PREVIEW_CHARS]
+
+
+def sanitize_test_results(test_results):
+    # Hidden test cases don't reveal input/expected_output/actual_output.
+    sanitized_results = []
+    for tr in test_results:
+        if tr["is_hidden"]:
+            sanitized_results.append({
+                "test_case_id": tr["test_case_id"],
+                "passed": tr["passed"],
+                "is_hidden": True,
+                "status": tr["status"],
+                "time": tr["time"],
+                "memory": tr.get("memory"),
+            })
+        else:
+            sanitized_results.append(tr)
+    return sanitized_results
+
+
+# -- Async judging -------------------------------------------------------------
+# Queued submissions are claimed with a lease: status 'running' plus
+# lease_expires_at. Whoever holds the lease (a web process thread or a
+# judge_worker.py process) judges it; a lease that runs out because its
+# holder crashed makes the row claimable again.
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(ASYNC_QUEUE_SIZE)
+_recovery_pid = None
+
+
+def _after_fork():
+    # A forked child (gunicorn --preload) may inherit the lock held by a
+    # parent thread
+    global _executor_lock
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=ASYNC_WORKERS, thread_name_prefix="judge")
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(ASYNC_QUEUE_SIZE)
+        return _executor
+
+
+def uses_worker_queue():
+    return QUEUE_BACKEND == "worker"
+
+
+def reserve_slot():
+    # Reserve room for one async submission. False when the queue is full.
+    # With the worker backend the queue lives in Postgres and is unbounded here.
+    if uses_worker_queue():
+        return True
+    _get_executor()
+    start_recovery()
+    return _slots.acquire(blocking=False)
+
+
+def release_slot():
+    if not uses_worker_queue():
+        _slots.release()
+
+
+def notify_queued(cursor, submission_id):
+    # Wake judge workers blocked in LISTEN. Delivered when the caller commits.
+    cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, str(submission_id)))
+
+
+def enqueue(submission_id):
+    # Judge a committed, queued submission. The caller must hold a slot from
+    # reserve_slot(); it is released when the job finishes.
+    if uses_worker_queue():
+        return
+    _get_executor().submit(_run_queued, submission_id)
+
+
+def init_app(app):
+    # With the thread backend, pick up what a previous run of the web
+    # process left queued or running, every RECOVERY_POLL_SECONDS. The
+    # thread starts with a process's first request rather than on import,
+    # so a preloading gunicorn master never runs it; each worker does.
+    app.before_request(start_recovery)
+
+
+def start_recovery():
+    # Start this process's recovery thread (once per process).
+    global _recovery_pid
+    if uses_worker_queue() or RECOVERY_POLL_SECONDS <= 0:
+        return
+    with _executor_lock:
+        if _recovery_pid == os.getpid():
+            return
+        _recovery_pid = os.getpid()
+    threading.Thread(target=_recovery_loop, name="judge-recovery", daemon=True).start()
+
+
+def _recovery_loop():
+    while True:
+        try:
+            recover_submissions()
+        except Exception:
+            # Transient DB trouble; try again next round
+            pass
+        time.sleep(RECOVERY_POLL_SECONDS)
+
+
+def recover_submissions():
+    # Claim claimable submissions into this process's async queue while it
+    # has free slots. Returns how many were claimed.
+    worker_id = _web_worker_id()
+    claimed = 0
+    while reserve_slot():
+        try:
+            connection = get_db_connection()
+            try:
+                submission = claim_submission(connection, worker_id)
+            finally:
+                connection.close()
+        except Exception:
+            release_slot()
+            raise
+        if submission is None:
+            release_slot()
+            return claimed
+        _get_executor().submit(_judge_with_slot, submission, worker_id)
+        claimed += 1
+    return claimed
+
+
+def _web_worker_id():
+    return f"web-{socket.gethostname()}-{os.getpid()}"
+
+
+def _run_queued(submission_id):
+    worker_id = _web_worker_id()
+    try:
+        connection = get_db_connection()
+        try:
+            submission = claim_submission(connection, worker_id, submission_id=submission_id)
+        finally:
+            connection.close()
+        if submission is not None:
+            judge_claimed(submission, worker_id)
+    finally:
+        release_slot()
+
+
+def _judge_with_slot(submission, worker_id):
+    try:
+        judge_claimed(submission, worker_id)
+    finally:
+        release_slot()
+
+
+def claim_submission(connection, worker_id, submission_id=None):
+    # Lease the oldest claimable submission (or the given one) to worker_id.
+    # Claimable: queued, or running with an expired lease.
+    # Returns the claimed row, or None if there was nothing to claim.
+    cursor = connection.cursor(
+        cursor_factory=psycopg2.extras.RealDictCursor)
+    id_filter = "AND id = %s" if submission_id is not None else ""
+    params = [LEASE_SECONDS, worker_id]
+    if submission_id is not None:
+        params.append(submission_id)
+    cursor.execute(f"""
+        UPDATE submissions
+        SET status = 'running',
+            lease_expires_at = timezone('utc', now()) + make_interval(secs => %s),
+            worker_id = %s,
+            attempts = attempts + 1
+        WHERE id = (
+            SELECT id FROM submissions
+            WHERE (status = 'queued'
+                   OR (status = 'running' AND lease_expires_at < timezone('utc', now())))
+                  {id_filter}
+            ORDER BY submitted_at, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, challenge_id, code, language, attempts, stop_on_first_failure
+        """, params)
+    submission = cursor.fetchone()
+    connection.commit()
+    return submission
+
+
+def extend_lease(connection, submission_id, worker_id):
+    # Push the lease forward. False if the lease was lost to another worker.
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE submissions
+        SET lease_expires_at = timezone('utc', now()) + make_interval(secs => %s)
+        WHERE id = %s AND worker_id = %s AND status = 'running'
+        """, (LEASE_SECONDS, submission_id, worker_id))
+    connection.commit()
+    return cursor.rowcount == 1
+
+
+def judge_claimed(submission, worker_id):
+    # Judge a submission leased by claim_submission and store its verdict.
+    # The lease is kept alive while the sandbox runs.
+    heartbeat = _LeaseHeartbeat(submission["id"], worker_id)
+    heartbeat.start()
+    try:
+        if submission["attempts"] > MAX_ATTEMPTS:
+            _store_verdict(submission["id"], worker_id, "error", None,
+                           f"Gave up after {MAX_ATTEMPTS} judging attempts")
+            return
+        try:
+            status, test_results, judge_error, compile_time = _judge(submission)
+        except Exception as error:
+            status, test_results, judge_error, compile_time = "error", None, str(error), None
+        _store_verdict(submission["id"], worker_id, status, test_results, judge_error, compile_time)
+    finally:
+        heartbeat.stop()
+
+
+def _judge(submission):
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor(
+            cursor_factory=psycopg2.extras.RealDictCursor)
+        challenge = repository.get_judge_challenge(cursor, submission["challenge_id"])
+        test_cases = fetch_test_cases(cursor, submission["challenge_id"])
+    finally:
+        connection.close()
+
+    if challenge is None or not test_cases:
+        return "submitted", None, None, None
+    try:
+        # Already accepted into the queue: wait for a slot however long it
+        # takes, in fair-share order with the synchronous submissions
+        with admission.admit(submission.get("user_id"), timeout=None):
+            execution_result = run_submission(
+                challenge, submission["code"], submission["language"], test_cases,
+                stop_on_first_failure=submission.get("stop_on_first_failure"))
+    except UnsupportedLanguage as error:
+        return "error", None, str(error), None
+    return (execution_result["overall_status"], execution_result["test_results"], None,
+            execution_result.get("compile_time"))
+
+
+def _store_verdict(submission_id, worker_id, status, test_results, judge_error, compile_time=None):
+    # Only the current lease holder may write, so a worker that lost its
+    # lease can't overwrite the verdict of the worker that took over.
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE submissions
+            SET status = %s, judge_error = %s, judged_at = %s, lease_expires_at = NULL,
+                compile_time_seconds = %s
+            WHERE id = %s AND worker_id = %s AND status = 'running'
+            """, (status, judge_error, datetime.utcnow(),
+                  float(compile_time) if compile_time is not None else None, submission_id, worker_id))
+        if cursor.rowcount == 1:
+            save_results(cursor, submission_id, test_results)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class _LeaseHeartbeat:
+    # Extends a submission's lease every LEASE_SECONDS / 3 until stopped.
+
+    def __init__(self, submission_id, worker_id):
+        self.submission_id = submission_id
+        self.worker_id = worker_id
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(LEASE_SECONDS / 3):
+            try:
+                connection = get_db_connection()
+                try:
+                    if not extend_lease(connection, self.submission_id, self.worker_id):
+                        return
+                finally:
+                    connection.close()
+            except Exception:
+                # Transient DB trouble; the lease has slack for a missed beat
+                pass
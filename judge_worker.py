@@ -0,0 +1,126 @@
+"""
+Judge worker.
+Runs as its own process type (see Procfile) and judges queued submissions
+claimed from the submissions table, so judging capacity scales separately
+from the web dynos. Set JUDGE_QUEUE_BACKEND=worker on the web app so it
+leaves queued submissions to these workers.
+
+    python judge_worker.py
+"""
+
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+
+import db_helpers
+from db_helpers import get_db_connection
+import judge
+
+
+# Submissions judged at once by this process
+CONCURRENCY = int(os.environ.get("JUDGE_WORKER_CONCURRENCY", "2"))
+# Fallback wake-up when no NOTIFY arrives, e.g. to pick up expired leases
+IDLE_POLL_SECONDS = int(os.environ.get("JUDGE_WORKER_POLL_SECONDS", "15"))
+
+logger = logging.getLogger("judge_worker")
+
+
+class JudgeWorker:
+
+    def __init__(self, concurrency=CONCURRENCY):
+        self.worker_id = f"worker-{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self._wakeup = threading.Condition()
+        self._generation = 0
+        self._stopping = threading.Event()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._judge_loop, name=f"judge-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info("%s judging with %d threads", self.worker_id, self.concurrency)
+        try:
+            self._listen()
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        logger.info("%s stopped", self.worker_id)
+
+    def stop(self, *_):
+        self._stopping.set()
+        self._wake()
+
+    def _wake(self):
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def _listen(self):
+        # Block on LISTEN and wake the judge threads on every NOTIFY.
+        # Falls back to a wake-up every IDLE_POLL_SECONDS. Uses a connection
+        # of its own: it is held for the worker's lifetime.
+        connection = db_helpers.connect()
+        try:
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {judge.NOTIFY_CHANNEL}")
+            last_wake = time.monotonic()
+            while not self._stopping.is_set():
+                # Short select timeout so a SIGTERM is noticed promptly
+                readable, _, _ = select.select([connection], [], [], 1)
+                if readable:
+                    connection.poll()
+                    connection.notifies.clear()
+                if readable or time.monotonic() - last_wake >= IDLE_POLL_SECONDS:
+                    last_wake = time.monotonic()
+                    self._wake()
+        finally:
+            connection.close()
+
+    def _judge_loop(self):
+        # Claim and judge until the queue is empty, then sleep until woken.
+        while not self._stopping.is_set():
+            with self._wakeup:
+                generation = self._generation
+            try:
+                submission = self._claim()
+            except Exception:
+                logger.exception("Claiming a submission failed")
+                submission = None
+            if submission is not None:
+                logger.info("Judging submission %s (attempt %s)",
+                            submission["id"], submission["attempts"])
+                judge.judge_claimed(submission, self.worker_id)
+                continue
+            with self._wakeup:
+                # Sleep unless a wake-up arrived while we were claiming
+                if self._generation == generation and not self._stopping.is_set():
+                    self._wakeup.wait(IDLE_POLL_SECONDS)
+
+    def _claim(self):
+        connection = get_db_connection()
+        try:
+            return judge.claim_submission(connection, self.worker_id)
+        finally:
+            connection.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    worker = JudgeWorker()
+    # Heroku sends SIGTERM on restart; stop claiming and let jobs finish.
+    # Anything cut off is re-queued when its lease expires.
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+-- Async judging: submissions can be 'queued' or 'running' before a verdict
+-- (per-case results are stored in submission_results, see
+-- add_submission_results.sql)
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS judge_error TEXT;
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS judged_at TIMESTAMP;
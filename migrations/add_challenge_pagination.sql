@@ -0,0 +1,23 @@
+-- Keyset pagination of GET /challenges: a stored sort key for the
+-- difficulty order, and composite indexes matching each sort order alone and
+-- behind each filter column.
+UPDATE coding_challenges SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE coding_challenges ALTER COLUMN created_at SET NOT NULL;
+
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS difficulty_rank SMALLINT GENERATED ALWAYS AS (
+    CASE difficulty WHEN 'easy' THEN 1 WHEN 'medium' THEN 2 WHEN 'hard' THEN 3 ELSE 4 END
+) STORED;
+
+-- Replaced by the composite indexes below
+DROP INDEX IF EXISTS idx_challenges_difficulty;
+DROP INDEX IF EXISTS idx_challenges_data_structure_type;
+
+CREATE INDEX IF NOT EXISTS idx_challenges_created ON coding_challenges(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_challenges_difficulty_rank ON coding_challenges(difficulty_rank, id);
+CREATE INDEX IF NOT EXISTS idx_challenges_difficulty ON coding_challenges(difficulty, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_challenges_data_structure_type
+    ON coding_challenges(data_structure_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_challenges_data_structure_type_rank
+    ON coding_challenges(data_structure_type, difficulty_rank, id);
+CREATE INDEX IF NOT EXISTS idx_challenges_curated ON coding_challenges(is_curated, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_challenges_curated_rank ON coding_challenges(is_curated, difficulty_rank, id);
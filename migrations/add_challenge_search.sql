@@ -0,0 +1,12 @@
+-- Search for GET /challenges?q=: a generated tsvector over title (weight A)
+-- and description (weight B) with a GIN index, and a trigram index on the
+-- title for typo-tolerant matching.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_challenges_search ON coding_challenges USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_challenges_title_trgm ON coding_challenges USING GIN (title gin_trgm_ops);
@@ -0,0 +1,4 @@
+-- How the judge compares a test case's actual output with the expected one
+-- (see comparators.py); float_tolerance applies to the 'float' mode
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS comparison_mode VARCHAR(20) DEFAULT 'auto';
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS float_tolerance DOUBLE PRECISION;
@@ -0,0 +1,2 @@
+-- Time spent compiling a submission (compiled languages), apart from run time
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS compile_time_seconds REAL;
@@ -0,0 +1,5 @@
+-- Generated test inputs: a seeded generator spec expanded in the sandbox
+-- (input then only holds a description), and outputs too large to store
+-- checked against their SHA-256 digest instead (expected_output is '')
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS input_generator JSONB;
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS expected_output_sha256 VARCHAR(64);
@@ -0,0 +1,10 @@
+-- Judge work queue: queued submissions are leased to a judge (web thread or
+-- judge_worker.py); an expired lease means the holder died and the row is
+-- claimable again
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS worker_id VARCHAR(255);
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_submissions_claimable
+    ON submissions(submitted_at, id)
+    WHERE status IN ('queued', 'running');
@@ -0,0 +1,4 @@
+-- Per-challenge limits for each test case run by the judge
+-- NULL means the judge defaults (JUDGE_TIME_LIMIT_MS / JUDGE_MEMORY_LIMIT_MB)
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS time_limit_ms INTEGER;
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS memory_limit_mb INTEGER;
@@ -0,0 +1,2 @@
+-- CPU time of the user's function, as measured inside the sandbox harness
+ALTER TABLE submission_results ADD COLUMN IF NOT EXISTS cpu_time_seconds REAL;
@@ -0,0 +1,4 @@
+-- Fail-fast judging: stop at the first failing test case, skip the rest
+ALTER TABLE coding_challenges ADD COLUMN IF NOT EXISTS stop_on_first_failure BOOLEAN DEFAULT FALSE;
+-- Per-submission override of the challenge setting (NULL = use the challenge's)
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS stop_on_first_failure BOOLEAN;
@@ -0,0 +1,42 @@
+-- Per-test-case results of a submission, written in one batch per judging run
+CREATE TABLE IF NOT EXISTS submission_results (
+    submission_id INTEGER NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    test_case_id INTEGER REFERENCES test_cases(id) ON DELETE SET NULL,
+    is_hidden BOOLEAN NOT NULL DEFAULT FALSE,
+    passed BOOLEAN NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    time_seconds REAL,
+    memory_kb INTEGER,
+    output TEXT,
+    error TEXT,
+    PRIMARY KEY (submission_id, position)
+);
+
+-- Databases that ran an earlier add_async_submissions.sql have a
+-- submissions.test_results JSONB column: move its results into the new
+-- table and drop it. Fresh databases never have the column.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'submissions' AND column_name = 'test_results') THEN
+        INSERT INTO submission_results
+            (submission_id, position, test_case_id, is_hidden, passed, status,
+             time_seconds, output, error)
+        SELECT s.id,
+            t.ordinality - 1,
+            (SELECT tc.id FROM test_cases tc WHERE tc.id = (t.value->>'test_case_id')::int),
+            COALESCE((t.value->>'is_hidden')::boolean, FALSE),
+            COALESCE((t.value->>'passed')::boolean, FALSE),
+            COALESCE(t.value->>'status', 'Error'),
+            (t.value->>'time')::real,
+            LEFT(t.value->>'actual_output', 4000),
+            LEFT(t.value->>'error', 4000)
+        FROM submissions s,
+            jsonb_array_elements(s.test_results) WITH ORDINALITY AS t(value, ordinality)
+        WHERE jsonb_typeof(s.test_results) = 'array'
+        ON CONFLICT DO NOTHING;
+
+        ALTER TABLE submissions DROP COLUMN test_results;
+    END IF;
+END $$;
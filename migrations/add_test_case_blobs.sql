@@ -0,0 +1,22 @@
+-- Large test case payloads move to a compressed, content-addressed blob
+-- table; test_cases keeps the hash, the size and a preview.
+-- Afterwards run `python blob_store.py` to move existing large payloads.
+CREATE TABLE IF NOT EXISTS test_case_blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE test_case_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS input_blob VARCHAR(64) REFERENCES test_case_blobs(sha256);
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS input_size INTEGER;
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS expected_output_blob VARCHAR(64) REFERENCES test_case_blobs(sha256);
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS expected_output_size INTEGER;
+CREATE INDEX IF NOT EXISTS idx_test_cases_input_blob ON test_cases(input_blob) WHERE input_blob IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_test_cases_expected_output_blob ON test_cases(expected_output_blob)
+    WHERE expected_output_blob IS NOT NULL;
+
+UPDATE test_cases
+SET input_size = octet_length(input), expected_output_size = octet_length(expected_output)
+WHERE input_size IS NULL;
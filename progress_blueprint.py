@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request, g
 from db_helpers import get_db_connection
 import psycopg2.extras
 from auth_middleware import token_required
+import repository
 
 progress_blueprint = Blueprint('progress_blueprint', __name__)
 
@@ -15,50 +16,8 @@ def get_stats():
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor
         )
-        cursor.execute("""
-                    SELECT
-                    COUNT(DISTINCT s.challenge_id) AS attempted,
-                    COUNT(DISTINCT CASE
-                            WHEN s.status = 'passed'
-                            THEN s.challenge_id
-                    END) AS solved,
-                    COUNT(*) AS total_submissions
-                    FROM submissions s
-                    WHERE s.user_id = %s
-                    """, (user_id,))
-        overall = cursor.fetchone()
-        cursor.execute("SELECT COUNT(*) as total FROM coding_challenges")
-        total_challenges = cursor.fetchone()["total"]
-
-        cursor.execute("""
-                    SELECT c.difficulty,
-                    COUNT(DISTINCT s.challenge_id) AS attempted,
-                    COUNT(DISTINCT CASE
-                        WHEN s.status = 'passed'
-                        THEN s.challenge_id
-                    END) AS solved
-                    FROM submissions s
-                    JOIN coding_challenges c ON s.challenge_id = c.id
-                    WHERE s.user_id = %s
-                    GROUP BY c.difficulty
-                    """, (user_id,))
-        by_difficulty = cursor.fetchall()
-
-        cursor.execute("""
-                    SELECT
-                    c.data_structure_type,
-                    COUNT(DISTINCT s.challenge_id) AS attempted,
-                    COUNT(DISTINCT CASE
-                        WHEN s.status = 'passed'
-                        THEN s.challenge_id
-                    END) AS solved
-                    FROM submissions s
-                    JOIN coding_challenges c ON s.challenge_id = c.id
-                    WHERE s.user_id = %s
-                        AND c.data_structure_type IS NOT NULL
-                    GROUP BY c.data_structure_type
-                    """, (user_id,))
-        by_data_structure = cursor.fetchall()
+        overall, total_challenges, by_difficulty, by_data_structure = repository.get_progress(
+            cursor, user_id)
 
         connection.close()
 
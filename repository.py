@@ -0,0 +1,318 @@
+"""
+Data access for the hot queries.
+Each statement is written once here and run as a server-side prepared
+statement: PREPAREd on a pooled connection the first time that connection
+runs it, then EXECUTEd, so Postgres parses and plans it once per connection
+rather than once per request. Every statement counts its calls and time
+(stats() is part of /judge/stats). Set DB_PREPARED_STATEMENTS=false where
+session state doesn't survive between transactions (e.g. behind a
+transaction-mode PgBouncer); the same SQL is then sent as plain queries.
+"""
+
+import os
+import re
+import threading
+import time
+
+import psycopg2.errors
+import psycopg2.extensions
+
+
+PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+# The challenge as the challenge endpoints return it: field -> column
+CHALLENGE_FIELDS = {
+    "id": "c.id",
+    "author_id": "c.author",
+    "title": "c.title",
+    "description": "c.description",
+    "difficulty": "c.difficulty",
+    "data_structure_type": "c.data_structure_type",
+    "is_curated": "c.is_curated",
+    "function_name": "c.function_name",
+    "function_params": "c.function_params",
+    "return_type": "c.return_type",
+    "time_limit_ms": "c.time_limit_ms",
+    "memory_limit_mb": "c.memory_limit_mb",
+    "stop_on_first_failure": "c.stop_on_first_failure",
+    "comparison_mode": "c.comparison_mode",
+    "float_tolerance": "c.float_tolerance",
+    "created_at": "c.created_at",
+    "updated_at": "c.updated_at",
+    "author_username": "u.username",
+}
+
+
+def challenge_columns(fields=CHALLENGE_FIELDS):
+    # SELECT list for the given challenge fields (FROM coding_challenges c JOIN users u)
+    return ",\n    ".join(f"{CHALLENGE_FIELDS[field]} AS {field}" for field in fields)
+
+
+CHALLENGE_COLUMNS = challenge_columns()
+
+TEST_CASE_COLUMNS = ("id, challenge_id, input, expected_output, is_hidden, input_generator, expected_output_sha256, "
+                     "input_blob, input_size, expected_output_blob, expected_output_size, created_at")
+# What the test case endpoints need of the challenge (FROM coding_challenges c)
+TEST_CASE_CHALLENGE_COLUMNS = ("c.author, c.id AS challenge_id, c.function_name, c.comparison_mode, "
+                               "c.time_limit_ms, c.memory_limit_mb")
+
+# name -> SQL with %s parameters
+STATEMENTS = {
+    "challenge": f"""
+        SELECT {CHALLENGE_COLUMNS}
+        FROM coding_challenges c
+        JOIN users u ON c.author = u.id
+        WHERE c.id = %s""",
+    "challenge_with_test_case_count": f"""
+        SELECT {CHALLENGE_COLUMNS},
+            (SELECT COUNT(*) FROM test_cases tc WHERE tc.challenge_id = c.id) AS test_case_count
+        FROM coding_challenges c
+        JOIN users u ON c.author = u.id
+        WHERE c.id = %s""",
+    "challenge_exists": "SELECT id FROM coding_challenges WHERE id = %s",
+    # What the judge needs to run a submission
+    "judge_challenge": """
+        SELECT id, function_name, time_limit_ms, memory_limit_mb, stop_on_first_failure,
+               comparison_mode, float_tolerance
+        FROM coding_challenges WHERE id = %s""",
+    "test_cases": """
+        SELECT id, input, expected_output, is_hidden, input_generator, expected_output_sha256,
+               input_blob, expected_output_blob
+        FROM test_cases
+        WHERE challenge_id = %s
+        ORDER BY id""",
+    "challenge_test_cases": f"""
+        SELECT {TEST_CASE_COLUMNS}
+        FROM test_cases
+        WHERE challenge_id = %s
+        ORDER BY id""",
+    "test_case_challenge": f"""
+        SELECT {TEST_CASE_CHALLENGE_COLUMNS}
+        FROM coding_challenges c
+        WHERE c.id = %s""",
+    "test_case_with_challenge": f"""
+        SELECT tc.id, {TEST_CASE_CHALLENGE_COLUMNS}
+        FROM test_cases tc
+        JOIN coding_challenges c ON tc.challenge_id = c.id
+        WHERE tc.id = %s""",
+    "insert_submission": """
+        INSERT INTO submissions (user_id, challenge_id, code, language, status, notes,
+                                 submitted_at, judged_at, stop_on_first_failure, compile_time_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id""",
+    "submission": """
+        SELECT s.id,
+            s.user_id,
+            s.challenge_id,
+            s.code,
+            s.language,
+            s.status,
+            s.notes,
+            s.submitted_at,
+            u.username,
+            s.judge_error,
+            s.judged_at,
+            s.compile_time_seconds
+        FROM submissions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.id = %s""",
+    # A user's submissions to a challenge, newest first, with result counts
+    "challenge_submissions": """
+        SELECT s.id,
+            s.user_id,
+            s.challenge_id,
+            s.code,
+            s.language,
+            s.status,
+            s.notes,
+            s.submitted_at,
+            u.username,
+            r.passed_count,
+            r.total_count
+        FROM submissions s
+        JOIN users u ON s.user_id = u.id
+        LEFT JOIN LATERAL (
+            SELECT COUNT(*) FILTER (WHERE sr.passed) AS passed_count,
+                COUNT(*) AS total_count
+            FROM submission_results sr
+            WHERE sr.submission_id = s.id
+        ) r ON TRUE
+        WHERE s.challenge_id = %s AND s.user_id = %s
+        ORDER BY s.submitted_at DESC""",
+    "progress_overall": """
+        SELECT
+            COUNT(DISTINCT s.challenge_id) AS attempted,
+            COUNT(DISTINCT CASE
+                    WHEN s.status = 'passed'
+                    THEN s.challenge_id
+            END) AS solved,
+            COUNT(*) AS total_submissions
+        FROM submissions s
+        WHERE s.user_id = %s""",
+    "challenge_count": "SELECT COUNT(*) AS total FROM coding_challenges",
+    "progress_by_difficulty": """
+        SELECT c.difficulty,
+            COUNT(DISTINCT s.challenge_id) AS attempted,
+            COUNT(DISTINCT CASE
+                WHEN s.status = 'passed'
+                THEN s.challenge_id
+            END) AS solved
+        FROM submissions s
+        JOIN coding_challenges c ON s.challenge_id = c.id
+        WHERE s.user_id = %s
+        GROUP BY c.difficulty""",
+    "progress_by_data_structure": """
+        SELECT
+            c.data_structure_type,
+            COUNT(DISTINCT s.challenge_id) AS attempted,
+            COUNT(DISTINCT CASE
+                WHEN s.status = 'passed'
+                THEN s.challenge_id
+            END) AS solved
+        FROM submissions s
+        JOIN coding_challenges c ON s.challenge_id = c.id
+        WHERE s.user_id = %s
+            AND c.data_structure_type IS NOT NULL
+        GROUP BY c.data_structure_type""",
+}
+
+
+def _numbered(sql):
+    # %s placeholders -> $1, $2, ... for PREPARE
+    counter = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql)
+
+
+_PREPARE_SQL = {name: f"PREPARE {name} AS {_numbered(sql)}" for name, sql in STATEMENTS.items()}
+_EXECUTE_SQL = {name: f"EXECUTE {name}" + ("(" + ", ".join(["%s"] * sql.count("%s")) + ")" if "%s" in sql else "")
+                for name, sql in STATEMENTS.items()}
+
+
+def execute(cursor, name, params=()):
+    # Run statement name on cursor. The cursor's connection must come from
+    # db_helpers (it remembers which statements it has prepared).
+    start = time.perf_counter()
+    prepared = False
+    if PREPARED_STATEMENTS:
+        connection = cursor.connection
+        first_in_transaction = (connection.info.transaction_status
+                                == psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        if name not in connection.prepared_statements:
+            _prepare(cursor, name)
+            prepared = True
+        try:
+            cursor.execute(_EXECUTE_SQL[name], params)
+        except psycopg2.errors.FeatureNotSupported:
+            # "cached plan must not change result type": a migration changed
+            # a column it returns since this connection prepared it. Prepare
+            # it again, now when nothing else in the transaction is lost by
+            # rolling back, otherwise on its next use.
+            connection.prepared_statements.discard(name)
+            connection.stale_statements.add(name)
+            if prepared or not first_in_transaction:
+                raise
+            connection.rollback()
+            _prepare(cursor, name)
+            prepared = True
+            cursor.execute(_EXECUTE_SQL[name], params)
+    else:
+        cursor.execute(STATEMENTS[name], params)
+    _record(name, time.perf_counter() - start, prepared)
+
+
+def _prepare(cursor, name):
+    connection = cursor.connection
+    if name in connection.stale_statements:
+        cursor.execute(f"DEALLOCATE {name}")
+        connection.stale_statements.discard(name)
+    cursor.execute(_PREPARE_SQL[name])
+    connection.prepared_statements.add(name)
+
+
+def fetch_one(cursor, name, params=()):
+    execute(cursor, name, params)
+    return cursor.fetchone()
+
+
+def fetch_all(cursor, name, params=()):
+    execute(cursor, name, params)
+    return cursor.fetchall()
+
+
+# -- Queries -------------------------------------------------------------------
+
+def get_challenge(cursor, challenge_id, with_test_case_count=False):
+    name = "challenge_with_test_case_count" if with_test_case_count else "challenge"
+    return fetch_one(cursor, name, (challenge_id,))
+
+
+def challenge_exists(cursor, challenge_id):
+    return fetch_one(cursor, "challenge_exists", (challenge_id,)) is not None
+
+
+def get_judge_challenge(cursor, challenge_id):
+    return fetch_one(cursor, "judge_challenge", (challenge_id,))
+
+
+def get_test_cases(cursor, challenge_id):
+    return fetch_all(cursor, "test_cases", (challenge_id,))
+
+
+def get_challenge_test_cases(cursor, challenge_id):
+    # As the test case endpoints list them (previews of blob-stored payloads)
+    return fetch_all(cursor, "challenge_test_cases", (challenge_id,))
+
+
+def get_test_case_challenge(cursor, challenge_id):
+    return fetch_one(cursor, "test_case_challenge", (challenge_id,))
+
+
+def get_test_case_with_challenge(cursor, test_case_id):
+    return fetch_one(cursor, "test_case_with_challenge", (test_case_id,))
+
+
+def insert_submission(cursor, user_id, challenge_id, code, language, status, notes, submitted_at,
+                      judged_at=None, stop_on_first_failure=None, compile_time_seconds=None):
+    # Returns the new submission's id
+    return fetch_one(cursor, "insert_submission", (
+        user_id, challenge_id, code, language, status, notes, submitted_at, judged_at,
+        stop_on_first_failure, compile_time_seconds))["id"]
+
+
+def get_submission(cursor, submission_id):
+    return fetch_one(cursor, "submission", (submission_id,))
+
+
+def get_challenge_submissions(cursor, challenge_id, user_id):
+    return fetch_all(cursor, "challenge_submissions", (challenge_id, user_id))
+
+
+def get_progress(cursor, user_id):
+    # (overall, total_challenges, by_difficulty, by_data_structure)
+    return (fetch_one(cursor, "progress_overall", (user_id,)),
+            fetch_one(cursor, "challenge_count")["total"],
+            fetch_all(cursor, "progress_by_difficulty", (user_id,)),
+            fetch_all(cursor, "progress_by_data_structure", (user_id,)))
+
+
+# -- Timing --------------------------------------------------------------------
+
+_lock = threading.Lock()
+_timings = {}   # name -> {"calls", "prepares", "total_ms", "max_ms"}
+
+
+def _record(name, seconds, prepared):
+    ms = seconds * 1000
+    with _lock:
+        timing = _timings.setdefault(name, {"calls": 0, "prepares": 0, "total_ms": 0.0, "max_ms": 0.0})
+        timing["calls"] += 1
+        timing["prepares"] += prepared
+        timing["total_ms"] += ms
+        timing["max_ms"] = max(timing["max_ms"], ms)
+
+
+def stats():
+    with _lock:
+        return {name: dict(timing, total_ms=round(timing["total_ms"], 3), max_ms=round(timing["max_ms"], 3),
+                           avg_ms=round(timing["total_ms"] / timing["calls"], 3))
+                for name, timing in _timings.items()}
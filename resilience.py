@@ -0,0 +1,214 @@
+"""
+Sandbox creation resilience.
+Wraps the backend's create() with:
+
+- Hedging: if a creation hasn't returned within the recent p95 creation
+  time, a second one is started and whichever sandbox arrives first is
+  used. The other is killed when it turns up. At most one hedge per call.
+- A circuit breaker: after SANDBOX_BREAKER_FAILURES creations in a row
+  fail, calls fail at once with CircuitOpen for
+  SANDBOX_BREAKER_RESET_SECONDS. Then a single trial creation decides
+  whether to close it again.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+
+HEDGE_ENABLED = os.environ.get("SANDBOX_HEDGE_ENABLED", "true").lower() == "true"
+# Percentile of recent creation times after which a hedge is started
+HEDGE_PERCENTILE = float(os.environ.get("SANDBOX_HEDGE_PERCENTILE", "95"))
+# Hedge delay until enough creations have been timed, and its floor
+HEDGE_DEFAULT_DELAY_MS = int(os.environ.get("SANDBOX_HEDGE_DEFAULT_DELAY_MS", "3000"))
+HEDGE_MIN_DELAY_MS = int(os.environ.get("SANDBOX_HEDGE_MIN_DELAY_MS", "500"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("SANDBOX_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.environ.get("SANDBOX_LATENCY_WINDOW", "200"))
+
+BREAKER_FAILURES = int(os.environ.get("SANDBOX_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("SANDBOX_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpen(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__(f"Sandbox service is unavailable; retrying in {max(1, round(retry_after))}s")
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    # Rolling window of durations in seconds. Thread-safe.
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        # Nearest-rank percentile, or None without samples.
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+        return samples[rank]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def check(self):
+        # Raise CircuitOpen unless a call may go ahead. When the reset time
+        # is up, one caller is let through as the half-open trial.
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(remaining)
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            if self._state == self.HALF_OPEN:
+                if self._trial_running:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpen(self.reset_seconds)
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                    self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+                if self._state != self.OPEN:
+                    self._stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, state=self._state, consecutive_failures=self._failures)
+
+
+class ResilientCreator:
+    # create() returns factory()'s sandbox, hedged and behind the breaker.
+    # kill(sandbox) disposes of a hedge that lost the race.
+
+    def __init__(self, factory, kill, hedge_enabled=HEDGE_ENABLED, breaker=None, latency=None):
+        self._factory = factory
+        self._kill = kill
+        self.hedge_enabled = hedge_enabled
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "failed": 0, "hedged": 0, "hedge_wins": 0, "hedges_discarded": 0}
+
+    def hedge_delay(self):
+        # Seconds to wait for the first attempt before starting a hedge.
+        delay_ms = HEDGE_DEFAULT_DELAY_MS
+        if len(self.latency) >= HEDGE_MIN_SAMPLES:
+            delay_ms = self.latency.percentile(HEDGE_PERCENTILE) * 1000
+        return max(delay_ms, HEDGE_MIN_DELAY_MS) / 1000
+
+    def create(self):
+        self.breaker.check()
+        outcomes = queue.Queue()
+        claim = threading.Lock()
+        claimed = []
+
+        def attempt(hedge):
+            started = time.monotonic()
+            try:
+                sandbox = self._factory()
+            except Exception as error:
+                outcomes.put((hedge, None, error))
+                return
+            self.latency.record(time.monotonic() - started)
+            with claim:
+                won = not claimed
+                claimed.append(hedge)
+            if won:
+                outcomes.put((hedge, sandbox, None))
+                return
+            # The other attempt got there first
+            self._count("hedges_discarded")
+            try:
+                self._kill(sandbox)
+            except Exception:
+                pass
+
+        self._start(attempt, False)
+        launched = 1
+        errors = []
+        deadline = time.monotonic() + self.hedge_delay()
+        while True:
+            timeout = None
+            if self.hedge_enabled and launched == 1 and not errors:
+                timeout = max(0, deadline - time.monotonic())
+            try:
+                hedge, sandbox, error = outcomes.get(timeout=timeout)
+            except queue.Empty:
+                self._start(attempt, True)
+                launched += 1
+                self._count("hedged")
+                continue
+            if sandbox is not None:
+                self.breaker.record_success()
+                self._count("created")
+                if hedge:
+                    self._count("hedge_wins")
+                return sandbox
+            errors.append(error)
+            if len(errors) == launched:
+                self.breaker.record_failure()
+                self._count("failed")
+                raise errors[0]
+
+    def stats(self):
+        p95 = self.latency.percentile(95)
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            hedge_enabled=self.hedge_enabled,
+            hedge_delay_ms=round(self.hedge_delay() * 1000),
+            latency_p95_ms=round(p95 * 1000) if p95 is not None else None,
+            latency_samples=len(self.latency),
+            breaker=self.breaker.stats(),
+        )
+        return stats
+
+    def _start(self, attempt, hedge):
+        threading.Thread(target=attempt, args=(hedge,), name="sandbox-create", daemon=True).start()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,117 @@
+"""
+Execution result cache.
+Byte-identical resubmissions reuse the verdict of an earlier run instead of
+going back to the sandbox. Entries are content-addressed: the key hashes the
+code, language, function name and a fingerprint of the challenge's test
+suite, so an edited suite can never serve a stale verdict. Edits made
+through the test case endpoints also evict the challenge's entries eagerly.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+
+def suite_fingerprint(test_cases):
+    # Hash of everything about the test cases that can change a verdict.
+    digest = hashlib.sha256()
+    for tc in test_cases:
+        digest.update(json.dumps(
+            [tc["id"], tc["input"], tc["expected_output"], tc["is_hidden"],
+             tc.get("input_generator"), tc.get("expected_output_sha256"),
+             tc.get("input_blob"), tc.get("expected_output_blob")], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def make_key(code, language, function_name, test_cases, **options):
+    # options: anything else that affects the verdict (e.g. execution mode).
+    payload = json.dumps({
+        "code": code,
+        "language": language,
+        "function_name": function_name,
+        "suite": suite_fingerprint(test_cases),
+        "options": options,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    # LRU with a per-entry TTL. Thread-safe.
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, challenge_id, result)
+        self._by_challenge = {}         # challenge_id -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self._stats["misses"] += 1
+                self._stats["evictions"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry[2])
+
+    def put(self, key, challenge_id, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, challenge_id, copy.deepcopy(result))
+            self._by_challenge.setdefault(challenge_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate_challenge(self, challenge_id):
+        # Drop every cached verdict for a challenge (its test suite changed).
+        with self._lock:
+            keys = self._by_challenge.pop(int(challenge_id), set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats["invalidations"] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_challenge.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                ttl_seconds=self.ttl,
+                hit_rate=round(self._stats["hits"] / lookups, 3) if lookups else 0,
+            )
+
+    def _remove(self, key):
+        _, challenge_id, _ = self._entries.pop(key)
+        keys = self._by_challenge.get(challenge_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_challenge[challenge_id]
+
+
+result_cache = ResultCache()
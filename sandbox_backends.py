@@ -0,0 +1,265 @@
+"""
+Sandbox backends.
+The judge talks to a sandbox through the small surface of e2b's Sandbox:
+.files.write / .files.write_files / .files.read, .commands.run, .is_running
+and .kill. A backend creates such sandboxes:
+
+- "e2b": remote E2B cloud sandboxes (default).
+- "local": python3/node subprocesses on this machine under rlimits, in a
+  private temp directory and, where the kernel allows it, without network.
+  Meant for trusted/internal deployments, CI and offline benchmarking.
+
+Pick one with SANDBOX_BACKEND.
+"""
+
+import math
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from e2b_code_interpreter import Sandbox
+
+
+SANDBOX_BACKEND = os.environ.get("SANDBOX_BACKEND", "e2b")
+# E2B template to start sandboxes from (default: E2B's base image). C++,
+# Java and Go need one with g++, a JDK and Go installed.
+E2B_TEMPLATE = os.environ.get("E2B_TEMPLATE")
+
+# Limits for each command run by the local backend. The CPU limit is a soft
+# limit of at least the command's timeout, so the harnesses' "ulimit -t"
+# can set a longer one for a whole suite run in one process.
+LOCAL_CPU_SECONDS = int(os.environ.get("LOCAL_SANDBOX_CPU_SECONDS", "30"))
+# Address space cap. It is a hard limit, so the per-case "ulimit -v" of the
+# harnesses can't go above it: keep it at least the largest challenge
+# memory limit (challenges_blueprint.MAX_MEMORY_LIMIT_MB)
+LOCAL_MEMORY_MB = int(os.environ.get("LOCAL_SANDBOX_MEMORY_MB", "2048"))
+LOCAL_FILE_SIZE_MB = int(os.environ.get("LOCAL_SANDBOX_FILE_SIZE_MB", "16"))
+LOCAL_MAX_PROCESSES = int(os.environ.get("LOCAL_SANDBOX_MAX_PROCESSES", "256"))
+# Refuse to run without network isolation instead of falling back
+LOCAL_REQUIRE_NO_NETWORK = os.environ.get("LOCAL_SANDBOX_REQUIRE_NO_NETWORK", "false").lower() == "true"
+# Seconds to wait for a finished command's output to drain. A process that
+# escaped the process group kill may hold the pipes open indefinitely.
+OUTPUT_DRAIN_SECONDS = 5
+
+
+class E2BBackend:
+    name = "e2b"
+
+    def check_config(self):
+        # Check that E2B_API_KEY is set in environment.
+        if not os.environ.get("E2B_API_KEY"):
+            return "E2B_API_KEY is not set. Add it to your .env file. Get one at https://e2b.dev/dashboard?tab=keys"
+        return None
+
+    def create(self, timeout=None):
+        options = {}
+        if E2B_TEMPLATE:
+            options["template"] = E2B_TEMPLATE
+        if timeout is not None:
+            options["timeout"] = timeout
+        return Sandbox.create(**options)
+
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self):
+        self._network_prefix = None
+        self._probe_lock = threading.Lock()
+
+    def check_config(self):
+        try:
+            self._isolation_prefix()
+        except RuntimeError as e:
+            return str(e)
+        return None
+
+    def create(self, timeout=None):
+        return LocalSandbox(self._isolation_prefix())
+
+    def _isolation_prefix(self):
+        # Run commands in a fresh network namespace via unshare(1) when the
+        # kernel allows unprivileged user namespaces. Probed once.
+        with self._probe_lock:
+            if self._network_prefix is None:
+                prefix = ["unshare", "--map-root-user", "--net"]
+                try:
+                    probe = subprocess.run(prefix + ["true"], capture_output=True, timeout=10)
+                    usable = probe.returncode == 0
+                except (OSError, subprocess.TimeoutExpired):
+                    usable = False
+                if not usable and LOCAL_REQUIRE_NO_NETWORK:
+                    raise RuntimeError("Local sandbox cannot isolate the network (unshare is unavailable)")
+                self._network_prefix = prefix if usable else []
+            return self._network_prefix
+
+
+class CommandResult:
+    def __init__(self, stdout, stderr, exit_code):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exit_code = exit_code
+
+
+class LocalSandbox:
+    # Presents the same /tmp layout as an E2B sandbox, rooted in a private
+    # temp directory: "/tmp/..." in paths and commands maps to <root>/tmp/...
+
+    def __init__(self, command_prefix=()):
+        self.root = tempfile.mkdtemp(prefix="cb-sandbox-")
+        os.makedirs(os.path.join(self.root, "tmp"))
+        self.files = _LocalFiles(self)
+        self.commands = _LocalCommands(self, list(command_prefix))
+        self._running = True
+
+    def map_path(self, text):
+        return text.replace("/tmp/", f"{self.root}/tmp/")
+
+    def is_running(self):
+        return self._running
+
+    def kill_processes(self):
+        # Kill every process still running from this sandbox's commands,
+        # including ones that left the command's process group (setsid,
+        # daemonized). They are found by the CB_SANDBOX variable every
+        # command starts with. True if none survive.
+        for _ in range(3):
+            pids = _sandbox_pids(self.root)
+            if not pids:
+                return True
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            time.sleep(0.1)
+        return not _sandbox_pids(self.root)
+
+    def kill(self):
+        self._running = False
+        self.kill_processes()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class _LocalFiles:
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def write(self, path, data):
+        local_path = self._sandbox.map_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        mode = "wb" if isinstance(data, bytes) else "w"
+        with open(local_path, mode) as f:
+            f.write(data)
+
+    def write_files(self, files):
+        for entry in files:
+            self.write(entry["path"], entry["data"])
+
+    def read(self, path, format="text"):
+        mode = "rb" if format == "bytes" else "r"
+        with open(self._sandbox.map_path(path), mode) as f:
+            return f.read()
+
+
+class _LocalCommands:
+
+    def __init__(self, sandbox, prefix):
+        self._sandbox = sandbox
+        self._prefix = prefix
+
+    def run(self, cmd, timeout=60, on_stdout=None, on_stderr=None, **_):
+        # Run cmd under bash with rlimits and a minimal environment.
+        # Returns a CommandResult (a non-zero exit is not an exception).
+        # Raises TimeoutError after timeout seconds, killing the process group.
+        workdir = os.path.join(self._sandbox.root, "tmp")
+        process = subprocess.Popen(
+            self._prefix + ["/bin/bash", "-c", self._sandbox.map_path(cmd)],
+            cwd=workdir,
+            env={"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "HOME": workdir, "LANG": "C.UTF-8",
+                 "CB_SANDBOX": self._sandbox.root},
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+            preexec_fn=lambda: _apply_limits(timeout),
+        )
+        stdout, stderr = [], []
+        readers = [
+            threading.Thread(target=_pump, args=(process.stdout, stdout, on_stdout), daemon=True),
+            threading.Thread(target=_pump, args=(process.stderr, stderr, on_stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            exit_code = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"Command timed out after {timeout} seconds")
+        finally:
+            # Reap anything the command left running in its session, then
+            # drain what it wrote before the pipes close
+            _kill_group(process)
+            drain_deadline = time.monotonic() + OUTPUT_DRAIN_SECONDS
+            for reader in readers:
+                reader.join(timeout=max(0, drain_deadline - time.monotonic()))
+        return CommandResult("".join(stdout), "".join(stderr), exit_code)
+
+
+def _pump(stream, chunks, callback):
+    for line in iter(stream.readline, b""):
+        text = line.decode("utf-8", errors="replace")
+        chunks.append(text)
+        if callback is not None:
+            callback(text)
+    stream.close()
+
+
+def _sandbox_pids(root):
+    # Pids of live processes started by the local sandbox rooted at root
+    marker = f"CB_SANDBOX={root}".encode()
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/environ", "rb") as f:
+                environ = f.read().split(b"\0")
+        except OSError:
+            continue
+        if marker in environ:
+            pids.append(int(entry))
+    return pids
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    process.wait()
+
+
+def _apply_limits(timeout=None):
+    # Runs in the child between fork and exec.
+    mb = 1024 * 1024
+    cpu_seconds = max(LOCAL_CPU_SECONDS, math.ceil(timeout)) if timeout else LOCAL_CPU_SECONDS
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, resource.RLIM_INFINITY))
+    resource.setrlimit(resource.RLIMIT_AS, (LOCAL_MEMORY_MB * mb, LOCAL_MEMORY_MB * mb))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (LOCAL_FILE_SIZE_MB * mb, LOCAL_FILE_SIZE_MB * mb))
+    resource.setrlimit(resource.RLIMIT_NPROC, (LOCAL_MAX_PROCESSES, LOCAL_MAX_PROCESSES))
+
+
+_BACKENDS = {"e2b": E2BBackend, "local": LocalBackend}
+
+
+def get_backend(name=SANDBOX_BACKEND):
+    backend_class = _BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown SANDBOX_BACKEND: {name}")
+    return backend_class()
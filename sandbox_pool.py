@@ -0,0 +1,273 @@
+"""
+Warm sandbox pool.
+Keeps a set of pre-created, health-checked sandboxes ready so a submission
+does not pay sandbox cold-start before its first test case runs.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Kills every process of the sandbox user, i.e. whatever a previous
+# submission forked or daemonized, and fails if any survive. Runs as root.
+KILL_CMD = "pkill -KILL -u user; sleep 0.1; ! pgrep -u user"
+# Files a previous submission may have left behind in a pooled sandbox
+SCRUB_CMD = ("rm -rf /tmp/solution.* /tmp/Main.java /tmp/build /tmp/build.tar"
+             " /tmp/stdin*.txt /tmp/stderr*.txt /tmp/judge_stop")
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class _PooledSandbox:
+    def __init__(self, sandbox):
+        self.sandbox = sandbox
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+
+class SandboxPool:
+    # factory() must return an object shaped like e2b's Sandbox
+    # (.files.write, .commands.run, .kill). A local fake works as well.
+
+    def __init__(self, factory, min_size=1, max_size=4, max_uses=20,
+                 max_age=240, acquire_timeout=30, health_check=None,
+                 kill_cmd=KILL_CMD, scrub_cmd=SCRUB_CMD):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("SandboxPool needs 0 <= min_size <= max_size and max_size >= 1")
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.acquire_timeout = acquire_timeout
+        self._health_check = health_check or _default_health_check
+        self._kill_cmd = kill_cmd
+        self._scrub_cmd = scrub_cmd
+
+        self._idle = []
+        self._size = 0        # idle + leased + being created
+        self._creating = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._refill_thread = None
+
+        self._stats = {"created": 0, "reused": 0, "recycled": 0,
+                       "unhealthy": 0, "create_failures": 0}
+
+    # -- Lifecycle -------------------------------------------------------------
+
+    def start(self):
+        # Start the background refill thread (idempotent).
+        with self._cond:
+            if self._refill_thread is not None or self._closed:
+                return
+            self._refill_thread = threading.Thread(
+                target=self._refill_loop, name="sandbox-pool-refill", daemon=True)
+            self._refill_thread.start()
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            _kill_quietly(entry.sandbox)
+
+    # -- Leasing ---------------------------------------------------------------
+
+    def acquire(self):
+        # Return a ready sandbox, creating one inline only if the pool is empty
+        # and below max_size. Blocks up to acquire_timeout when at capacity.
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolExhausted("Sandbox pool is shut down")
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._creating += 1
+                        create_inline = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolExhausted("No sandbox available in the pool")
+                        self._cond.wait(remaining)
+                        continue
+                else:
+                    create_inline = False
+                self._cond.notify_all()  # wake refill thread
+
+            if create_inline:
+                return self._lease(self._create())
+
+            if self._is_expired(entry) or not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+            with self._cond:
+                self._stats["reused"] += 1
+            return self._lease(entry)
+
+    def release(self, sandbox, discard=False):
+        # Return a sandbox to the pool. It is scrubbed before reuse; sandboxes
+        # that are worn out, unhealthy, flagged with discard or can't be
+        # scrubbed are killed.
+        entry = getattr(sandbox, "_pool_entry", None)
+        if entry is None:
+            _kill_quietly(sandbox)
+            return
+        entry.uses += 1
+        if discard or self._closed or self._is_expired(entry) or not self._scrub(entry):
+            self._discard(entry)
+            return
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify_all()
+
+    @contextmanager
+    def sandbox(self):
+        sandbox = self.acquire()
+        try:
+            yield sandbox
+        except Exception:
+            self.release(sandbox, discard=True)
+            raise
+        else:
+            self.release(sandbox)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, idle=len(self._idle), size=self._size,
+                        min_size=self.min_size, max_size=self.max_size)
+
+    # -- Internals -------------------------------------------------------------
+
+    def _lease(self, entry):
+        entry.sandbox._pool_entry = entry
+        return entry.sandbox
+
+    def _create(self):
+        # Caller has already reserved a slot (_size and _creating bumped).
+        try:
+            sandbox = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._creating -= 1
+                self._stats["create_failures"] += 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._creating -= 1
+            self._stats["created"] += 1
+        return _PooledSandbox(sandbox)
+
+    def _discard(self, entry):
+        with self._cond:
+            self._size -= 1
+            self._stats["recycled"] += 1
+            self._cond.notify_all()
+        _kill_quietly(entry.sandbox)
+
+    def _is_expired(self, entry):
+        if self.max_uses and entry.uses >= self.max_uses:
+            return True
+        return bool(self.max_age) and time.monotonic() - entry.created_at >= self.max_age
+
+    def _is_healthy(self, entry):
+        try:
+            healthy = self._health_check(entry.sandbox)
+        except Exception:
+            healthy = False
+        if not healthy:
+            with self._cond:
+                self._stats["unhealthy"] += 1
+        return healthy
+
+    def _scrub(self, entry):
+        # Kill what the previous submission left running, then delete its
+        # files. False if either fails or a process survives. Sandboxes
+        # with a kill_processes() of their own (the local backend) use that
+        # instead of KILL_CMD.
+        sandbox = entry.sandbox
+        try:
+            kill_processes = getattr(sandbox, "kill_processes", None)
+            if kill_processes is not None:
+                killed = kill_processes()
+            else:
+                killed = _succeeded(sandbox.commands.run(self._kill_cmd, timeout=10, user="root"))
+            return killed and _succeeded(sandbox.commands.run(self._scrub_cmd, timeout=10))
+        except Exception:
+            return False
+
+    def _refill_loop(self):
+        # Keep at least min_size sandboxes idle (or being created), never
+        # exceeding max_size. Old idle sandboxes are recycled as they age out.
+        while True:
+            expired = []
+            with self._cond:
+                if self._closed:
+                    return
+                refill = self._needs_refill()
+                if refill:
+                    self._size += 1
+                    self._creating += 1
+                else:
+                    self._cond.wait(timeout=self._reap_interval())
+                    expired = self._take_expired_locked()
+            for entry in expired:
+                _kill_quietly(entry.sandbox)
+            if not refill:
+                continue
+
+            try:
+                entry = self._create()
+            except Exception:
+                # Back off so an E2B outage doesn't turn into a hot loop
+                time.sleep(1)
+                continue
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(entry)
+                    self._cond.notify_all()
+                    continue
+                self._size -= 1
+            _kill_quietly(entry.sandbox)
+            return
+
+    def _needs_refill(self):
+        return (len(self._idle) + self._creating < self.min_size
+                and self._size < self.max_size)
+
+    def _reap_interval(self):
+        return max(1, min(self.max_age or 60, 60) / 4)
+
+    def _take_expired_locked(self):
+        expired = [e for e in self._idle if self._is_expired(e)]
+        if expired:
+            self._idle = [e for e in self._idle if e not in expired]
+            self._size -= len(expired)
+            self._stats["recycled"] += len(expired)
+        return expired
+
+
+def _default_health_check(sandbox):
+    is_running = getattr(sandbox, "is_running", None)
+    return is_running() if is_running else True
+
+
+def _succeeded(result):
+    # E2B raises on a non-zero exit; other sandboxes return the exit code
+    return getattr(result, "exit_code", 0) == 0
+
+
+def _kill_quietly(sandbox):
+    try:
+        sandbox.kill()
+    except Exception:
+        pass
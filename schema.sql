@@ -1,5 +1,10 @@
+-- Trigram matching for challenge search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Drop tables if they exist (for clean setup)
+DROP TABLE IF EXISTS submission_results CASCADE;
 DROP TABLE IF EXISTS submissions CASCADE;
+DROP TABLE IF EXISTS test_case_blobs CASCADE;
 DROP TABLE IF EXISTS coding_challenges CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 
@@ -23,14 +28,37 @@ CREATE TABLE coding_challenges(
   function_name VARCHAR(100),
   function_params JSONB DEFAULT '[]',
   return_type VARCHAR(50) DEFAULT 'string',
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  time_limit_ms INTEGER,
+  memory_limit_mb INTEGER,
+  stop_on_first_failure BOOLEAN DEFAULT FALSE,
+  comparison_mode VARCHAR(20) DEFAULT 'auto',
+  float_tolerance DOUBLE PRECISION,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  -- Sort key of GET /challenges?sort_by=difficulty
+  difficulty_rank SMALLINT GENERATED ALWAYS AS (
+    CASE difficulty WHEN 'easy' THEN 1 WHEN 'medium' THEN 2 WHEN 'hard' THEN 3 ELSE 4 END
+  ) STORED,
+  -- Full-text search (GET /challenges?q=); title words weigh more
+  search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+  ) STORED
 );
 
 -- Create indexes for better query performance
 CREATE INDEX idx_challenges_author ON coding_challenges(author);
-CREATE INDEX idx_challenges_difficulty ON coding_challenges(difficulty);
-CREATE INDEX idx_challenges_data_structure_type ON coding_challenges(data_structure_type);
+-- GET /challenges pages: one index per sort order, alone and behind each filter
+CREATE INDEX idx_challenges_created ON coding_challenges(created_at DESC, id DESC);
+CREATE INDEX idx_challenges_difficulty_rank ON coding_challenges(difficulty_rank, id);
+CREATE INDEX idx_challenges_difficulty ON coding_challenges(difficulty, created_at DESC, id DESC);
+CREATE INDEX idx_challenges_data_structure_type ON coding_challenges(data_structure_type, created_at DESC, id DESC);
+CREATE INDEX idx_challenges_data_structure_type_rank ON coding_challenges(data_structure_type, difficulty_rank, id);
+CREATE INDEX idx_challenges_curated ON coding_challenges(is_curated, created_at DESC, id DESC);
+CREATE INDEX idx_challenges_curated_rank ON coding_challenges(is_curated, difficulty_rank, id);
+-- GET /challenges?q=: full-text matches, and typo-tolerant title matches
+CREATE INDEX idx_challenges_search ON coding_challenges USING GIN (search_vector);
+CREATE INDEX idx_challenges_title_trgm ON coding_challenges USING GIN (title gin_trgm_ops);
 
 -- Create submissions table
 CREATE TABLE submissions (
@@ -41,23 +69,69 @@ CREATE TABLE submissions (
     language VARCHAR(50) NOT NULL,
     status VARCHAR(50) NOT NULL DEFAULT 'submitted',
     notes TEXT,
-    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    judge_error TEXT,
+    judged_at TIMESTAMP,
+    lease_expires_at TIMESTAMP,
+    worker_id VARCHAR(255),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    stop_on_first_failure BOOLEAN,
+    compile_time_seconds REAL
 );
 
 -- Create indexes for submissions
 CREATE INDEX idx_submissions_user_id ON submissions(user_id);
 CREATE INDEX idx_submissions_challenge_id ON submissions(challenge_id);
 CREATE INDEX idx_submissions_user_challenge ON submissions(user_id, challenge_id);
+CREATE INDEX idx_submissions_claimable ON submissions(submitted_at, id)
+    WHERE status IN ('queued', 'running');
+
+-- Create test_case_blobs table (large test case payloads, zlib-compressed,
+-- keyed by the SHA-256 of the uncompressed text; see blob_store.py)
+CREATE TABLE test_case_blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Already compressed; don't let TOAST try again
+ALTER TABLE test_case_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
 
--- Create test_cases table
+-- Create test_cases table. A payload kept in test_case_blobs leaves only a
+-- preview in input / expected_output.
 CREATE TABLE test_cases (
     id SERIAL PRIMARY KEY,
     challenge_id INTEGER NOT NULL REFERENCES coding_challenges(id) ON DELETE CASCADE,
     input TEXT NOT NULL DEFAULT '',
     expected_output TEXT NOT NULL,
     is_hidden BOOLEAN DEFAULT FALSE,
+    input_generator JSONB,
+    expected_output_sha256 VARCHAR(64),
+    input_blob VARCHAR(64) REFERENCES test_case_blobs(sha256),
+    input_size INTEGER,
+    expected_output_blob VARCHAR(64) REFERENCES test_case_blobs(sha256),
+    expected_output_size INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create index for test_cases
 CREATE INDEX idx_test_cases_challenge_id ON test_cases(challenge_id);
+CREATE INDEX idx_test_cases_input_blob ON test_cases(input_blob) WHERE input_blob IS NOT NULL;
+CREATE INDEX idx_test_cases_expected_output_blob ON test_cases(expected_output_blob)
+    WHERE expected_output_blob IS NOT NULL;
+
+-- Create submission_results table (per-test-case results of a submission)
+CREATE TABLE submission_results (
+    submission_id INTEGER NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    test_case_id INTEGER REFERENCES test_cases(id) ON DELETE SET NULL,
+    is_hidden BOOLEAN NOT NULL DEFAULT FALSE,
+    passed BOOLEAN NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    time_seconds REAL,
+    cpu_time_seconds REAL,
+    memory_kb INTEGER,
+    output TEXT,
+    error TEXT,
+    PRIMARY KEY (submission_id, position)
+);
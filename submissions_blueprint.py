@@ -1,15 +1,27 @@
-from flask import Blueprint, jsonify, request, g
+from flask import Blueprint, Response, current_app, jsonify, request, g, stream_with_context
 from db_helpers import get_db_connection
 import psycopg2
 import psycopg2.extras
 from auth_middleware import token_required
 from datetime import datetime
-from e2b_service import run_test_cases
-from harness import wrap_code, SUPPORTED_HARNESS_LANGUAGES
+import queue
+import threading
+import admission
+import comparators
+import judge
+from compile_cache import compile_cache
+from blob_store import blob_cache
+import db_helpers
+import repository
+from e2b_service import sandbox_creation_stats
+from result_cache import result_cache
 
 
 submissions_blueprint = Blueprint('submissions_blueprint', __name__)
 
+# Idle streams get a comment line this often so proxies keep them open
+STREAM_KEEPALIVE_SECONDS = 15
+
 
 @submissions_blueprint.route('/challenges/<challenge_id>/submit', methods=['POST'])
 @token_required
@@ -20,103 +32,249 @@ def create_submission(challenge_id):
         code = data.get("code")
         language = data.get("language")
         notes = data.get("notes")
+        run_async = bool(data.get("async")) or request.args.get("async", "").lower() == "true"
+        # Overrides the challenge's fail-fast setting when given
+        stop_on_first_failure = data.get("stop_on_first_failure")
+        if stop_on_first_failure is not None:
+            stop_on_first_failure = bool(stop_on_first_failure)
 
         if not code or not language:
             return jsonify({"error": "Code and language are required"}), 400
 
+        # The connection is given back before judging, which can take a
+        # while, and a fresh one stores the result
         connection = get_db_connection()
-        cursor = connection.cursor(
-            cursor_factory=psycopg2.extras.RealDictCursor)
+        try:
+            cursor = connection.cursor(
+                cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # Verify the challenge exists and get function metadata
-        cursor.execute(
-            "SELECT id, function_name FROM coding_challenges WHERE id = %s",
-            (challenge_id,))
-        challenge = cursor.fetchone()
-        if challenge is None:
-            connection.close()
-            return jsonify({"error": "Challenge not found"}), 404
+            # Verify the challenge exists and get function metadata
+            challenge = repository.get_judge_challenge(cursor, challenge_id)
+            if challenge is None:
+                return jsonify({"error": "Challenge not found"}), 404
 
-        # Fetch test cases for this challenge
-        cursor.execute(
-            """SELECT id, input, expected_output, is_hidden
-               FROM test_cases
-               WHERE challenge_id = %s
-               ORDER BY id""",
-            (challenge_id,))
-        test_cases = cursor.fetchall()
+            # Fetch test cases for this challenge
+            test_cases = judge.fetch_test_cases(cursor, challenge_id)
+
+            if test_cases:
+                # Reject harness languages we can't wrap before doing any work
+                try:
+                    judge.prepare_code(challenge, code, language)
+                except judge.UnsupportedLanguage as error:
+                    return jsonify({"error": str(error)}), 400
+
+            if run_async and test_cases:
+                return _enqueue_submission(connection, cursor, user_id, challenge_id, code, language, notes,
+                                           stop_on_first_failure)
+        finally:
+            connection.close()
 
         # Run code against test cases if they exist
         execution_result = None
-        status = "submitted"
+        if test_cases:
+            try:
+                with admission.admit(user_id):
+                    execution_result = judge.run_submission(
+                        challenge, code, language, test_cases, stop_on_first_failure=stop_on_first_failure)
+            except admission.AdmissionRejected as error:
+                return _admission_rejected(error)
+
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor(
+                cursor_factory=psycopg2.extras.RealDictCursor)
+            response = _store_judged_submission(cursor, user_id, challenge_id, code, language, notes,
+                                                execution_result, stop_on_first_failure)
+            connection.commit()
+        finally:
+            connection.close()
+
+        return jsonify(response), 201
+    except Exception as error:
+        return jsonify({"error": str(error)}), 500
+
+
+@submissions_blueprint.route('/challenges/<challenge_id>/submit/stream', methods=['POST'])
+@token_required
+def stream_submission(challenge_id):
+    # Like create_submission, but answers with a Server-Sent Events stream:
+    # a "test_result" event per case as it finishes (hidden cases sanitized,
+    # "index" is its position), then a "submission" event carrying the saved
+    # submission in create_submission's response shape. Failures after the
+    # stream has started arrive as an "error" event.
+    try:
+        user_id = g.user["id"]
+        data = request.get_json()
+        code = data.get("code")
+        language = data.get("language")
+        notes = data.get("notes")
+        stop_on_first_failure = data.get("stop_on_first_failure")
+        if stop_on_first_failure is not None:
+            stop_on_first_failure = bool(stop_on_first_failure)
+
+        if not code or not language:
+            return jsonify({"error": "Code and language are required"}), 400
+
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor(
+                cursor_factory=psycopg2.extras.RealDictCursor)
+            challenge = repository.get_judge_challenge(cursor, challenge_id)
+            if challenge is None:
+                return jsonify({"error": "Challenge not found"}), 404
+            test_cases = judge.fetch_test_cases(cursor, challenge_id)
+        finally:
+            connection.close()
 
         if test_cases:
-            # Wrap code with harness for function-based challenges
-            code_to_execute = code
-            if challenge.get("function_name"):
-                if language not in SUPPORTED_HARNESS_LANGUAGES:
-                    connection.close()
-                    return jsonify({
-                        "error": f"Function-based execution is not yet supported for {language}. Please use Python or JavaScript."
-                    }), 400
-                code_to_execute = wrap_code(code, challenge["function_name"], language)
-
-            execution_result = run_test_cases(code_to_execute, language, test_cases)
-            status = execution_result["overall_status"]
-
-        # Save the submission with the determined status (original code, not wrapped)
-        cursor.execute("""
-            INSERT INTO submissions (user_id, challenge_id, code, language, status, notes, submitted_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (user_id, challenge_id, code, language, status, notes, datetime.utcnow())
-        )
-        submission_id = cursor.fetchone()["id"]
-
-        cursor.execute("""
-            SELECT s.id,
-                s.user_id,
-                s.challenge_id,
-                s.code,
-                s.language,
-                s.status,
-                s.notes,
-                s.submitted_at,
-                u.username
-            FROM submissions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.id = %s
-            """, (submission_id,))
-        created_submission = cursor.fetchone()
+            try:
+                judge.prepare_code(challenge, code, language)
+            except judge.UnsupportedLanguage as error:
+                return jsonify({"error": str(error)}), 400
+            # Held until judge_and_store is done
+            admission.acquire(user_id)
+    except admission.AdmissionRejected as error:
+        return _admission_rejected(error)
+    except Exception as error:
+        return jsonify({"error": str(error)}), 500
 
+    # Judging and saving run on their own thread, so the submission is
+    # stored even if the client goes away mid-stream
+    events = queue.Queue()
+
+    def on_result(index, test_result):
+        event = judge.sanitize_test_results([test_result])[0]
+        events.put(("test_result", dict(event, index=index)))
+
+    def judge_and_store():
+        try:
+            execution_result = None
+            if test_cases:
+                execution_result = judge.run_submission(
+                    challenge, code, language, test_cases,
+                    stop_on_first_failure=stop_on_first_failure, on_result=on_result)
+            connection = get_db_connection()
+            try:
+                cursor = connection.cursor(
+                    cursor_factory=psycopg2.extras.RealDictCursor)
+                response = _store_judged_submission(cursor, user_id, challenge_id, code, language, notes,
+                                                    execution_result, stop_on_first_failure)
+                connection.commit()
+            finally:
+                connection.close()
+            events.put(("submission", response))
+        except Exception as error:
+            events.put(("error", {"error": str(error)}))
+        finally:
+            if test_cases:
+                admission.release(user_id)
+
+    threading.Thread(target=judge_and_store, daemon=True).start()
+
+    def stream():
+        while True:
+            try:
+                event, payload = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event}\ndata: {current_app.json.dumps(payload)}\n\n"
+            if event != "test_result":
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _store_judged_submission(cursor, user_id, challenge_id, code, language, notes,
+                             execution_result, stop_on_first_failure=None):
+    # Save a judged (or test-less) submission and its per-case results.
+    # Returns the response body, with hidden cases sanitized. The caller commits.
+    status = execution_result["overall_status"] if execution_result else "submitted"
+    compile_time = execution_result.get("compile_time") if execution_result else None
+
+    # Save the submission with the determined status (original code, not wrapped)
+    submission_id = repository.insert_submission(
+        cursor, user_id, challenge_id, code, language, status, notes, datetime.utcnow(),
+        judged_at=datetime.utcnow() if execution_result else None,
+        stop_on_first_failure=stop_on_first_failure,
+        compile_time_seconds=float(compile_time) if compile_time is not None else None)
+
+    if execution_result:
+        judge.save_results(cursor, submission_id, execution_result["test_results"])
+
+    # Build response
+    response = dict(repository.get_submission(cursor, submission_id))
+
+    if execution_result:
+        response["cached"] = execution_result.get("cached", False)
+        response["passed_count"] = execution_result["passed_count"]
+        response["total_count"] = execution_result["total_count"]
+        if "compile_cached" in execution_result:
+            response["compile_cached"] = execution_result["compile_cached"]
+        response["test_results"] = judge.sanitize_test_results(execution_result["test_results"])
+    return response
+
+
+def _admission_rejected(error):
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
+
+
+def _enqueue_submission(connection, cursor, user_id, challenge_id, code, language, notes,
+                        stop_on_first_failure=None):
+    # Async mode: store the submission as queued and judge it in the background.
+    if not judge.reserve_slot():
+        connection.close()
+        response = jsonify({"error": "Too many submissions are being judged. Try again shortly."})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    try:
+        submission_id = repository.insert_submission(
+            cursor, user_id, challenge_id, code, language, "queued", notes, datetime.utcnow(),
+            stop_on_first_failure=stop_on_first_failure)
+        judge.notify_queued(cursor, submission_id)
+        queued_submission = repository.get_submission(cursor, submission_id)
         connection.commit()
         connection.close()
+    except Exception:
+        judge.release_slot()
+        raise
 
-        # Build response
-        response = dict(created_submission)
-
-        if execution_result:
-            response["passed_count"] = execution_result["passed_count"]
-            response["total_count"] = execution_result["total_count"]
-
-            # Sanitize hidden test cases — don't reveal input/expected_output
-            sanitized_results = []
-            for tr in execution_result["test_results"]:
-                if tr["is_hidden"]:
-                    sanitized_results.append({
-                        "test_case_id": tr["test_case_id"],
-                        "passed": tr["passed"],
-                        "is_hidden": True,
-                        "status": tr["status"],
-                        "time": tr["time"],
-                    })
-                else:
-                    sanitized_results.append(tr)
-
-            response["test_results"] = sanitized_results
+    judge.enqueue(submission_id)
 
-        return jsonify(response), 201
+    response = dict(queued_submission)
+    response["job_id"] = submission_id
+    response["status_url"] = f"/submissions/{submission_id}"
+    http_response = jsonify(response)
+    http_response.headers["Location"] = response["status_url"]
+    return http_response, 202
+
+
+@submissions_blueprint.route('/submissions/<submission_id>', methods=['GET'])
+@token_required
+def show_submission(submission_id):
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(
+            cursor_factory=psycopg2.extras.RealDictCursor)
+        submission = repository.get_submission(cursor, submission_id)
+        if submission is None or submission["user_id"] != g.user["id"]:
+            connection.close()
+            return jsonify({"error": "Submission not found"}), 404
+
+        test_results = judge.load_results(cursor, submission_id)
+        connection.close()
+
+        response = dict(submission)
+        response["done"] = submission["status"] not in ("queued", "running")
+        if test_results:
+            response["passed_count"] = sum(1 for tr in test_results if tr["passed"])
+            response["total_count"] = len(test_results)
+            response["test_results"] = judge.sanitize_test_results(test_results)
+
+        return jsonify(response), 200
     except Exception as error:
         return jsonify({"error": str(error)}), 500
 
@@ -132,30 +290,28 @@ def list_submissions(challenge_id):
             cursor_factory=psycopg2.extras.RealDictCursor)
 
         # Verify the challenge exists
-        cursor.execute("SELECT id FROM coding_challenges WHERE id = %s", (challenge_id,))
-        challenge = cursor.fetchone()
-        if challenge is None:
+        if not repository.challenge_exists(cursor, challenge_id):
             connection.close()
             return jsonify({"error": "Challenge not found"}), 404
 
-        cursor.execute("""
-            SELECT s.id,
-                s.user_id,
-                s.challenge_id,
-                s.code,
-                s.language,
-                s.status,
-                s.notes,
-                s.submitted_at,
-                u.username
-            FROM submissions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.challenge_id = %s AND s.user_id = %s
-            ORDER BY s.submitted_at DESC
-            """, (challenge_id, user_id))
-        submissions = cursor.fetchall()
+        submissions = repository.get_challenge_submissions(cursor, challenge_id, user_id)
 
         connection.close()
         return jsonify(submissions), 200
     except Exception as error:
         return jsonify({"error": str(error)}), 500
+
+
+@submissions_blueprint.route('/judge/stats', methods=['GET'])
+@token_required
+def judge_stats():
+    return jsonify({
+        "result_cache": result_cache.stats(),
+        "expected_output_cache": comparators.prepared_cache_stats(),
+        "admission": admission.stats(),
+        "sandbox_creation": sandbox_creation_stats(),
+        "compile_cache": compile_cache.stats(),
+        "blob_cache": blob_cache.stats(),
+        "db_pool": db_helpers.pool.stats(),
+        "queries": repository.stats(),
+    }), 200
@@ -4,10 +4,77 @@ import psycopg2
 import psycopg2.extras
 from auth_middleware import token_required
 import gemini_service
+from result_cache import result_cache
+import admission
+import blob_store
+import comparators
+import input_generators
+import judge
+import json
+import repository
+from repository import TEST_CASE_COLUMNS
 
 test_cases_blueprint = Blueprint('test_cases_blueprint', __name__)
 
 
+def _test_case_values(data, challenge, user_id):
+    # Validate a test case body. Returns (values, None) with values for
+    # _store_values, or (None, (error response, status)).
+    # The expected output is given literally, as a SHA-256 digest, or comes
+    # from running a reference_solution {code, language} on the input. That
+    # can take a while, so call this without a database connection checked out.
+    tc_input = data.get("input", "")
+    expected_output = data.get("expected_output")
+    expected_sha256 = data.get("expected_output_sha256")
+    reference = data.get("reference_solution")
+    input_generator = data.get("input_generator")
+    mode = challenge["comparison_mode"]
+
+    if input_generator is not None:
+        generator_error = input_generators.validate(input_generator)
+        if generator_error:
+            return None, (jsonify({"error": generator_error}), 400)
+        tc_input = input_generators.describe(input_generator)
+    if expected_sha256 is not None:
+        digest_error = comparators.validate_digest(expected_sha256, mode)
+        if digest_error:
+            return None, (jsonify({"error": digest_error}), 400)
+        expected_sha256 = expected_sha256.lower()
+    if reference is not None:
+        if not isinstance(reference, dict) or not reference.get("code") or not reference.get("language"):
+            return None, (jsonify({"error": "reference_solution needs code and language"}), 400)
+        try:
+            with admission.admit(user_id):
+                expected_output, expected_sha256 = judge.reference_expected_output(
+                    challenge, reference["code"], reference["language"],
+                    {"input": tc_input, "input_generator": input_generator})
+        except (judge.UnsupportedLanguage, judge.ReferenceSolutionFailed) as error:
+            return None, (jsonify({"error": str(error)}), 400)
+        except admission.AdmissionRejected as error:
+            response = jsonify({"error": str(error)})
+            response.headers["Retry-After"] = str(error.retry_after)
+            return None, (response, 429)
+    elif expected_sha256 is not None:
+        expected_output = ""
+    elif expected_output is None:
+        return None, (jsonify({"error": "expected_output, expected_output_sha256 or reference_solution is required"}), 400)
+    else:
+        expected_error = comparators.validate(expected_output, mode)
+        if expected_error:
+            return None, (jsonify({"error": expected_error}), 400)
+
+    return (tc_input, expected_output, data.get("is_hidden", False),
+            json.dumps(input_generator) if input_generator is not None else None, expected_sha256), None
+
+
+def _store_values(cursor, values):
+    # Column values for the input, input_blob, input_size, expected_output,
+    # expected_output_blob, expected_output_size, is_hidden, input_generator
+    # and expected_output_sha256 columns. Large payloads go to the blob store.
+    tc_input, expected_output, *rest = values
+    return (*blob_store.store(cursor, tc_input), *blob_store.store(cursor, expected_output), *rest)
+
+
 @test_cases_blueprint.route('/challenges/<challenge_id>/test-cases', methods=['GET'])
 @token_required
 def list_test_cases(challenge_id):
@@ -16,18 +83,14 @@ def list_test_cases(challenge_id):
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cursor.execute("SELECT id FROM coding_challenges WHERE id = %s", (challenge_id,))
-        if cursor.fetchone() is None:
+        if not repository.challenge_exists(cursor, challenge_id):
             connection.close()
             return jsonify({"error": "Challenge not found"}), 404
 
-        cursor.execute(
-            """SELECT id, challenge_id, input, expected_output, is_hidden, created_at
-               FROM test_cases
-               WHERE challenge_id = %s
-               ORDER BY id""",
-            (challenge_id,))
-        test_cases = cursor.fetchall()
+        test_cases = repository.get_challenge_test_cases(cursor, challenge_id)
+        # Large payloads are listed as previews unless ?full=true
+        if request.args.get("full", "false").lower() == "true":
+            test_cases = blob_store.resolve(test_cases, cursor)
 
         connection.close()
         return jsonify(test_cases), 200
@@ -45,35 +108,32 @@ def create_test_case(challenge_id):
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cursor.execute(
-            "SELECT id, author FROM coding_challenges WHERE id = %s",
-            (challenge_id,))
-        challenge = cursor.fetchone()
+        challenge = repository.get_test_case_challenge(cursor, challenge_id)
+        connection.close()
         if challenge is None:
-            connection.close()
             return jsonify({"error": "Challenge not found"}), 404
         if challenge["author"] != user_id:
-            connection.close()
             return jsonify({"error": "Unauthorized"}), 401
 
-        data = request.get_json()
-        tc_input = data.get("input", "")
-        expected_output = data.get("expected_output")
-        is_hidden = data.get("is_hidden", False)
-
-        if expected_output is None:
-            connection.close()
-            return jsonify({"error": "expected_output is required"}), 400
+        values, error = _test_case_values(request.get_json(), challenge, user_id)
+        if error:
+            return error
 
+        connection = get_db_connection()
+        cursor = connection.cursor(
+            cursor_factory=psycopg2.extras.RealDictCursor)
         cursor.execute(
-            """INSERT INTO test_cases (challenge_id, input, expected_output, is_hidden)
-               VALUES (%s, %s, %s, %s)
-               RETURNING id, challenge_id, input, expected_output, is_hidden, created_at""",
-            (challenge_id, tc_input, expected_output, is_hidden))
+            f"""INSERT INTO test_cases
+                   (challenge_id, input, input_blob, input_size, expected_output, expected_output_blob,
+                    expected_output_size, is_hidden, input_generator, expected_output_sha256)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+               RETURNING {TEST_CASE_COLUMNS}""",
+            (challenge_id, *_store_values(cursor, values)))
         created_test_case = cursor.fetchone()
 
         connection.commit()
         connection.close()
+        result_cache.invalidate_challenge(challenge_id)
         return jsonify(created_test_case), 201
     except Exception as error:
         return jsonify({"error": str(error)}), 500
@@ -89,39 +149,43 @@ def update_test_case(test_case_id):
         cursor = connection.cursor(
             cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cursor.execute(
-            """SELECT tc.id, c.author
-               FROM test_cases tc
-               JOIN coding_challenges c ON tc.challenge_id = c.id
-               WHERE tc.id = %s""",
-            (test_case_id,))
-        result = cursor.fetchone()
+        result = repository.get_test_case_with_challenge(cursor, test_case_id)
+        connection.close()
         if result is None:
-            connection.close()
             return jsonify({"error": "Test case not found"}), 404
         if result["author"] != user_id:
-            connection.close()
             return jsonify({"error": "Unauthorized"}), 401
 
-        data = request.get_json()
-        tc_input = data.get("input", "")
-        expected_output = data.get("expected_output")
-        is_hidden = data.get("is_hidden", False)
+        values, error = _test_case_values(request.get_json(), result, user_id)
+        if error:
+            return error
 
-        if expected_output is None:
+        connection = get_db_connection()
+        cursor = connection.cursor(
+            cursor_factory=psycopg2.extras.RealDictCursor)
+        # The blobs the row uses now, released below if no longer needed
+        cursor.execute(
+            "SELECT input_blob, expected_output_blob FROM test_cases WHERE id = %s FOR UPDATE",
+            (test_case_id,))
+        previous = cursor.fetchone()
+        if previous is None:
             connection.close()
-            return jsonify({"error": "expected_output is required"}), 400
+            return jsonify({"error": "Test case not found"}), 404
 
         cursor.execute(
-            """UPDATE test_cases
-               SET input = %s, expected_output = %s, is_hidden = %s
+            f"""UPDATE test_cases
+               SET input = %s, input_blob = %s, input_size = %s,
+                   expected_output = %s, expected_output_blob = %s, expected_output_size = %s,
+                   is_hidden = %s, input_generator = %s, expected_output_sha256 = %s
                WHERE id = %s
-               RETURNING id, challenge_id, input, expected_output, is_hidden, created_at""",
-            (tc_input, expected_output, is_hidden, test_case_id))
+               RETURNING {TEST_CASE_COLUMNS}""",
+            (*_store_values(cursor, values), test_case_id))
         updated_test_case = cursor.fetchone()
+        blob_store.release(cursor, blob_store.row_blobs(previous) - blob_store.row_blobs(updated_test_case))
 
         connection.commit()
         connection.close()
+        result_cache.invalidate_challenge(updated_test_case["challenge_id"])
         return jsonify(updated_test_case), 200
     except Exception as error:
         return jsonify({"error": str(error)}), 500
@@ -139,7 +203,9 @@ def delete_test_case(test_case_id):
 
         cursor.execute(
             """SELECT tc.id, tc.challenge_id, tc.input, tc.expected_output,
-                      tc.is_hidden, tc.created_at, c.author
+                      tc.is_hidden, tc.input_generator, tc.expected_output_sha256,
+                      tc.input_blob, tc.input_size, tc.expected_output_blob,
+                      tc.expected_output_size, tc.created_at, c.author
                FROM test_cases tc
                JOIN coding_challenges c ON tc.challenge_id = c.id
                WHERE tc.id = %s""",
@@ -153,9 +219,11 @@ def delete_test_case(test_case_id):
             return jsonify({"error": "Unauthorized"}), 401
 
         cursor.execute("DELETE FROM test_cases WHERE id = %s", (test_case_id,))
+        blob_store.release(cursor, blob_store.row_blobs(result))
 
         connection.commit()
         connection.close()
+        result_cache.invalidate_challenge(result["challenge_id"])
 
         del result["author"]
         return jsonify(result), 200